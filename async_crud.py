@@ -0,0 +1,278 @@
+# async_crud.py
+"""Асинхронный фасад над crud_operations для asyncio-приложений.
+
+Чтения выполняются в пуле из нескольких потоков, все записи — в одном
+потоке-писателе: SQLite всё равно допускает лишь одну пишущую транзакцию,
+а так они не толкаются за блокировку. Однотипные записи, пришедшие, пока
+писатель занят, объединяются в один пакетный вызов (update_statuses,
+approve_requests, reject_requests).
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from crud_operations import AnimalCRUD, AdoptionCRUD, UserCRUD, PAGE_SIZE
+from database import Database, get_database
+from models import Animal, AdoptionRequest, User, AnimalRecord, RequestRecord, ClientRequestRecord
+
+# Потоков-читателей: вместе с писателем должно умещаться в пул соединений Database
+READER_THREADS = 4
+# Сколько секунд операция может ждать в очереди и выполняться, прежде чем вызов сдастся
+DEFAULT_TIMEOUT = 30.0
+
+
+class AsyncDatabase:
+    """Исполнитель операций над Database: много читателей, один писатель, очередь записей.
+
+    Отмена или таймаут снимают операцию, ещё не начатую в потоке; начатая
+    доводится до конца, но её результат отбрасывается.
+    """
+    def __init__(self, db: Optional[Database] = None, readers: int = READER_THREADS,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT):
+        self.db = db or get_database()
+        self.timeout = timeout
+        self._readers = ThreadPoolExecutor(readers, thread_name_prefix='db-reader')
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix='db-writer')
+        # batch_fn -> [(аргумент, future)], ждущие очередного прохода писателя
+        self._pending = {}
+        self._wakeup = None
+        self._writer_task = None
+        self._writing = False
+        self.writes = 0
+        self.write_batches = 0
+
+    async def read(self, fn, *args, timeout: Optional[float] = None):
+        """fn(*args) в потоке-читателе"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(loop.run_in_executor(self._readers, partial(fn, *args)),
+                                      timeout or self.timeout)
+
+    async def write(self, fn, *args, timeout: Optional[float] = None):
+        """fn(*args) в потоке-писателе, в порядке очереди записей"""
+        return await self.write_batched(_call_each, (fn, args), timeout=timeout)
+
+    async def write_batched(self, batch_fn, item, timeout: Optional[float] = None):
+        """Ставит item в очередь; писатель вызывает batch_fn(список items) -> список результатов.
+
+        Все item одного batch_fn, накопившиеся к очередному проходу писателя,
+        уходят одним вызовом.
+        """
+        loop = asyncio.get_running_loop()
+        if self._writer_task is None:
+            self._wakeup = asyncio.Event()
+            self._writer_task = loop.create_task(self._writer_loop())
+        future = loop.create_future()
+        self._pending.setdefault(batch_fn, []).append((item, future))
+        self._wakeup.set()
+        return await asyncio.wait_for(future, timeout or self.timeout)
+
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            pending, self._pending = self._pending, {}
+            self._writing = True
+            for batch_fn, entries in pending.items():
+                entries = [(item, future) for item, future in entries if not future.done()]
+                if not entries:
+                    continue
+                self.writes += len(entries)
+                self.write_batches += 1
+                try:
+                    results = await loop.run_in_executor(self._writer, _run_batch, batch_fn,
+                                                         [item for item, _ in entries])
+                except Exception as e:
+                    for _, future in entries:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, future), result in zip(entries, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, _Failed):
+                        future.set_exception(result.error)
+                    else:
+                        future.set_result(result)
+            self._writing = False
+
+    def stats(self) -> Dict:
+        return {
+            'writes': self.writes,
+            'write_batches': self.write_batches,
+            'writes_per_batch': self.writes / self.write_batches if self.write_batches else 0.0,
+        }
+
+    async def close(self):
+        """Дожидается очереди записей и останавливает потоки"""
+        if self._writer_task is not None:
+            while self._pending or self._writing:
+                await asyncio.sleep(0.01)
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        self._readers.shutdown()
+        self._writer.shutdown()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class _Failed:
+    """Исключение одной записи из пакета: передаётся только её вызывающему"""
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _run_batch(batch_fn, items):
+    """batch_fn(items); если пакет упал, его транзакция уже откатилась — items
+    повторяются по одному, и исключение получает только вызывающий с плохим item"""
+    try:
+        return batch_fn(items)
+    except Exception:
+        if len(items) == 1:
+            raise
+    results = []
+    for item in items:
+        try:
+            results.extend(batch_fn([item]))
+        except Exception as e:
+            results.append(_Failed(e))
+    return results
+
+
+def _call_each(calls):
+    """Отдельные записи одного прохода писателя — по очереди, каждая в своей транзакции"""
+    results = []
+    for fn, args in calls:
+        try:
+            results.append(fn(*args))
+        except Exception as e:
+            results.append(_Failed(e))
+    return results
+
+
+class AsyncAnimalCRUD:
+    def __init__(self, adb: AsyncDatabase):
+        self.adb = adb
+        self.crud = AnimalCRUD(adb.db)
+
+    async def add_animal(self, animal: Animal) -> int:
+        return await self.adb.write(self.crud.add_animal, animal)
+
+    async def add_animals(self, animals: List[Animal]) -> int:
+        return await self.adb.write(self.crud.add_animals, animals)
+
+    async def get_all_animals(self) -> List[AnimalRecord]:
+        return await self.adb.read(self.crud.get_all_animals)
+
+    async def get_available_animals(self) -> List[AnimalRecord]:
+        return await self.adb.read(self.crud.get_available_animals)
+
+    async def get_animals_page(self, after_id: Optional[int] = None,
+                               limit: int = PAGE_SIZE) -> Tuple[List[AnimalRecord], Optional[int]]:
+        return await self.adb.read(self.crud.get_animals_page, after_id, limit)
+
+    async def get_available_animals_page(self, after_id: Optional[int] = None,
+                                         limit: int = PAGE_SIZE) -> Tuple[List[AnimalRecord], Optional[int]]:
+        return await self.adb.read(self.crud.get_available_animals_page, after_id, limit)
+
+    async def search_animals(self, text: Optional[str] = None, **filters) -> Tuple[List[AnimalRecord], Optional[int]]:
+        return await self.adb.read(partial(self.crud.search_animals, text, **filters))
+
+    async def update_status(self, animal_id: int, new_status: str) -> bool:
+        return await self.adb.write_batched(self._update_statuses, (animal_id, new_status))
+
+    async def update_statuses(self, statuses: Dict[int, str]) -> Dict[int, bool]:
+        return await self.adb.write(self.crud.update_statuses, statuses)
+
+    def _update_statuses(self, items):
+        outcomes = self.crud.update_statuses(dict(items))
+        return [outcomes[animal_id] for animal_id, _ in items]
+
+
+class AsyncAdoptionCRUD:
+    def __init__(self, adb: AsyncDatabase):
+        self.adb = adb
+        self.crud = AdoptionCRUD(adb.db)
+
+    async def create_request(self, request: AdoptionRequest) -> Optional[int]:
+        return await self.adb.write(self.crud.create_request, request)
+
+    async def get_all_requests(self) -> List[RequestRecord]:
+        return await self.adb.read(self.crud.get_all_requests)
+
+    async def get_requests_page(self, after: Optional[Tuple[str, int]] = None,
+                                limit: int = PAGE_SIZE) -> Tuple[List[RequestRecord], Optional[Tuple[str, int]]]:
+        return await self.adb.read(self.crud.get_requests_page, after, limit)
+
+    async def get_requests_by_client_id(self, client_id: int) -> List[ClientRequestRecord]:
+        return await self.adb.read(self.crud.get_requests_by_client_id, client_id)
+
+    async def approve_request(self, request_id: int) -> bool:
+        return await self.adb.write_batched(self._approve_requests, request_id)
+
+    async def approve_requests(self, request_ids: List[int]) -> Dict[int, bool]:
+        return await self.adb.write(self.crud.approve_requests, request_ids)
+
+    async def reject_request(self, request_id: int) -> bool:
+        return await self.adb.write_batched(self._reject_requests, request_id)
+
+    async def reject_requests(self, request_ids: List[int]) -> Dict[int, bool]:
+        return await self.adb.write(self.crud.reject_requests, request_ids)
+
+    async def cancel_request(self, request_id: int, client_id: int) -> bool:
+        return await self.adb.write(self.crud.cancel_request, request_id, client_id)
+
+    def _approve_requests(self, request_ids):
+        return _first_wins(self.crud.approve_requests(request_ids), request_ids)
+
+    def _reject_requests(self, request_ids):
+        return _first_wins(self.crud.reject_requests(request_ids), request_ids)
+
+
+def _first_wins(outcomes, ids):
+    """Результаты по вызовам: если id в пакете повторился, успех достаётся только первому"""
+    seen = set()
+    results = []
+    for item_id in ids:
+        results.append(outcomes[item_id] and item_id not in seen)
+        seen.add(item_id)
+    return results
+
+
+class AsyncUserCRUD:
+    def __init__(self, adb: AsyncDatabase, users: Optional[UserCRUD] = None):
+        self.adb = adb
+        self.crud = users or UserCRUD(adb.db)
+
+    async def add_user(self, user: User) -> Optional[int]:
+        return await self.adb.write(self.crud.add_user, user)
+
+    async def authenticate(self, username: str, password: str, role: str) -> Optional[Dict]:
+        # Проверка хэша — долгая работа CPU, её место в пуле читателей; перехэширование —
+        # запись, она идёт через писателя
+        user, rehash = await self.adb.read(self.crud.check_login, username, password, role)
+        if rehash is not None:
+            await self.adb.write(self.crud.rehash_password, user['id'], *rehash)
+        return user
+
+    async def login(self, username: str, password: str, role: str) -> Optional[str]:
+        user = await self.authenticate(username, password, role)
+        return self.crud.sessions.create(user) if user else None
+
+    async def get_session(self, token: str) -> Optional[Dict]:
+        # Сессии в памяти: ответ без потоков и базы
+        return self.crud.get_session(token)
+
+    async def logout(self, token: str) -> bool:
+        return self.crud.logout(token)
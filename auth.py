@@ -0,0 +1,154 @@
+# auth.py
+import argparse
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+# Параметры хэширования паролей. Стоимость подбирается через
+# `python benchmark.py auth`: вход должен укладываться в десятки миллисекунд.
+PASSWORD_SCHEME = 'scrypt'
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+PBKDF2_ITERATIONS = 600000
+SALT_BYTES = 16
+
+# scrypt с N=2**14, r=8 занимает 16 МБ памяти на вызов, поэтому одновременных
+# вычислений не больше числа ядер: при наплыве входов лишние ждут в очереди,
+# а не делят процессор и память со всеми остальными.
+HASH_CONCURRENCY = os.cpu_count() or 1
+_hash_slots = threading.BoundedSemaphore(HASH_CONCURRENCY)
+
+SESSION_TTL = 8 * 60 * 60
+MAX_SESSIONS = 100000
+
+
+def _scrypt(password, salt, n, r, p):
+    # maxmem с запасом: по умолчанию OpenSSL ограничивает 32 МБ
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + (1 << 20))
+
+
+def hash_password(password, scheme=None):
+    """Солёный хэш пароля в виде 'схема$параметры$соль$хэш'"""
+    scheme = scheme or PASSWORD_SCHEME
+    salt = os.urandom(SALT_BYTES)
+    with _hash_slots:
+        if scheme == 'scrypt':
+            digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+            return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+        if scheme == 'pbkdf2_sha256':
+            digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, PBKDF2_ITERATIONS)
+            return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${salt.hex()}${digest.hex()}"
+    raise ValueError(f"неизвестная схема хэширования: {scheme}")
+
+
+def is_hashed(stored):
+    return stored.startswith(('scrypt$', 'pbkdf2_sha256$'))
+
+
+def verify_password(password, stored):
+    """Проверяет пароль по хэшу; строки без схемы — старые пароли в открытом виде"""
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+    parts = stored.split('$')
+    with _hash_slots:
+        if parts[0] == 'scrypt':
+            n, r, p = (int(value) for value in parts[1:4])
+            digest = _scrypt(password, bytes.fromhex(parts[4]), n, r, p)
+            return hmac.compare_digest(digest.hex(), parts[5])
+        iterations = int(parts[1])
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), bytes.fromhex(parts[2]), iterations)
+        return hmac.compare_digest(digest.hex(), parts[3])
+
+
+def needs_rehash(stored):
+    """True для открытых паролей и хэшей со схемой или стоимостью, отличной от текущей"""
+    if PASSWORD_SCHEME == 'scrypt':
+        return not stored.startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+    return not stored.startswith(f"pbkdf2_sha256${PBKDF2_ITERATIONS}$")
+
+
+class SessionStore:
+    """Сессии в памяти процесса: токен -> данные пользователя, без обращения к базе"""
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, user):
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                self._purge(now)
+            if len(self._sessions) >= self.max_sessions:
+                # Вытесняем самую старую сессию (dict хранит порядок вставки)
+                del self._sessions[next(iter(self._sessions))]
+            self._sessions[token] = (now + self.ttl, user)
+        return token
+
+    def get(self, token):
+        """Данные пользователя по токену или None, если сессии нет или она истекла"""
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._sessions[token]
+                return None
+            return entry[1]
+
+    def drop(self, token):
+        with self._lock:
+            return self._sessions.pop(token, None) is not None
+
+    def drop_user(self, user_id):
+        """Закрывает все сессии пользователя (например, после смены пароля)"""
+        with self._lock:
+            for token in [token for token, (_, user) in self._sessions.items() if user['id'] == user_id]:
+                del self._sessions[token]
+
+    def _purge(self, now):
+        for token in [token for token, (expires, _) in self._sessions.items() if expires <= now]:
+            del self._sessions[token]
+
+
+_session_store = SessionStore()
+
+
+def get_session_store():
+    """Общее для процесса хранилище сессий"""
+    return _session_store
+
+
+def migrate_passwords(db):
+    """Хэширует все пароли, ещё хранящиеся в открытом виде; возвращает их число"""
+    with db.connection() as conn:
+        rows = conn.execute("SELECT user_id, password FROM Users").fetchall()
+    legacy = [(user_id, password) for user_id, password in rows if not is_hashed(password)]
+    updates = [(hash_password(password), user_id, password) for user_id, password in legacy]
+    with db.connection() as conn:
+        # Условие по старому значению не даёт перезаписать пароль, изменённый параллельно
+        conn.executemany("UPDATE Users SET password = ? WHERE user_id = ? AND password = ?", updates)
+    return len(updates)
+
+
+def main():
+    from database import DEFAULT_DB_NAME, Database
+
+    parser = argparse.ArgumentParser(description="Перевод паролей пользователей на солёные хэши")
+    parser.add_argument('--db', default=DEFAULT_DB_NAME, help="файл базы данных")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    count = migrate_passwords(db)
+    print(f"✓ Захэшировано паролей: {count}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+# backends.py
+"""Хранилища под Database: SQLite (по умолчанию) и PostgreSQL через DB-API.
+
+Бэкенд отвечает за всё, чем диалекты расходятся: как открыть соединение,
+стиль параметров, id вставленной строки, upsert, массовую вставку, блокировку
+записи, версию схемы и полнотекстовый поиск. CRUD пишут SQL с '?' и пользуются
+поверхностью sqlite3.Connection (execute, executemany, cursor, row_factory,
+lastrowid, rowcount); соединения PostgreSQL оборачиваются в неё же.
+
+Для PostgreSQL нужен драйвер psycopg (3) или psycopg2; база задаётся URL
+postgresql://пользователь:пароль@хост/база.
+"""
+import functools
+import os
+import re
+import sqlite3
+import time
+
+from metrics import METRICS
+
+try:
+    import psycopg
+except ImportError:
+    psycopg = None
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+# Сколько ждать блокировку записи, прежде чем SQLite вернёт "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+# Настройки, которые применяются к каждому соединению один раз при его создании
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+    "PRAGMA cache_size = -16000",      # ~16 МБ страничного кэша
+    "PRAGMA mmap_size = 134217728",    # 128 МБ memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+)
+
+POSTGRES_SCHEMES = ('postgresql://', 'postgres://')
+# Ключ advisory-блокировки, которой писатели PostgreSQL сериализуются, как в SQLite
+POSTGRES_WRITE_LOCK = 0x5348454C
+# Многострочный INSERT: строк в одном операторе (и не больше 65535 параметров)
+BULK_INSERT_ROWS = 1000
+POSTGRES_MAX_PARAMS = 65535
+# Первичные ключи таблиц: к INSERT в них PostgreSQL-бэкенд дописывает RETURNING
+PRIMARY_KEYS = {'animals': 'animal_id', 'users': 'user_id', 'adoptionrequests': 'request_id'}
+
+# Документ полнотекстового поиска в PostgreSQL; выражение совпадает с GIN-индексом миграции
+POSTGRES_SEARCH_DOCUMENT = ("to_tsvector('simple', name || ' ' || species || ' ' || coalesce(breed, '')"
+                            " || ' ' || coalesce(health_status, ''))")
+
+_SQL_TOKENS = re.compile(r"'(?:[^']|'')*'|\?|%")
+_INSERT_INTO = re.compile(r"\s*INSERT\s+INTO\s+(\w+)", re.IGNORECASE)
+_INSERT_VALUES = re.compile(r"(\s*INSERT\s+INTO\s+.+?\s+VALUES\s*)(\([^()]*\))\s*", re.IGNORECASE | re.DOTALL)
+_RETURNING = re.compile(r"\bRETURNING\b", re.IGNORECASE)
+_SCHEMA_NAME = re.compile(r"[A-Za-z_]\w*")
+
+
+@functools.lru_cache(maxsize=1024)
+def format_params(sql):
+    """'?' -> '%s' вне строковых литералов; '%' экранируется для драйвера"""
+    return _SQL_TOKENS.sub(lambda m: '%s' if m.group() == '?' else '%%' if m.group() == '%' else m.group(), sql)
+
+
+class Backend:
+    """Общий интерфейс бэкенда; подклассы задают диалект"""
+    name = None
+    paramstyle = 'qmark'
+    # Возможности сверх CRUD: snapshot — онлайн-копии и реплика, statistics — сводки
+    # на триггерах (stats.py), changefeed — журнал изменений (changefeed.py)
+    features = frozenset()
+    # Шаблоны текстового поиска AnimalCRUD.search_animals; {filters} — условия фильтров.
+    # Окно: параметры (запрос, *фильтры, смещение); выдача: (запрос, нижний id, *фильтры, limit, offset)
+    search_window_sql = None
+    search_ranked_sql = None
+    IntegrityError = sqlite3.IntegrityError
+    Error = sqlite3.Error
+
+    def connect(self, db_name):
+        raise NotImplementedError
+
+    def db_key(self, db_name):
+        """Ключ базы для реестра экземпляров и однократной миграции"""
+        return db_name
+
+    def require(self, feature):
+        if feature not in self.features:
+            raise NotImplementedError(f"бэкенд {self.name} не поддерживает {feature}")
+
+    def begin_write(self, conn):
+        """Открывает транзакцию с блокировкой записи"""
+        raise NotImplementedError
+
+    def schema_version(self, conn):
+        raise NotImplementedError
+
+    def set_schema_version(self, conn, version):
+        raise NotImplementedError
+
+    def upsert_sql(self, table, columns, keys):
+        """INSERT, обновляющий остальные колонки при конфликте по keys.
+
+        ON CONFLICT ... DO UPDATE понимают оба диалекта (SQLite 3.24+, PostgreSQL 9.5+)
+        """
+        updates = [column for column in columns if column not in keys]
+        action = ('DO UPDATE SET ' + ', '.join(f'{column} = excluded.{column}' for column in updates)
+                  if updates else 'DO NOTHING')
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT ({', '.join(keys)}) {action}")
+
+    def text_query(self, text):
+        """Текст пользователя -> запрос полнотекстового поиска ('' — искать нечего)"""
+        raise NotImplementedError
+
+    def unindexed(self, column):
+        """Колонка в условии, для которого планировщик не должен выбирать индекс"""
+        return column
+
+
+class SQLiteBackend(Backend):
+    name = 'sqlite'
+    features = frozenset({'snapshot', 'statistics', 'changefeed'})
+    # FTS5 и ранжирование bm25 в окне последних SEARCH_RANK_WINDOW совпадений
+    search_window_sql = '''SELECT s.rowid FROM AnimalSearch s JOIN Animals a ON a.animal_id = s.rowid
+                           WHERE AnimalSearch MATCH ?{filters} ORDER BY s.rowid DESC LIMIT 1 OFFSET ?'''
+    search_ranked_sql = '''SELECT a.* FROM AnimalSearch s JOIN Animals a ON a.animal_id = s.rowid
+                           WHERE AnimalSearch MATCH ? AND s.rowid >= ?{filters}
+                           ORDER BY bm25(AnimalSearch) LIMIT ? OFFSET ?'''
+
+    def connect(self, db_name):
+        conn = sqlite3.connect(db_name, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                               factory=METRICS.connection_factory)
+        METRICS.instrument(conn)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def db_key(self, db_name):
+        return db_name if db_name == ':memory:' else os.path.abspath(db_name)
+
+    def begin_write(self, conn):
+        # Блокировка записи берётся сразу, а не при первом изменении
+        conn.execute("BEGIN IMMEDIATE")
+
+    def schema_version(self, conn):
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def set_schema_version(self, conn, version):
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+
+    def text_query(self, text):
+        """Все слова обязательны, последнее — как префикс (синтаксис FTS5)"""
+        words = [f'"{word}"' for word in re.findall(r'\w+', text.lower())]
+        if words:
+            words[-1] += '*'
+        return ' '.join(words)
+
+    def unindexed(self, column):
+        # Унарный плюс снимает с колонки индексы в SQLite
+        return f'+{column}'
+
+
+class PostgresBackend(Backend):
+    """PostgreSQL через DB-API драйвер (psycopg или psycopg2).
+
+    schema — отдельная схема (search_path) для базы приюта, например для
+    прогонов conformance.py рядом с рабочими данными.
+    """
+    name = 'postgresql'
+    paramstyle = 'format'
+    # Полнотекстовый поиск — tsvector с GIN-индексом; ранжирование ts_rank
+    search_window_sql = f'''SELECT a.animal_id FROM (SELECT to_tsquery('simple', ?) AS q) t
+                            JOIN Animals a ON {POSTGRES_SEARCH_DOCUMENT} @@ t.q
+                            WHERE TRUE{{filters}} ORDER BY a.animal_id DESC LIMIT 1 OFFSET ?'''
+    search_ranked_sql = f'''SELECT a.* FROM (SELECT to_tsquery('simple', ?) AS q) t
+                            JOIN Animals a ON {POSTGRES_SEARCH_DOCUMENT} @@ t.q
+                            WHERE a.animal_id >= ?{{filters}}
+                            ORDER BY ts_rank({POSTGRES_SEARCH_DOCUMENT}, t.q) DESC, a.animal_id LIMIT ? OFFSET ?'''
+
+    def __init__(self, schema=None):
+        self.driver = psycopg or psycopg2
+        if self.driver is None:
+            raise ImportError("для PostgreSQL установите psycopg или psycopg2")
+        if schema is not None and not _SCHEMA_NAME.fullmatch(schema):
+            raise ValueError(f"недопустимое имя схемы: {schema!r}")
+        self.schema = schema
+        self.IntegrityError = self.driver.IntegrityError
+        self.Error = self.driver.Error
+
+    def connect(self, db_name):
+        conn = DBAPIConnection(self.driver.connect(db_name), self)
+        if self.schema:
+            conn.execute(f"CREATE SCHEMA IF NOT EXISTS {self.schema}")
+            conn.execute(f"SET search_path TO {self.schema}")
+            conn.commit()
+        return conn
+
+    def db_key(self, db_name):
+        return f'{db_name}#{self.schema}' if self.schema else db_name
+
+    def begin_write(self, conn):
+        # Драйвер сам открывает транзакцию; блокировка держится до commit/rollback
+        conn.execute("SELECT pg_advisory_xact_lock(?)", (POSTGRES_WRITE_LOCK,))
+
+    def schema_version(self, conn):
+        if conn.execute("SELECT to_regclass('schemaversion')").fetchone()[0] is None:
+            return 0
+        row = conn.execute("SELECT version FROM SchemaVersion WHERE id = 1").fetchone()
+        return row[0] if row else 0
+
+    def set_schema_version(self, conn, version):
+        conn.execute("CREATE TABLE IF NOT EXISTS SchemaVersion (id INTEGER PRIMARY KEY CHECK (id = 1), "
+                     "version INTEGER NOT NULL)")
+        conn.execute(self.upsert_sql('SchemaVersion', ['id', 'version'], ['id']), (1, version))
+
+    def text_query(self, text):
+        """Все слова обязательны, последнее — как префикс (синтаксис tsquery)"""
+        words = [f"'{word}'" for word in re.findall(r'\w+', text.lower())]
+        if words:
+            words[-1] += ':*'
+        return ' & '.join(words)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def prepare(sql):
+        """SQL с '?' -> (SQL драйвера, добавлен ли RETURNING первичного ключа)"""
+        sql = format_params(sql)
+        insert = _INSERT_INTO.match(sql)
+        pk = PRIMARY_KEYS.get(insert.group(1).lower()) if insert else None
+        if pk is None or _RETURNING.search(sql):
+            return sql, False
+        return f'{sql.rstrip()} RETURNING {pk}', True
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def bulk_insert_sql(sql, rows):
+        """INSERT ... VALUES (...) -> один оператор на rows строк; None, если sql не такой"""
+        match = _INSERT_VALUES.fullmatch(sql)
+        if match is None:
+            return None
+        head, group = match.groups()
+        return format_params(head + ', '.join([group] * rows))
+
+
+def get_backend(db_name):
+    """Бэкенд по имени базы: URL postgresql:// — PostgreSQL, иначе файл SQLite"""
+    if db_name.startswith(POSTGRES_SCHEMES):
+        return PostgresBackend()
+    return SQLITE
+
+
+SQLITE = SQLiteBackend()
+
+
+class DBAPICursor:
+    """Курсор DB-API с поведением sqlite3.Cursor: '?', row_factory, lastrowid"""
+    def __init__(self, connection):
+        self.connection = connection
+        self.row_factory = connection.row_factory
+        self.lastrowid = None
+        self._cursor = connection.raw.cursor()
+        self._rowcount = None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount if self._rowcount is None else self._rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, sql, parameters=()):
+        prepared, returning = self.connection.backend.prepare(sql)
+        self._run(sql, self._cursor.execute, prepared, tuple(parameters))
+        self._rowcount = None
+        if returning:
+            row = self._cursor.fetchone()
+            self.lastrowid = row[0] if row else None
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        """Массовая вставка — многострочным INSERT порциями, остальное — executemany драйвера"""
+        rows = [tuple(params) for params in seq_of_parameters]
+        self._rowcount = 0
+        if not rows:
+            return self
+        chunk = max(1, min(BULK_INSERT_ROWS, POSTGRES_MAX_PARAMS // len(rows[0])))
+        if self.connection.backend.bulk_insert_sql(sql, 1) is None:
+            self._run(sql, self._cursor.executemany, self.connection.backend.prepare(sql)[0], rows)
+            self._rowcount = self._cursor.rowcount
+            return self
+        for start in range(0, len(rows), chunk):
+            part = rows[start:start + chunk]
+            self._run(sql, self._cursor.execute, self.connection.backend.bulk_insert_sql(sql, len(part)),
+                      [value for row in part for value in row])
+            self._rowcount += self._cursor.rowcount
+        return self
+
+    def _run(self, sql, method, prepared, parameters):
+        self.connection.in_transaction = True
+        if not METRICS.enabled:
+            method(prepared, parameters)
+            return
+        start = time.perf_counter()
+        failed = True
+        try:
+            method(prepared, parameters)
+            failed = False
+        finally:
+            # План запроса строится только для SQLite: параметры не передаются
+            METRICS.observe_query(self.connection, sql, None, (time.perf_counter() - start) * 1000, 1, failed)
+
+    def _make(self, row):
+        return row if self.row_factory is None or row is None else self.row_factory(self, tuple(row))
+
+    def fetchone(self):
+        return self._make(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._make(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._make(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+class DBAPIConnection:
+    """Соединение DB-API с той поверхностью sqlite3.Connection, которой пользуются CRUD.
+
+    Как и sqlite3, драйвер сам открывает транзакцию первым оператором;
+    with conn — commit при успехе и rollback при исключении.
+    """
+    def __init__(self, raw, backend):
+        self.raw = raw
+        self.backend = backend
+        self.row_factory = None
+        self.in_transaction = False
+
+    def cursor(self):
+        return DBAPICursor(self)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        self.raw.commit()
+        self.in_transaction = False
+
+    def rollback(self):
+        self.raw.rollback()
+        self.in_transaction = False
+
+    def close(self):
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
@@ -0,0 +1,1035 @@
+# benchmark.py
+"""Микробенчмарки слоя данных приюта.
+
+Запуск: python benchmark.py <сценарий> [параметры]
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import threading
+import multiprocessing
+import os
+import random
+import resource
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from database import Database
+from cache import ListingCache
+from crud_operations import AnimalCRUD, AdoptionCRUD, UserCRUD
+import auth
+from models import Animal, AnimalRecord, AdoptionRequest, User
+import changefeed
+import datagen
+import metrics
+import shards
+import stats
+import export_data
+import import_data
+from async_crud import AsyncDatabase, AsyncAnimalCRUD, AsyncAdoptionCRUD
+from server import ShelterServer
+from urllib.parse import urlsplit
+
+
+class ConnectPerCallDatabase(Database):
+    """Прежний путь: новое ненастроенное соединение на каждый вызов"""
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.db_name)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+def ops_per_sec(fn, ops):
+    """Выполняет fn ops раз и возвращает число операций в секунду"""
+    start = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    return ops / (time.perf_counter() - start)
+
+
+def print_header(title):
+    print(f"\n{'=' * 60}")
+    print(title)
+    print(f"{'=' * 60}")
+
+
+def bench_pool(args):
+    """Пул соединений против connect-per-call для add_animal/get_available_animals"""
+    print_header(f"ПУЛ СОЕДИНЕНИЙ ({args.ops} операций)")
+    animal = Animal('Барсик', 'Кот', 'Дворовый', 3, 'Здоров')
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, db_class in (('connect-per-call', ConnectPerCallDatabase), ('pool', Database)):
+            db = db_class(os.path.join(tmp, f'{label}.db'))
+            # Без кэша списков: чтение должно каждый раз брать соединение, а не попадать в кэш
+            db.cache = ListingCache(max_entries=0)
+            crud = AnimalCRUD(db)
+            # Чтение — до вставок, на одной строке: иначе замер мерил бы разбор растущего списка
+            crud.add_animal(animal)
+            read = ops_per_sec(crud.get_available_animals, args.ops)
+            add = ops_per_sec(lambda: crud.add_animal(animal), args.ops)
+            print(f"{label:<18} add_animal: {add:>10.0f} оп/с   get_available_animals: {read:>10.0f} оп/с")
+            db.close()
+
+
+def fill_animals(db_name, rows):
+    """Быстро наполняет Animals синтетическими строками"""
+    db = Database(db_name)
+    with db.connection() as conn:
+        conn.executemany('''INSERT INTO Animals (name, species, breed, age, arrival_date, health_status, status)
+                             VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         ((f'Животное {i}', 'Кот' if i % 2 else 'Собака', 'Дворовый', i % 15,
+                           '2025-01-10', 'Здоров', 'в приюте') for i in range(rows)))
+    db.close()
+
+
+def peak_rss_kb():
+    """Пиковый RSS текущего процесса в КБ.
+
+    VmHWM сбрасывается при exec, в отличие от ru_maxrss, который наследуется от родителя.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _export_one(db_name, out_dir, fmt, results):
+    """Экспорт Animals одним писателем в отдельном процессе: rows/s и пик RSS"""
+    export_data.OUT_DIR = out_dir
+    conn = sqlite3.connect(db_name)
+    rss_before = peak_rss_kb()
+    start = time.perf_counter()
+    columns, rows = export_data.iter_table_rows(conn.cursor(), 'Animals')
+    filename = export_data.write_export(EXPORT_WRITERS[fmt], rows, columns, 'Animals')
+    elapsed = time.perf_counter() - start
+    conn.close()
+    rss_after = peak_rss_kb()
+    results.put((fmt, elapsed, rss_before, rss_after, os.path.getsize(filename)))
+
+
+EXPORT_WRITERS = {
+    'json': export_data.JSONWriter,
+    'ndjson': export_data.NDJSONWriter,
+    'csv': export_data.CSVWriter,
+    'xml': export_data.XMLWriter,
+    'yaml': export_data.YAMLWriter,
+}
+
+
+def bench_export(args):
+    """Потоковый экспорт: строк в секунду и пиковая память по форматам"""
+    print_header(f"ЭКСПОРТ ANIMALS ({args.rows} строк)")
+    # Каждый формат — в свежем процессе, чтобы пик памяти не накапливался между замерами
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'export.db')
+        fill_animals(db_name, args.rows)
+        for fmt in EXPORT_WRITERS:
+            results = ctx.Queue()
+            proc = ctx.Process(target=_export_one, args=(db_name, tmp, fmt, results))
+            proc.start()
+            fmt, elapsed, rss_before, rss_after, size = results.get()
+            proc.join()
+            print(f"{fmt:<7} {args.rows / elapsed:>10.0f} строк/с   пик RSS: {rss_after / 1024:>7.1f} МБ "
+                  f"(+{(rss_after - rss_before) / 1024:.1f} МБ)   {size} байт")
+
+
+def bench_fanout(args):
+    """Однопроходный экспорт во все форматы: serial / thread / process"""
+    print_header(f"ЭКСПОРТ С РАЗДАЧЕЙ ПО ФОРМАТАМ ({args.rows} строк)")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'export.db')
+        fill_animals(db_name, args.rows)
+        conn = sqlite3.connect(db_name)
+        for executor in export_data.EXECUTORS:
+            start = time.perf_counter()
+            columns, batches = export_data.iter_table_batches(conn.cursor(), 'Animals')
+            export_data.export_batches(batches, columns, 'Animals', executor=executor, out_dir=tmp)
+            elapsed = time.perf_counter() - start
+            print(f"{executor:<8} {elapsed:>7.2f} с   {args.rows / elapsed:>10.0f} строк/с")
+        conn.close()
+
+
+def bench_formats(args):
+    """Размер файла и время записи для каждого формата и метода сжатия"""
+    print_header(f"ФОРМАТЫ И СЖАТИЕ ({args.rows} строк)")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'export.db')
+        fill_animals(db_name, args.rows)
+        conn = sqlite3.connect(db_name)
+        print(f"{'Формат':<9} {'Сжатие':<7} {'Байт':>12} {'Время, с':>9} {'строк/с':>10}")
+        for fmt in export_data.FORMATS:
+            for compression in export_data.available_compressions():
+                columns, batches = export_data.iter_table_batches(conn.cursor(), 'Animals')
+                [result] = export_data.export_batches(batches, columns, 'Animals', [fmt], 'serial', tmp,
+                                                      compression=compression)
+                size = os.path.getsize(result['filename'])
+                print(f"{fmt:<9} {compression:<7} {size:>12} {result['seconds']:>9.2f} "
+                      f"{args.rows / result['seconds']:>10.0f}")
+                os.remove(result['filename'])
+        conn.close()
+
+
+def bench_import(args):
+    """Массовый импорт NDJSON через add_animals против поштучного add_animal"""
+    print_header(f"ИМПОРТ ЖИВОТНЫХ ({args.rows} строк)")
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'animals.ndjson')
+        with open(source, 'w', encoding='utf-8') as f:
+            for i in range(args.rows):
+                f.write(json.dumps({'name': f'Животное {i}', 'species': 'Кот', 'age': i % 15,
+                                                'arrival_date': '2025-01-10'}, ensure_ascii=False) + '\n')
+
+        crud = AnimalCRUD(Database(os.path.join(tmp, 'bulk.db')))
+        inserted, rejected, elapsed = import_data.import_animals(source, crud)
+        print(f"add_animals  {inserted / elapsed:>10.0f} строк/с   (добавлено {inserted}, отклонено {rejected})")
+
+        crud = AnimalCRUD(Database(os.path.join(tmp, 'single.db')))
+        animals = [Animal(f'Животное {i}', 'Кот', age=i % 15) for i in range(min(args.rows, args.ops))]
+        start = time.perf_counter()
+        for animal in animals:
+            crud.add_animal(animal)
+        print(f"add_animal   {len(animals) / (time.perf_counter() - start):>10.0f} строк/с   "
+              f"(по одной строке на транзакцию, {len(animals)} строк)")
+
+
+class LegacyAnimal:
+    """Прежнее представление: обычный класс с __dict__ и strftime на каждый объект"""
+    def __init__(self, name, species, breed=None, age=None, health_status=None, arrival_date=None,
+                 status="в приюте"):
+        self.name = name.strip()
+        self.species = species.strip()
+        self.breed = (breed or "").strip()
+        self.age = age
+        self.health_status = (health_status or "").strip()
+        self.arrival_date = arrival_date or datetime.now().strftime("%Y-%m-%d")
+        self.status = status
+
+
+def bench_models(args):
+    """Память и скорость материализации N животных в разных представлениях (рекомендуется --rows 1000000)"""
+    print_header(f"МАТЕРИАЛИЗАЦИЯ МОДЕЛЕЙ ({args.rows} животных)")
+    rows = [(i, f'Животное {i}', 'Кот', 'Дворовый', i % 15, '2025-01-10', 'Здоров', 'в приюте')
+            for i in range(args.rows)]
+    make_record = tuple.__new__
+    variants = [
+        ('tuple', lambda row: row),
+        ('LegacyAnimal', lambda row: LegacyAnimal(row[1], row[2], row[3], row[4], row[6], None, row[7])),
+        ('Animal()', lambda row: Animal(row[1], row[2], row[3], row[4], row[6], None, row[7], row[0])),
+        ('Animal.from_row', Animal.from_row),
+        ('AnimalRecord', lambda row: make_record(AnimalRecord, row)),
+    ]
+    for label, make in variants:
+        tracemalloc.start()
+        start = time.perf_counter()
+        objects = [make(row) for row in rows]
+        elapsed = time.perf_counter() - start
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<16} {args.rows / elapsed:>12.0f} объектов/с   {size / 1024 / 1024:>8.1f} МБ")
+        del objects
+
+
+def bench_cache(args):
+    """Обновление экрана доступных животных с кэшем выборок и без него"""
+    print_header(f"КЭШ ВЫБОРОК ({args.rows} животных, {args.ops} обновлений)")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'cache.db')
+        fill_animals(db_name, args.rows)
+        for label, cache in (('без кэша', ListingCache(max_entries=0)), ('с кэшем', ListingCache())):
+            db = Database(db_name)
+            db.cache = cache
+            crud = AnimalCRUD(db)
+            # Каждое 50-е действие — запись, сбрасывающая выборку
+            def refresh(counter=iter(range(args.ops))):
+                if next(counter) % 50 == 49:
+                    crud.update_status(1, 'в приюте')
+                crud.get_available_animals()
+            rate = ops_per_sec(refresh, args.ops)
+            stats = cache.stats()
+            print(f"{label:<10} {rate:>10.0f} обновлений/с   попаданий: {stats['hits']}, промахов: {stats['misses']}")
+            db.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_auth(args):
+    """Стоимость хэширования паролей, задержки параллельных входов и сессии"""
+    print_header("АУТЕНТИФИКАЦИЯ")
+    settings = [('scrypt', {'SCRYPT_N': 2 ** n}) for n in (12, 13, 14, 15)]
+    settings += [('pbkdf2_sha256', {'PBKDF2_ITERATIONS': it}) for it in (100000, 300000, 600000)]
+    defaults = {name: getattr(auth, name) for name in ('PASSWORD_SCHEME', 'SCRYPT_N', 'PBKDF2_ITERATIONS')}
+    print(f"{'Схема':<14} {'Параметр':<24} {'хэш, мс':>8}")
+    for scheme, params in settings:
+        for name, value in params.items():
+            setattr(auth, name, value)
+        stored = auth.hash_password('secret', scheme)
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            auth.verify_password('secret', stored)
+            timings.append(time.perf_counter() - start)
+        param = ', '.join(f"{name}={value}" for name, value in params.items())
+        print(f"{scheme:<14} {param:<24} {percentile(timings, 0.5) * 1000:>8.1f}")
+        for name, value in defaults.items():
+            setattr(auth, name, value)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        users = UserCRUD(Database(os.path.join(tmp, 'auth.db')))
+        users.add_user(User('client', 'secret', 'client', 'Client', '+1'))
+        logins = max(8, min(args.ops, 64))
+        for workers in (1, 4, 16):
+            def timed_login(_):
+                start = time.perf_counter()
+                users.login('client', 'secret', 'client')
+                return time.perf_counter() - start
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                timings = list(pool.map(timed_login, range(logins)))
+            print(f"{logins} входов, {workers:>2} потоков: p50 {percentile(timings, 0.5) * 1000:.0f} мс, "
+                  f"p99 {percentile(timings, 0.99) * 1000:.0f} мс")
+        token = users.login('client', 'secret', 'client')
+        print(f"проверка сессии: {ops_per_sec(lambda: users.get_session(token), args.ops * 10):.0f} оп/с")
+
+
+def _adoption_process(db_name, seed, threads, ops, animals, clients, results):
+    """Один процесс стресс-теста: threads потоков подают и тут же одобряют заявки"""
+    db = Database(db_name)
+    crud = AdoptionCRUD(db)
+
+    def client_loop(thread_seed):
+        rnd = random.Random(thread_seed)
+        created = approved = 0
+        for _ in range(ops):
+            request_id = crud.create_request(AdoptionRequest(rnd.randint(1, animals), rnd.randint(1, clients)))
+            if request_id:
+                created += 1
+                if crud.approve_request(request_id):
+                    approved += 1
+        return created, approved
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        totals = list(pool.map(client_loop, [seed * 1000 + i for i in range(threads)]))
+    results.put((sum(t[0] for t in totals), sum(t[1] for t in totals)))
+    db.close()
+
+
+ADOPTION_INVARIANTS = [
+    ("животные с несколькими одобренными заявками",
+     "SELECT COUNT(*) FROM (SELECT animal_id FROM AdoptionRequests WHERE status = 'approved' "
+     "GROUP BY animal_id HAVING COUNT(*) > 1)"),
+    ("усыновлённые животные без одобренной заявки",
+     "SELECT COUNT(*) FROM Animals a WHERE status = 'усыновлено' AND NOT EXISTS "
+     "(SELECT 1 FROM AdoptionRequests r WHERE r.animal_id = a.animal_id AND r.status = 'approved')"),
+    ("одобренные заявки на животных, которые числятся в приюте",
+     "SELECT COUNT(*) FROM AdoptionRequests r JOIN Animals a ON a.animal_id = r.animal_id "
+     "WHERE r.status = 'approved' AND a.status != 'усыновлено'"),
+    ("ожидающие заявки на усыновлённых животных",
+     "SELECT COUNT(*) FROM AdoptionRequests r JOIN Animals a ON a.animal_id = r.animal_id "
+     "WHERE r.status = 'pending' AND a.status = 'усыновлено'"),
+]
+
+
+def bench_adoption(args):
+    """Стресс-тест усыновления: процессы x потоки борются за немногих животных"""
+    print_header(f"СТРЕСС-ТЕСТ УСЫНОВЛЕНИЯ ({args.processes} процессов x {args.threads} потоков, "
+                 f"{args.animals} животных)")
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'adoption.db')
+        fill_animals(db_name, args.animals)
+        clients = 20
+        db = Database(db_name)
+        with db.connection() as conn:
+            conn.executemany("INSERT INTO Users (username, password, role, name, phone) VALUES (?, '-', 'client', ?, '')",
+                             [(f'client{i}', f'Client {i}') for i in range(clients)])
+
+        results = ctx.Queue()
+        start = time.perf_counter()
+        procs = [ctx.Process(target=_adoption_process,
+                             args=(db_name, seed, args.threads, args.ops, args.animals, clients, results))
+                 for seed in range(args.processes)]
+        for proc in procs:
+            proc.start()
+        totals = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - start
+
+        created = sum(t[0] for t in totals)
+        approved = sum(t[1] for t in totals)
+        print(f"заявок создано: {created}, одобрено: {approved} за {elapsed:.2f} с "
+              f"({(created + approved) / elapsed:.0f} операций/с)")
+        failed = False
+        with db.connection() as conn:
+            adopted = conn.execute("SELECT COUNT(*) FROM Animals WHERE status = 'усыновлено'").fetchone()[0]
+            if adopted != approved:
+                failed = True
+                print(f"❌ усыновлено {adopted}, а успешных одобрений {approved}")
+            for label, sql in ADOPTION_INVARIANTS:
+                count = conn.execute(sql).fetchone()[0]
+                failed = failed or count > 0
+                print(f"{'❌' if count else '✓'} {label}: {count}")
+        mismatches = len(stats.check_statistics(db))
+        failed = failed or mismatches > 0
+        print(f"{'❌' if mismatches else '✓'} расхождения сводной статистики: {mismatches}")
+        db.close()
+    if failed:
+        raise SystemExit(1)
+
+
+def bench_batch(args):
+    """Поштучное одобрение заявок против approve_requests одной транзакцией"""
+    requests = min(args.ops, args.rows)
+    print_header(f"ПАКЕТНАЯ ОБРАБОТКА ЗАЯВОК ({requests} заявок)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('поштучно', 'пакетом'):
+            db_name = os.path.join(tmp, f'{len(mode)}.db')
+            fill_animals(db_name, requests)
+            db = Database(db_name)
+            with db.connection() as conn:
+                conn.execute("INSERT INTO Users (username, password, role, name, phone) VALUES ('c', '-', 'client', 'C', '')")
+            crud = AdoptionCRUD(db)
+            ids = [crud.create_request(AdoptionRequest(animal_id, 1)) for animal_id in range(1, requests + 1)]
+            start = time.perf_counter()
+            if mode == 'поштучно':
+                approved = sum(crud.approve_request(request_id) for request_id in ids)
+            else:
+                approved = sum(crud.approve_requests(ids).values())
+            elapsed = time.perf_counter() - start
+            print(f"{mode:10}: одобрено {approved} за {elapsed:.3f} с ({approved / elapsed:.0f} заявок/с)")
+            db.close()
+
+
+async def _async_load(db, clients, animals, concurrency):
+    """clients имитированных клиентов: страница каталога, заявка, одобрение или отказ"""
+    latencies = []
+    outcomes = {'created': 0, 'approved': 0, 'rejected': 0, 'timeouts': 0}
+    limit = asyncio.Semaphore(concurrency)
+    async with AsyncDatabase(db, timeout=10.0) as adb:
+        animal_crud = AsyncAnimalCRUD(adb)
+        adoption_crud = AsyncAdoptionCRUD(adb)
+
+        async def client(client_no):
+            rnd = random.Random(client_no)
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    await animal_crud.get_available_animals_page(rnd.randint(0, animals), 20)
+                    request_id = await adoption_crud.create_request(
+                        AdoptionRequest(rnd.randint(1, animals), client_no % 20 + 1))
+                    if request_id:
+                        outcomes['created'] += 1
+                        if rnd.random() < 0.5:
+                            done = await adoption_crud.approve_request(request_id)
+                            outcomes['approved'] += done
+                        else:
+                            done = await adoption_crud.reject_request(request_id)
+                            outcomes['rejected'] += done
+                except asyncio.TimeoutError:
+                    outcomes['timeouts'] += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(clients)))
+        elapsed = time.perf_counter() - start
+        stats = adb.stats()
+    return latencies, outcomes, stats, elapsed
+
+
+def bench_async(args):
+    """Нагрузка тысяч одновременных asyncio-клиентов на асинхронный фасад"""
+    clients = args.ops
+    print_header(f"АСИНХРОННЫЙ ФАСАД ({clients} клиентов, до {args.concurrency} одновременно)")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'async.db')
+        fill_animals(db_name, args.rows)
+        db = Database(db_name)
+        with db.connection() as conn:
+            conn.executemany("INSERT INTO Users (username, password, role, name, phone) VALUES (?, '-', 'client', ?, '')",
+                             [(f'client{i}', f'Client {i}') for i in range(20)])
+        latencies, outcomes, stats, elapsed = asyncio.run(_async_load(db, clients, args.rows, args.concurrency))
+        db.close()
+    print(f"клиентов обслужено: {len(latencies)} за {elapsed:.2f} с ({len(latencies) / elapsed:.0f} клиентов/с)")
+    print(f"задержка клиента: p50 {percentile(latencies, 0.5) * 1000:.1f} мс, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} мс, p99 {percentile(latencies, 0.99) * 1000:.1f} мс")
+    print(f"заявок: {outcomes['created']}, одобрено: {outcomes['approved']}, отклонено: {outcomes['rejected']}, "
+          f"таймаутов: {outcomes['timeouts']}")
+    print(f"записей: {stats['writes']} в {stats['write_batches']} проходах писателя "
+          f"({stats['writes_per_batch']:.1f} на проход)")
+
+
+def _http_client(host, port, requests, animals, token, seed, results):
+    """Один клиент нагрузки: keep-alive соединение, ETag запоминается между запросами"""
+    rnd = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    etags = {}
+    latencies, statuses, wire_bytes = [], {}, 0
+    for _ in range(requests):
+        roll = rnd.random()
+        headers = {'Accept-Encoding': 'gzip'}
+        if token and roll < 0.1:
+            method, path, body = 'POST', '/requests', json.dumps({'animal_id': rnd.randint(1, animals)})
+            headers['Authorization'] = f'Bearer {token}'
+            headers['Content-Type'] = 'application/json'
+        elif roll < 0.6:
+            method, path, body = 'GET', '/animals/available?limit=50', None
+        else:
+            method, path, body = 'GET', f'/animals?after={rnd.randint(0, animals)}&limit=50', None
+        if path in etags:
+            headers['If-None-Match'] = etags[path]
+        start = time.perf_counter()
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        payload = response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        wire_bytes += len(payload)
+        if response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+    conn.close()
+    results.append((latencies, statuses, wire_bytes))
+
+
+def _run_http_load(host, port, clients, requests, animals, token):
+    results = []
+    threads = [threading.Thread(target=_http_client, args=(host, port, requests, animals, token, i, results))
+               for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [value for result in results for value in result[0]]
+    statuses = {}
+    for result in results:
+        for status, count in result[1].items():
+            statuses[status] = statuses.get(status, 0) + count
+    print(f"запросов: {len(latencies)} за {elapsed:.2f} с ({len(latencies) / elapsed:.0f} запросов/с)")
+    print(f"задержка: p50 {percentile(latencies, 0.5) * 1000:.1f} мс, p99 {percentile(latencies, 0.99) * 1000:.1f} мс")
+    print(f"ответы: {', '.join(f'{status}: {count}' for status, count in sorted(statuses.items()))}")
+    print(f"передано тел ответов: {sum(result[2] for result in results) / 1024:.0f} КБ")
+
+
+def bench_http(args):
+    """Нагрузка на HTTP API: чтение каталога с ETag и gzip, изредка — заявки"""
+    print_header(f"HTTP API ({args.threads} клиентов x {args.ops} запросов)")
+    if args.url:
+        url = urlsplit(args.url)
+        print(f"цель: {args.url} (только чтение)")
+        _run_http_load(url.hostname, url.port or 80, args.threads, args.ops, args.rows, None)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'http.db')
+        fill_animals(db_name, args.rows)
+        db = Database(db_name)
+        server = ShelterServer(('127.0.0.1', 0), db)
+        server.users.add_user(User('loadclient', 'secret', 'client', 'Load Client', ''))
+        token = server.users.login('loadclient', 'secret', 'client')
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            _run_http_load('127.0.0.1', server.server_address[1], args.threads, args.ops, args.rows, token)
+        finally:
+            server.shutdown()
+            server.server_close()
+            db.close()
+
+
+SEARCH_CASES = [
+    ("текст 'сиамская'", dict(text='сиамская')),
+    ("собака до 3 лет", dict(species='Собака', max_age=2)),
+    ("'хаски', в приюте", dict(text='хаски', status='в приюте')),
+    ("'рекс аллергия'", dict(text='рекс аллергия')),
+    ("кот, прибыл в 2024", dict(species='Кот', arrived_from='2024-01-01', arrived_to='2024-12-31')),
+    ("на лечении", dict(status='на лечении')),
+    ("прибыл 1-2 марта 2024", dict(arrived_from='2024-03-01', arrived_to='2024-03-02')),
+    ("'барсик', кот 1-5 лет", dict(text='барсик', species='Кот', min_age=1, max_age=5)),
+]
+
+
+def bench_search(args):
+    """Полнотекстовый и фасетный поиск на синтетической базе"""
+    print_header(f"ПОИСК ЖИВОТНЫХ ({args.rows} животных)")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'search.db')
+        db = Database(db_name)
+        start = time.perf_counter()
+        datagen.generate(db, animals=args.rows, users=0, requests=0)
+        print(f"наполнение: {time.perf_counter() - start:.1f} с")
+        crud = AnimalCRUD(db)
+        for label, filters in SEARCH_CASES:
+            timings = []
+            for _ in range(max(5, args.ops // 100)):
+                start = time.perf_counter()
+                rows, _ = crud.search_animals(limit=20, **filters)
+                timings.append(time.perf_counter() - start)
+            print(f"{label:30}: {len(rows):3} строк, p50 {percentile(timings, 0.5) * 1000:6.2f} мс, "
+                  f"p95 {percentile(timings, 0.95) * 1000:6.2f} мс")
+        db.close()
+
+
+# Замедления меньше этого (мс) не считаются регрессией, сколько бы процентов они ни составили
+REGRESSION_FLOOR_MS = 0.05
+
+
+def _suite_cases(db, tmp, rnd):
+    """Случаи набора: (имя, подготовка -> аргументы, замеряемая функция, число повторов или None)"""
+    animals, adoptions, users = AnimalCRUD(db), AdoptionCRUD(db), UserCRUD(db)
+    with db.connection() as conn:
+        available = [row[0] for row in conn.execute("SELECT animal_id FROM Animals WHERE status = 'в приюте'")]
+        max_animal = conn.execute("SELECT MAX(animal_id) FROM Animals").fetchone()[0]
+        clients = [row[0] for row in conn.execute("SELECT user_id FROM Users WHERE role = 'client' LIMIT 1000")]
+        client_name = conn.execute("SELECT username FROM Users WHERE user_id = ?", (clients[0],)).fetchone()[0]
+    rnd.shuffle(available)
+
+    def cold(*args):
+        # Чтения меряем мимо кэша выборок: интересен путь до базы
+        db.cache.clear()
+        return args
+
+    def new_requests(count):
+        return [adoptions.create_request(AdoptionRequest(available.pop(), rnd.choice(clients)))
+                for _ in range(count)]
+
+    def export(fmt):
+        conn = sqlite3.connect(db.db_name)
+        columns, batches = export_data.iter_table_batches(conn.cursor(), 'Animals')
+        [result] = export_data.export_batches(batches, columns, 'Animals', [fmt], 'serial', tmp)
+        conn.close()
+        os.remove(result['filename'])
+
+    cases = [
+        ('AnimalCRUD.add_animal', lambda: (Animal('Бенч', 'Кот', age=1),), animals.add_animal, None),
+        ('AnimalCRUD.add_animals[1000]', lambda: ([Animal(f'Бенч {i}', 'Кот') for i in range(1000)],),
+         animals.add_animals, None),
+        ('AnimalCRUD.get_all_animals', cold, animals.get_all_animals, 3),
+        ('AnimalCRUD.get_available_animals', cold, animals.get_available_animals, 3),
+        ('AnimalCRUD.iter_all_animals', lambda: (), lambda: deque(animals.iter_all_animals(), 0), 3),
+        ('AnimalCRUD.iter_available_animals', lambda: (), lambda: deque(animals.iter_available_animals(), 0), 3),
+        ('AnimalCRUD.get_animals_page', lambda: (rnd.randint(0, max_animal),), animals.get_animals_page, None),
+        ('AnimalCRUD.get_available_animals_page', lambda: (rnd.randint(0, max_animal),),
+         animals.get_available_animals_page, None),
+        ('AnimalCRUD.search_animals[текст]', lambda: ('хаски',), animals.search_animals, None),
+        ('AnimalCRUD.search_animals[фильтры]', lambda: (None, 'Собака', None, 2), animals.search_animals, None),
+        ('AnimalCRUD.update_status', lambda: (rnd.randint(1, max_animal), 'на лечении'), animals.update_status, None),
+        ('AnimalCRUD.update_statuses[100]',
+         lambda: ({rnd.randint(1, max_animal): 'на лечении' for _ in range(100)},), animals.update_statuses, None),
+        ('AdoptionCRUD.create_request', lambda: (AdoptionRequest(available.pop(), rnd.choice(clients)),),
+         adoptions.create_request, None),
+        ('AdoptionCRUD.get_all_requests', cold, adoptions.get_all_requests, 3),
+        ('AdoptionCRUD.iter_all_requests', lambda: (), lambda: deque(adoptions.iter_all_requests(), 0), 3),
+        ('AdoptionCRUD.get_requests_page', lambda: (), adoptions.get_requests_page, None),
+        ('AdoptionCRUD.get_requests_by_client_id', lambda: cold(rnd.choice(clients)),
+         adoptions.get_requests_by_client_id, None),
+        ('AdoptionCRUD.approve_request', lambda: tuple(new_requests(1)), adoptions.approve_request, None),
+        ('AdoptionCRUD.approve_requests[100]', lambda: (new_requests(100),), adoptions.approve_requests, None),
+        ('AdoptionCRUD.reject_request', lambda: tuple(new_requests(1)), adoptions.reject_request, None),
+        ('AdoptionCRUD.reject_requests[100]', lambda: (new_requests(100),), adoptions.reject_requests, None),
+        ('AdoptionCRUD.cancel_request',
+         lambda: (lambda client: (adoptions.create_request(AdoptionRequest(available.pop(), client)), client))(
+             rnd.choice(clients)), adoptions.cancel_request, None),
+        ('UserCRUD.add_user', lambda: (User(f'bench{time.perf_counter_ns()}', 'secret', 'client', 'Бенч', ''),),
+         users.add_user, 5),
+        ('UserCRUD.authenticate', lambda: (client_name, datagen.GENERATED_PASSWORD, 'client'),
+         users.authenticate, 5),
+        ('UserCRUD.login', lambda: (client_name, datagen.GENERATED_PASSWORD, 'client'), users.login, 5),
+    ]
+    token = users.login(client_name, datagen.GENERATED_PASSWORD, 'client')
+    cases.append(('UserCRUD.get_session', lambda: (token,), users.get_session, None))
+    cases.append(('UserCRUD.logout', lambda: (users.sessions.create({'id': 0}),), users.logout, None))
+    for fmt in export_data.FORMATS:
+        cases.append((f'export[{fmt}]', lambda fmt=fmt: (fmt,), export, 3))
+    return cases
+
+
+def bench_suite(args):
+    """Набор замеров всех методов CRUD, входа и форматов экспорта с базовой линией"""
+    print_header(f"НАБОР ЗАМЕРОВ ({args.rows} животных)")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'suite.db'))
+        start = time.perf_counter()
+        datagen.generate(db, animals=args.rows, users=max(100, args.rows // 10), requests=args.rows * 2)
+        print(f"данные: {time.perf_counter() - start:.1f} с")
+        for name, setup, fn, repeats in _suite_cases(db, tmp, random.Random(1)):
+            timings = []
+            for _ in range(repeats or args.repeat):
+                call_args = setup()
+                started = time.perf_counter()
+                fn(*call_args)
+                timings.append(time.perf_counter() - started)
+            # Лучшее из повторов устойчивее к шуму соседних процессов, чем среднее или медиана
+            results[name] = min(timings) * 1000
+        db.close()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            saved = json.load(f)
+        baseline = saved['results']
+        if saved['meta']['rows'] != args.rows:
+            print(f"⚠️  Базовая линия снята на {saved['meta']['rows']} животных, сравнение приблизительное")
+
+    regressions = []
+    print(f"{'Случай':<42} {'мс':>10} {'база, мс':>10} {'изм.':>8}")
+    for name, ms in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<42} {ms:>10.3f}")
+            continue
+        change = (ms - base) / base if base else 0.0
+        # Абсолютный порог отсекает шум на операциях в доли миллисекунды
+        regressed = change > args.threshold and ms - base > REGRESSION_FLOOR_MS
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<42} {ms:>10.3f} {base:>10.3f} {change:>+7.0%} {'❌' if regressed else '✓'}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'meta': {'rows': args.rows, 'created': datetime.now().isoformat(timespec='seconds'),
+                                'sqlite': sqlite3.sqlite_version},
+                       'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"✓ Базовая линия сохранена: {args.baseline}")
+    if regressions:
+        print(f"❌ Регрессии больше {args.threshold:.0%}: {', '.join(regressions)}")
+        raise SystemExit(1)
+
+
+def _metrics_workload(animals, adoptions, ids, clients, ops, unwrapped=False):
+    """Смесь чтений и записей CRUD; unwrapped — в обход обёрток timed"""
+    def raw(method):
+        return method.__wrapped__.__get__(method.__self__) if unwrapped else method
+    page, available, mine, update = (raw(animals.get_animals_page), raw(animals.get_available_animals_page),
+                                     raw(adoptions.get_requests_by_client_id), raw(animals.update_status))
+    rnd = random.Random(1)
+    start = time.perf_counter()
+    for i in range(ops):
+        kind = i % 4
+        if kind == 0:
+            page(rnd.choice(ids), 20)
+        elif kind == 1:
+            available(rnd.choice(ids), 20)
+        elif kind == 2:
+            mine(rnd.choice(clients))
+        else:
+            update(rnd.choice(ids), 'на лечении' if i % 8 == 3 else 'в приюте')
+    return time.perf_counter() - start
+
+
+def bench_metrics(args):
+    """Накладные расходы инструментирования: без обёрток, выключено и включено"""
+    print_header(f"ЗАМЕРЫ: НАКЛАДНЫЕ РАСХОДЫ ({args.ops} операций)")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'metrics.db')
+        db = Database(db_name)
+        datagen.generate(db, animals=args.rows // 10, users=1000, requests=args.rows // 5)
+        with db.connection() as conn:
+            ids = [row[0] for row in conn.execute("SELECT animal_id FROM Animals")]
+            clients = [row[0] for row in conn.execute("SELECT user_id FROM Users WHERE role = 'client'")]
+        db.close()
+
+        was_enabled = metrics.METRICS.enabled
+        timings = {}
+        for label, enabled, unwrapped in (('без обёрток', False, True), ('выключено', False, False),
+                                          ('включено', True, False)):
+            metrics.METRICS.enabled = enabled
+            # Соединения создаются заново: класс соединения выбирается при подключении
+            db = Database(db_name)
+            db.cache = ListingCache(max_entries=0)
+            animals, adoptions = AnimalCRUD(db), AdoptionCRUD(db)
+            # Лучшее из трёх прогонов: один процессор в песочнице шумит
+            timings[label] = min(_metrics_workload(animals, adoptions, ids, clients, args.ops, unwrapped)
+                                 for _ in range(3))
+            db.close()
+        metrics.METRICS.enabled = was_enabled
+
+    base = timings['без обёрток']
+    print(f"{'Режим':<14} {'оп/с':>10} {'мкс/оп':>8} {'к базе':>8}")
+    for label, seconds in timings.items():
+        print(f"{label:<14} {args.ops / seconds:>10.0f} {seconds / args.ops * 1e6:>8.1f} {seconds / base - 1:>+8.1%}")
+    metrics.print_report()
+
+
+def _status_snapshot(db):
+    """Прежний способ заметить изменения: перечитать статусы всех заявок и животных"""
+    with db.connection() as conn:
+        return (dict(conn.execute("SELECT request_id, status FROM AdoptionRequests")),
+                dict(conn.execute("SELECT animal_id, status FROM Animals")))
+
+
+def bench_cdc(args):
+    """Журнал изменений: пересканирование таблиц против ChangeFeed, задержка доставки, компактизация"""
+    print_header(f"ЖУРНАЛ ИЗМЕНЕНИЙ ({args.rows} животных, {args.ops} операций)")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'cdc.db'))
+        datagen.generate(db, animals=args.rows, users=1000, requests=args.rows * 2)
+        animals, adoptions = AnimalCRUD(db), AdoptionCRUD(db)
+        with db.connection() as conn:
+            available = [row[0] for row in conn.execute("SELECT animal_id FROM Animals WHERE status = 'в приюте'")]
+            clients = [row[0] for row in conn.execute("SELECT user_id FROM Users WHERE role = 'client'")]
+        rnd = random.Random(1)
+        rnd.shuffle(available)
+
+        created = {}
+
+        def workload(count, pause=0.0):
+            for i in range(count):
+                animal_id = available.pop()
+                # Время до вызова: подписчик может увидеть событие раньше, чем вызов вернётся
+                created[animal_id] = time.perf_counter()
+                request_id = adoptions.create_request(AdoptionRequest(animal_id, rnd.choice(clients)))
+                if i % 3 == 0:
+                    adoptions.approve_request(request_id)
+                elif i % 3 == 1:
+                    adoptions.reject_request(request_id)
+                if pause:
+                    time.sleep(pause)
+
+        feed = changefeed.ChangeFeed(db, 'bench')
+        feed.seek_to_end()
+        feed.commit()
+        before = _status_snapshot(db)
+        workload(args.ops)
+
+        start = time.perf_counter()
+        after = _status_snapshot(db)
+        changed = sum(before[i].get(key) != value for i in range(2) for key, value in after[i].items())
+        rescan = time.perf_counter() - start
+        start = time.perf_counter()
+        events = 0
+        while True:
+            batch = feed.fetch()
+            if not batch:
+                break
+            events += len(batch)
+        feed.commit()
+        tail = time.perf_counter() - start
+        print(f"пересканирование таблиц: {changed} изменённых строк за {rescan * 1000:.1f} мс")
+        print(f"ChangeFeed:              {events} событий за {tail * 1000:.1f} мс ({events / tail:.0f} событий/с)")
+
+        # Задержка доставки: писатель в фоне, подписчик ждёт события через follow
+        delays = []
+        writer = threading.Thread(target=workload, args=(min(args.ops, 300), 0.01))
+        writer.start()
+        for batch in feed.follow(timeout=1.0):
+            now = time.perf_counter()
+            delays += [now - created[event.data['animal_id']] for event in batch if event.event == 'request_created']
+        writer.join()
+        print(f"follow: {len(delays)} заявок; задержка от вызова create_request до получения p50 {percentile(delays, 0.5) * 1000:.1f} мс, "
+              f"p99 {percentile(delays, 0.99) * 1000:.1f} мс")
+
+        with db.connection() as conn:
+            before_rows = conn.execute("SELECT COUNT(*) FROM ChangeLog").fetchone()[0]
+        start = time.perf_counter()
+        deleted = changefeed.compact_changes(db)
+        print(f"компактизация: удалено {deleted} из {before_rows} событий за "
+              f"{(time.perf_counter() - start) * 1000:.1f} мс")
+        db.close()
+
+
+def _timed_writes(crud, ids, stop, latencies):
+    """Поток-писатель: смена статуса животного раз в миллисекунду до stop"""
+    rnd = random.Random(2)
+    while not stop.is_set():
+        start = time.perf_counter()
+        crud.update_status(rnd.choice(ids), rnd.choice(['в приюте', 'на лечении']))
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.001)
+
+
+def bench_snapshot(args):
+    """Экспорт из рабочей базы против реплики: задержки писателя, рост WAL, время снимка"""
+    print_header(f"СНИМКИ И РЕПЛИКА ({args.rows} животных)")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'live.db')
+        db = Database(db_name)
+        datagen.generate(db, animals=args.rows, users=1000, requests=args.rows * 2)
+        crud = AnimalCRUD(db)
+        with db.connection() as conn:
+            ids = [row[0] for row in conn.execute("SELECT animal_id FROM Animals")]
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        def export(conn):
+            columns, batches = export_data.iter_table_batches(conn.cursor(), 'AdoptionRequests')
+            export_data.export_batches(batches, columns, 'AdoptionRequests', ['csv'], 'serial', tmp, 'bench')
+
+        def live_export():
+            conn = sqlite3.connect(db_name)
+            conn.execute("BEGIN")
+            export(conn)
+            conn.close()
+
+        def replica_export():
+            replica = db.replica()
+            with replica.connection() as conn:
+                export(conn)
+            replica.close()
+
+        print(f"{'Чтение':<16} {'экспорт, с':>10} {'записей':>8} {'p50, мс':>8} {'p99, мс':>8} {'WAL, КБ':>8}")
+        for label, reader in (('без чтения', lambda: time.sleep(0.5)), ('рабочая база', live_export),
+                              ('реплика', replica_export)):
+            latencies, stop = [], threading.Event()
+            writer = threading.Thread(target=_timed_writes, args=(crud, ids, stop, latencies))
+            writer.start()
+            start = time.perf_counter()
+            reader()
+            elapsed = time.perf_counter() - start
+            stop.set()
+            writer.join()
+            wal = os.path.getsize(db_name + '-wal') // 1024
+            with db.connection() as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            print(f"{label:<16} {elapsed:>10.2f} {len(latencies):>8} {percentile(latencies, 0.5) * 1000:>8.2f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.2f} {wal:>8}")
+
+        size = os.path.getsize(db_name) // 1024
+        for label, load in (('без записей', False), ('под записью', True)):
+            latencies, stop = [], threading.Event()
+            writer = threading.Thread(target=_timed_writes, args=(crud, ids, stop, latencies))
+            if load:
+                writer.start()
+            start = time.perf_counter()
+            restarts = db.snapshot(os.path.join(tmp, 'snapshot.db'))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            if load:
+                writer.join()
+            print(f"снимок {size} КБ {label}: {elapsed * 1000:.0f} мс, перезапусков {restarts}")
+        db.close()
+
+
+def bench_shards(args):
+    """Чтения по всем приютам: последовательный и параллельный обход шардов, подключение шарда под чтением"""
+    print_header(f"ШАРДЫ ({args.shards} приютов по {args.rows // args.shards} животных)")
+    with tempfile.TemporaryDirectory() as tmp:
+        config = os.path.join(tmp, 'shards.json')
+        router = shards.ShardRouter(config)
+        for number in range(args.shards):
+            db = router.add_shard(f'shelter{number}', os.path.join(tmp, f'shelter{number}.db'))
+            per_shard = args.rows // args.shards
+            datagen.generate(db, animals=per_shard, users=100, requests=per_shard * 2, seed=number)
+        router.close()
+
+        cases = [
+            ('доступные, стр. 100', lambda r: r.available_animals(limit=100)),
+            ('поиск по тексту', lambda r: r.search_animals('Барсик дворняга', limit=100)),
+            ('поиск с фильтром', lambda r: r.search_animals(species='Кот', min_age=3, max_age=8, limit=100)),
+            ('статистика', lambda r: (r.stats().counts_by_species_status(), r.stats().pending_backlog())),
+        ]
+        ops = max(1, args.ops // 10)
+        print(f"{'Запрос':<22} {'1 поток, оп/с':>14} {'пул, оп/с':>10}")
+        serial, parallel = shards.ShardRouter(config, workers=1), shards.ShardRouter(config)
+        for label, case in cases:
+            print(f"{label:<22} {ops_per_sec(lambda: case(serial), ops):>14.0f} "
+                  f"{ops_per_sec(lambda: case(parallel), ops):>10.0f}")
+        for label, router in (('1 поток', serial), ('пул', parallel)):
+            start = time.perf_counter()
+            results = router.export_table('Animals', ['csv'], os.path.join(tmp, 'out'), 'serial')
+            print(f"экспорт Animals ({label}): {time.perf_counter() - start:.2f} с, {results[0]['rows']} строк")
+        serial.close()
+
+        # Подключение нового приюта, пока другие потоки читают через общий маршрутизатор
+        stop, pages, errors = threading.Event(), [0], []
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    parallel.available_animals(limit=50)
+                    pages[0] += 1
+                except Exception as e:
+                    errors.append(e)
+
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        for thread in readers:
+            thread.start()
+        time.sleep(0.2)
+        start = time.perf_counter()
+        parallel.add_shard('new', os.path.join(tmp, 'new.db'))
+        added = time.perf_counter() - start
+        AnimalCRUD(parallel.database('new')).add_animal(Animal('Новенький', 'Кот', 'Дворовый', 1, 'Здоров',
+                                                                 '2026-01-01'))
+        time.sleep(0.2)
+        stop.set()
+        for thread in readers:
+            thread.join()
+        # Другой процесс видит новый приют по конфигурации, без перезапуска
+        other = shards.ShardRouter(config)
+        seen = 'new' in other.shelters()
+        other.close()
+        parallel.close()
+        print(f"add_shard под чтением: {added * 1000:.1f} мс, страниц прочитано {pages[0]}, ошибок {len(errors)}")
+        print(f"{'✓' if seen and not errors else '❌'} Новый приют виден по конфигурации: {seen}")
+
+
+BENCHMARKS = {
+    'pool': bench_pool,
+    'export': bench_export,
+    'fanout': bench_fanout,
+    'formats': bench_formats,
+    'import': bench_import,
+    'models': bench_models,
+    'cache': bench_cache,
+    'auth': bench_auth,
+    'adoption': bench_adoption,
+    'batch': bench_batch,
+    'async': bench_async,
+    'http': bench_http,
+    'search': bench_search,
+    'suite': bench_suite,
+    'metrics': bench_metrics,
+    'cdc': bench_cdc,
+    'snapshot': bench_snapshot,
+    'shards': bench_shards,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки слоя данных приюта")
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS), help="сценарий")
+    parser.add_argument('--ops', type=int, default=2000, help="число операций на замер")
+    parser.add_argument('--rows', type=int, default=100000, help="число строк в синтетической таблице")
+    parser.add_argument('--animals', type=int, default=50, help="животных в стресс-тесте усыновления")
+    parser.add_argument('--processes', type=int, default=4, help="процессов в стресс-тесте")
+    parser.add_argument('--threads', type=int, default=4, help="потоков на процесс в стресс-тесте")
+    parser.add_argument('--shards', type=int, default=4, help="приютов в сценарии shards")
+    parser.add_argument('--concurrency', type=int, default=1000, help="одновременных клиентов в сценарии async")
+    parser.add_argument('--url', help="адрес запущенного server.py для сценария http (иначе — локальный экземпляр)")
+    parser.add_argument('--repeat', type=int, default=20, help="повторов каждого случая в наборе suite")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="файл базовой линии набора suite")
+    parser.add_argument('--save-baseline', action='store_true', help="перезаписать базовую линию результатами")
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимое замедление относительно базы")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="включить замеры и записать их в файл (.prom — Prometheus, иначе JSON)")
+    parser.add_argument('--slow-ms', type=float, help="порог журнала медленных запросов, мс")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.METRICS.enable(args.slow_ms)
+    BENCHMARKS[args.benchmark](args)
+    if args.metrics:
+        metrics.METRICS.dump(args.metrics)
+        print(f"✓ Замеры сохранены: {args.metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# cache.py
+import threading
+import time
+from collections import OrderedDict
+
+# Сколько разных выборок хранить и сколько секунд им доверять. TTL страхует
+# от записей в базу в обход CRUD (другие процессы, ручные правки).
+LISTING_CACHE_SIZE = 256
+LISTING_CACHE_TTL = 30.0
+
+
+class ListingCache:
+    """Потокобезопасный LRU-кэш результатов чтения с TTL и счётчиками попаданий.
+
+    Ключ — кортеж, первый элемент которого — имя выборки ('available_animals',
+    'client_requests', ...). max_entries=0 или ttl=0 отключают кэш.
+    """
+    def __init__(self, max_entries=LISTING_CACHE_SIZE, ttl=LISTING_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Растёт при каждой инвалидации: загрузка, начатая до неё, не попадёт в кэш
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get_or_load(self, key, loader):
+        """Значение из кэша или результат loader(), который затем кэшируется"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        if not self.enabled:
+            return value
+
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, *names, keys=()):
+        """Сбрасывает все выборки с указанными именами и отдельные ключи"""
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key[0] in names]:
+                del self._entries[key]
+                self.invalidations += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Счётчики для оценки эффекта кэша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,274 @@
+# changefeed.py
+"""Подписка на журнал изменений ChangeLog (change data capture).
+
+Триггеры миграции 7 пишут в ChangeLog событие на каждую вставку, изменение и
+удаление в Animals, Users и AdoptionRequests: request_created, request_approved,
+request_rejected, request_cancelled, animal_status_changed и т.д. seq растёт
+монотонно и не переиспользуется (AUTOINCREMENT), поэтому подписчику достаточно
+помнить последний обработанный seq.
+
+Запуск: python changefeed.py {tail,consumers,compact} [--db FILE] [...]
+"""
+import argparse
+import asyncio
+import time
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from database import DEFAULT_DB_NAME, Database, get_database
+from models import ChangeEvent, record_factory
+
+# Сколько событий отдавать за один fetch
+CHANGE_BATCH_SIZE = 500
+# Ожидание новых событий: опрос с паузой, растущей от MIN до MAX, пока журнал молчит
+POLL_INTERVAL_MIN = 0.005
+POLL_INTERVAL_MAX = 0.5
+# Сколько записей удалять одной транзакцией при компактизации
+COMPACT_BATCH_SIZE = 10000
+
+CHANGE_EVENT_ROWS = record_factory(ChangeEvent)
+SELECT_CHANGES = '''SELECT seq, table_name, row_id, operation, event, payload, changed_at FROM ChangeLog
+                    WHERE seq > ? AND seq <= ?{filters} ORDER BY seq LIMIT ?'''
+# Конец — последний выданный seq (sqlite_sequence помнит его и после компактизации);
+# события видны строго по порядку seq, потому что писатель в SQLite один. Горизонт:
+# всё с seq не больше него удалено компактизацией
+SELECT_BOUNDS = '''SELECT coalesce((SELECT MIN(seq) FROM ChangeLog) - 1, last), last
+                   FROM (SELECT coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'ChangeLog'), 0) AS last)'''
+SAVE_OFFSET = '''INSERT INTO ChangeConsumers (consumer, seq) VALUES (?, ?)
+                 ON CONFLICT (consumer) DO UPDATE SET seq = excluded.seq, updated_at = CURRENT_TIMESTAMP'''
+
+
+class ChangeLogGap(Exception):
+    """События после позиции подписчика уже удалены компактизацией"""
+    def __init__(self, position, horizon):
+        super().__init__(f"события {position + 1}..{horizon} удалены из журнала")
+        self.position = position
+        self.horizon = horizon
+
+
+def change_bounds(conn) -> Tuple[int, int]:
+    """(горизонт компактизации, последний seq)"""
+    return conn.execute(SELECT_BOUNDS).fetchone()
+
+
+class ChangeFeed:
+    """Чтение ChangeLog с позиции подписчика пачками.
+
+    consumer — имя, под которым позиция сохраняется в ChangeConsumers (commit);
+    без имени позиция живёт только в объекте и не удерживает компактизацию.
+    tables/events ограничивают поток.
+    Доставка «хотя бы один раз»: после сбоя до commit пачка придёт снова.
+    """
+    def __init__(self, db: Optional[Database] = None, consumer: Optional[str] = None,
+                 tables: Optional[Sequence[str]] = None, events: Optional[Sequence[str]] = None,
+                 batch_size: int = CHANGE_BATCH_SIZE, start: Optional[int] = None):
+        self.db = db or get_database()
+        self.db.backend.require('changefeed')
+        self.consumer = consumer
+        self.batch_size = batch_size
+        filters, self._params = '', []
+        for column, values in (('table_name', tables), ('event', events)):
+            if values:
+                filters += f" AND {column} IN ({', '.join('?' * len(values))})"
+                self._params += list(values)
+        self._sql = SELECT_CHANGES.format(filters=filters)
+        # Последнее выданное и последнее сохранённое событие
+        self.position = self.committed = start if start is not None else self._load_offset()
+
+    def _load_offset(self) -> int:
+        if self.consumer is None:
+            return 0
+        with self.db.connection() as conn:
+            # Новый подписчик регистрируется сразу — с этого момента компактизация его ждёт.
+            # Он начинает с горизонта: более ранних событий уже нет
+            conn.execute("INSERT INTO ChangeConsumers (consumer, seq) VALUES (?, ?) ON CONFLICT (consumer) DO NOTHING",
+                         (self.consumer, change_bounds(conn)[0]))
+            return conn.execute("SELECT seq FROM ChangeConsumers WHERE consumer = ?", (self.consumer,)).fetchone()[0]
+
+    def fetch(self, limit: Optional[int] = None) -> List[ChangeEvent]:
+        """Следующая пачка событий после позиции (без ожидания); позиция сдвигается"""
+        limit = limit or self.batch_size
+        with self.db.connection() as conn:
+            # Границы и события — из одного снимка: компактизация между ними не пройдёт незамеченной
+            conn.execute("BEGIN")
+            horizon, end = change_bounds(conn)
+            if self.position < horizon:
+                raise ChangeLogGap(self.position, horizon)
+            conn.row_factory = CHANGE_EVENT_ROWS
+            try:
+                events = conn.execute(self._sql, [self.position, end, *self._params, limit]).fetchall()
+            finally:
+                conn.row_factory = None
+        # Неполная пачка — просмотрено всё до end: с фильтром позиция идёт дальше
+        # последнего подходящего события и не держит компактизацию
+        self.position = events[-1].seq if len(events) == limit else max(self.position, end)
+        return events
+
+    def seek(self, seq: int) -> None:
+        """Переставляет позицию: следующим будет событие после seq"""
+        self.position = seq
+
+    def seek_to_end(self) -> None:
+        """Пропускает всё уже записанное: подписчику нужны только новые события"""
+        with self.db.connection() as conn:
+            self.position = change_bounds(conn)[1]
+
+    def commit(self, conn=None) -> None:
+        """Сохраняет позицию подписчика.
+
+        Передайте conn, чтобы сохранить её в одной транзакции с результатами
+        обработки в этой же базе — тогда пачка не обработается дважды.
+        """
+        if self.consumer is None or self.position == self.committed:
+            self.committed = self.position
+            return
+        if conn is not None:
+            conn.execute(SAVE_OFFSET, (self.consumer, self.position))
+        else:
+            with self.db.connection() as own:
+                own.execute(SAVE_OFFSET, (self.consumer, self.position))
+        self.committed = self.position
+
+    def wait(self, timeout: Optional[float] = None) -> List[ChangeEvent]:
+        """Пачка событий; если их нет — ждёт появления не дольше timeout ([] по истечении)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delay = POLL_INTERVAL_MIN
+        while True:
+            events = self.fetch()
+            if events:
+                return events
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                delay = min(delay, remaining)
+            time.sleep(delay)
+            delay = min(delay * 2, POLL_INTERVAL_MAX)
+
+    def follow(self, timeout: Optional[float] = None) -> Iterator[List[ChangeEvent]]:
+        """Бесконечный поток пачек; позиция сохраняется, когда обработка пачки завершена.
+
+        С timeout поток заканчивается, если столько секунд не было событий.
+        """
+        while True:
+            events = self.wait(timeout)
+            if not events:
+                return
+            yield events
+            self.commit()
+
+    async def await_events(self, timeout: Optional[float] = None) -> List[ChangeEvent]:
+        """Асинхронный wait: чтение в потоке, паузы — в цикле событий"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        delay = POLL_INTERVAL_MIN
+        while True:
+            events = await asyncio.to_thread(self.fetch)
+            if events:
+                return events
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return []
+                delay = min(delay, remaining)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, POLL_INTERVAL_MAX)
+
+    async def afollow(self, timeout: Optional[float] = None):
+        """Асинхронный follow"""
+        while True:
+            events = await self.await_events(timeout)
+            if not events:
+                return
+            yield events
+            await asyncio.to_thread(self.commit)
+
+
+def list_consumers(db: Database) -> List[tuple]:
+    """(подписчик, позиция, отставание в событиях, время сохранения)"""
+    with db.connection() as conn:
+        return conn.execute('''SELECT consumer, seq, (SELECT COUNT(*) FROM ChangeLog WHERE seq > c.seq), updated_at
+                               FROM ChangeConsumers c ORDER BY consumer''').fetchall()
+
+
+def drop_consumer(db: Database, consumer: str) -> bool:
+    """Забывает подписчика: его позиция больше не удерживает компактизацию"""
+    with db.connection() as conn:
+        return conn.execute("DELETE FROM ChangeConsumers WHERE consumer = ?", (consumer,)).rowcount > 0
+
+
+def compact_changes(db: Database, max_age_days: Optional[float] = None) -> int:
+    """Удаляет события, уже обработанные всеми подписчиками; возвращает число удалённых.
+
+    Без подписчиков ничего не удаляется. max_age_days удаляет и более старые
+    события независимо от подписчиков — отставшие получат ChangeLogGap.
+    Удаление идёт короткими транзакциями, чтобы не держать блокировку записи.
+    """
+    with db.connection() as conn:
+        through = conn.execute("SELECT MIN(seq) FROM ChangeConsumers").fetchone()[0] or 0
+        if max_age_days is not None:
+            aged = conn.execute("SELECT MAX(seq) FROM ChangeLog WHERE changed_at < datetime('now', ?)",
+                                (f'{-max_age_days} days',)).fetchone()[0] or 0
+            through = max(through, aged)
+    deleted = 0
+    while True:
+        with db.write_transaction() as conn:
+            # seq — rowid журнала: удаление диапазона идёт по первичному ключу
+            count = conn.execute('''DELETE FROM ChangeLog WHERE seq IN (
+                                        SELECT seq FROM ChangeLog WHERE seq <= ? ORDER BY seq LIMIT ?)''',
+                                 (through, COMPACT_BATCH_SIZE)).rowcount
+        deleted += count
+        if count < COMPACT_BATCH_SIZE:
+            return deleted
+
+
+def print_event(event: ChangeEvent) -> None:
+    print(f"{event.seq:>10} {event.changed_at} {event.table_name:<17} {event.row_id:>8} "
+          f"{event.event or event.operation:<22} {event.payload or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Журнал изменений приюта: чтение, подписчики, компактизация")
+    parser.add_argument('command', choices=['tail', 'consumers', 'compact'],
+                        help="tail — вывести события, consumers — позиции подписчиков, compact — удалить обработанное")
+    parser.add_argument('--db', default=DEFAULT_DB_NAME, help="файл базы данных")
+    parser.add_argument('--consumer', help="имя подписчика: читать с его позиции и сохранять её (tail)")
+    parser.add_argument('--tables', nargs='+', help="только события этих таблиц (tail)")
+    parser.add_argument('--events', nargs='+', help="только эти события, например request_approved (tail)")
+    parser.add_argument('--from-seq', type=int, help="начать после этого seq (tail)")
+    parser.add_argument('--follow', action='store_true', help="ждать новые события (tail, Ctrl+C — выход)")
+    parser.add_argument('--max-age-days', type=float, help="удалить и более старые события (compact)")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    if args.command == 'tail':
+        feed = ChangeFeed(db, args.consumer, args.tables, args.events, start=args.from_seq)
+        try:
+            if args.follow:
+                for events in feed.follow():
+                    for event in events:
+                        print_event(event)
+            else:
+                while True:
+                    events = feed.fetch()
+                    if not events:
+                        break
+                    for event in events:
+                        print_event(event)
+                    feed.commit()
+        except ChangeLogGap as e:
+            print(f"❌ {e}; начните с --from-seq {e.horizon}")
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'consumers':
+        print(f"{'Подписчик':<24} {'Позиция':>10} {'Отставание':>11}  Сохранена")
+        for consumer, seq, lag, updated_at in list_consumers(db):
+            print(f"{consumer:<24} {seq:>10} {lag:>11}  {updated_at}")
+    else:
+        start = time.perf_counter()
+        deleted = compact_changes(db, args.max_age_days)
+        print(f"✓ Удалено событий: {deleted} за {time.perf_counter() - start:.2f} с")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
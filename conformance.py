@@ -0,0 +1,379 @@
+# conformance.py
+"""Проверка бэкендов хранилища: одни и те же сценарии CRUD и замеры на SQLite и PostgreSQL.
+
+SQLite проверяется всегда, во временном файле. PostgreSQL — если задан URL
+(--postgres или переменная SHELTER_POSTGRES_DSN) и установлен драйвер; прогон
+идёт во временной схеме, которая удаляется в конце.
+
+Запуск: python conformance.py [--postgres URL] [--rows N] [--ops N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+from backends import SQLITE, PostgresBackend
+from crud_operations import AdoptionCRUD, AnimalCRUD, UserCRUD
+from database import Database
+from models import AdoptionRequest, Animal, User
+
+POSTGRES_DSN_ENV = 'SHELTER_POSTGRES_DSN'
+# Животных в сценарии массовой вставки и постраничного чтения
+CONFORMANCE_ROWS = 2000
+# Потоков, одновременно одобряющих заявки на одно животное
+RACE_THREADS = 8
+
+
+class BackendUnavailable(Exception):
+    """Бэкенд нельзя проверить: нет драйвера или сервер недоступен"""
+
+
+@contextmanager
+def sqlite_database():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'conformance.db'))
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+@contextmanager
+def postgres_database(dsn):
+    """База приюта во временной схеме PostgreSQL"""
+    schema = f'shelter_conformance_{os.getpid()}'
+    try:
+        backend = PostgresBackend(schema)
+    except ImportError as e:
+        raise BackendUnavailable(str(e)) from None
+    try:
+        db = Database(dsn, backend=backend)
+    except backend.Error as e:
+        raise BackendUnavailable(f"нет соединения: {e}") from None
+    try:
+        yield db
+    finally:
+        with db.connection() as conn:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
+        db.close()
+
+
+def _expect(problems, condition, message):
+    if not condition:
+        problems.append(message)
+
+
+def _client(db, username):
+    return UserCRUD(db).add_user(User(username, 'secret', 'client', f'Клиент {username}', '+70000000000'))
+
+
+def check_animals(db, rows) -> List[str]:
+    """Вставка с id, выборки, смена статусов"""
+    problems = []
+    crud = AnimalCRUD(db)
+    first = crud.add_animal(Animal('Первый', 'Кот', 'Дворовый', 2, 'Здоров', '2025-01-10'))
+    second = crud.add_animal(Animal('Второй', 'Собака', None, None, None, None))
+    _expect(problems, isinstance(first, int) and isinstance(second, int) and second > first,
+            f"add_animal: id {first!r}, {second!r} — ожидались растущие целые")
+    record = {animal.animal_id: animal for animal in crud.get_all_animals()}.get(first)
+    _expect(problems, record is not None and tuple(record[1:]) ==
+            ('Первый', 'Кот', 'Дворовый', 2, '2025-01-10', 'Здоров', 'в приюте'),
+            f"get_all_animals: {record}")
+    _expect(problems, crud.update_status(first, 'на лечении'), "update_status существующего вернул False")
+    _expect(problems, not crud.update_status(-1, 'на лечении'), "update_status несуществующего вернул True")
+    _expect(problems, first not in {animal.animal_id for animal in crud.get_available_animals()},
+            "get_available_animals: животное на лечении в списке доступных")
+    result = crud.update_statuses({first: 'в приюте', -1: 'в приюте'})
+    _expect(problems, result == {first: True, -1: False}, f"update_statuses: {result}")
+    return problems
+
+
+def check_bulk_and_pages(db, rows) -> List[str]:
+    """Массовая вставка, keyset-страницы и потоковое чтение"""
+    problems = []
+    crud = AnimalCRUD(db)
+    with db.connection() as conn:
+        before = conn.execute("SELECT COUNT(*) FROM Animals").fetchone()[0]
+    animals = (Animal(f'Массовый {i}', 'Кролик', 'Рекс', i % 10, 'Здоров', '2024-06-01') for i in range(rows))
+    inserted = crud.add_animals(animals, batch_size=max(1, rows // 3))
+    _expect(problems, inserted == rows, f"add_animals: вставлено {inserted} из {rows}")
+    ids, after_id = [], None
+    while True:
+        page, after_id = crud.get_animals_page(after_id, limit=97)
+        ids += [animal.animal_id for animal in page]
+        if after_id is None:
+            break
+    _expect(problems, len(ids) == before + rows and ids == sorted(set(ids)),
+            f"get_animals_page: {len(ids)} строк, ожидалось {before + rows} без повторов по возрастанию id")
+    streamed = sum(1 for _ in crud.iter_all_animals(batch_size=128))
+    _expect(problems, streamed == before + rows, f"iter_all_animals: {streamed} строк")
+    return problems
+
+
+def check_search(db, rows) -> List[str]:
+    """Полнотекстовый поиск с префиксом, фильтры и страницы"""
+    problems = []
+    crud = AnimalCRUD(db)
+    ids = [crud.add_animal(Animal(f'Зефирка {i}', 'Кот', 'Мейн-кун', i, 'Здорова', f'2023-0{i + 1}-15'))
+           for i in range(5)]
+    found, _ = crud.search_animals('зефир')
+    _expect(problems, set(ids) <= {animal.animal_id for animal in found},
+            f"search_animals по префиксу: найдено {[animal.animal_id for animal in found]}")
+    found, _ = crud.search_animals('Зефирка мейн')
+    _expect(problems, {animal.animal_id for animal in found} == set(ids), "search_animals по двум словам")
+    found, _ = crud.search_animals('зефирка', species='Кот', min_age=1, max_age=3)
+    _expect(problems, {animal.animal_id for animal in found} == set(ids[1:4]), "search_animals с фильтром возраста")
+    found, _ = crud.search_animals(species='Кот', arrived_from='2023-02-01', arrived_to='2023-04-30')
+    _expect(problems, set(ids[1:4]) <= {animal.animal_id for animal in found}, "search_animals по датам без текста")
+    first, offset = crud.search_animals('зефирка', limit=2)
+    second, _ = crud.search_animals('зефирка', offset=offset or 0, limit=10)
+    _expect(problems, offset == 2 and len(first) + len(second) == 5
+            and not {a.animal_id for a in first} & {a.animal_id for a in second},
+            "search_animals: страницы по offset пересекаются или теряют строки")
+    _expect(problems, crud.search_animals('%_?')[0] is not None, "search_animals со служебными символами")
+    return problems
+
+
+def check_requests(db, rows) -> List[str]:
+    """Заявки: создание, одобрение с отклонением конкурентов, отмена, страницы"""
+    problems = []
+    animals, adoptions = AnimalCRUD(db), AdoptionCRUD(db)
+    first, second = _client(db, 'req-a'), _client(db, 'req-b')
+    animal_id = animals.add_animal(Animal('Заявочный', 'Собака', 'Бигль', 3))
+    mine = adoptions.create_request(AdoptionRequest(animal_id, first, request_date='2025-03-01 10:00'))
+    theirs = adoptions.create_request(AdoptionRequest(animal_id, second, request_date='2025-03-01 11:00'))
+    _expect(problems, isinstance(mine, int) and isinstance(theirs, int), f"create_request: id {mine!r}, {theirs!r}")
+    _expect(problems, adoptions.approve_request(mine), "approve_request вернул False")
+    _expect(problems, not adoptions.approve_request(theirs), "одобрена вторая заявка на то же животное")
+    statuses = {r.request_id: r.status for r in adoptions.get_all_requests()}
+    _expect(problems, statuses.get(mine) == 'approved' and statuses.get(theirs) == 'rejected',
+            f"статусы после одобрения: {statuses.get(mine)}, {statuses.get(theirs)}")
+    late = adoptions.create_request(AdoptionRequest(animal_id, second, request_date='2025-03-02 09:00'))
+    _expect(problems, late is None, "create_request на усыновлённое животное вернул id")
+
+    other = animals.add_animal(Animal('Отменяемый', 'Кот', 'Сфинкс', 1))
+    request_id = adoptions.create_request(AdoptionRequest(other, first, request_date='2025-03-03 12:00'))
+    _expect(problems, not adoptions.cancel_request(request_id, second), "cancel_request чужой заявки")
+    _expect(problems, adoptions.cancel_request(request_id, first), "cancel_request своей заявки")
+    listed = [r.request_id for r in adoptions.get_requests_by_client_id(first)]
+    _expect(problems, listed == [mine], f"get_requests_by_client_id: {listed}")
+
+    seen, after = [], None
+    while True:
+        page, after = adoptions.get_requests_page(after, limit=2)
+        seen += [(r.request_date, r.request_id) for r in page]
+        if after is None:
+            break
+    _expect(problems, seen == sorted(seen, reverse=True) and len(seen) == len(set(seen)) == len(statuses) + 1,
+            f"get_requests_page: {len(seen)} заявок")
+    return problems
+
+
+def check_batches(db, rows) -> List[str]:
+    """Пакетные одобрение и отклонение"""
+    problems = []
+    animals, adoptions = AnimalCRUD(db), AdoptionCRUD(db)
+    clients = [_client(db, f'batch-{i}') for i in range(3)]
+    pets = [animals.add_animal(Animal(f'Пакетный {i}', 'Попугай', 'Жако', 1)) for i in range(2)]
+    requests = [adoptions.create_request(AdoptionRequest(pet, client, request_date=f'2025-04-0{i + 1} 10:00'))
+                for i, (pet, client) in enumerate([(pets[0], clients[0]), (pets[0], clients[1]),
+                                                   (pets[1], clients[2])])]
+    result = adoptions.approve_requests([requests[1], requests[0], -1])
+    _expect(problems, result == {requests[1]: True, requests[0]: False, -1: False}, f"approve_requests: {result}")
+    result = adoptions.reject_requests([requests[2], requests[0]])
+    _expect(problems, result == {requests[2]: True, requests[0]: False}, f"reject_requests: {result}")
+    return problems
+
+
+def check_users(db, rows) -> List[str]:
+    """Уникальность логина и проверка пароля"""
+    problems = []
+    users = UserCRUD(db)
+    user_id = _client(db, 'login-user')
+    _expect(problems, isinstance(user_id, int), f"add_user: id {user_id!r}")
+    _expect(problems, _client(db, 'login-user') is None, "add_user с занятым логином вернул id")
+    user = users.authenticate('login-user', 'secret', 'client')
+    _expect(problems, user is not None and user['id'] == user_id, f"authenticate: {user}")
+    _expect(problems, users.authenticate('login-user', 'wrong', 'client') is None, "authenticate с неверным паролем")
+    return problems
+
+
+def check_upsert(db, rows) -> List[str]:
+    """Backend.upsert_sql: вставка, затем обновление по ключу"""
+    problems = []
+    sql = db.backend.upsert_sql('ConformanceUpsert', ['key', 'value'], ['key'])
+    with db.connection() as conn:
+        conn.execute("CREATE TEMPORARY TABLE ConformanceUpsert (key TEXT PRIMARY KEY, value INTEGER)")
+        try:
+            conn.execute(sql, ('a', 1))
+            conn.execute(sql, ('a', 2))
+            conn.executemany(sql, [('b', 1), ('b', 3)])
+            stored = conn.execute("SELECT key, value FROM ConformanceUpsert ORDER BY key").fetchall()
+        finally:
+            conn.execute("DROP TABLE ConformanceUpsert")
+    _expect(problems, [tuple(row) for row in stored] == [('a', 2), ('b', 3)], f"upsert: {stored}")
+    return problems
+
+
+def check_approve_race(db, rows) -> List[str]:
+    """Одновременные одобрения заявок на одно животное: усыновление ровно одно"""
+    problems = []
+    animals, adoptions = AnimalCRUD(db), AdoptionCRUD(db)
+    animal_id = animals.add_animal(Animal('Спорный', 'Кот', 'Британская', 4))
+    requests = [adoptions.create_request(AdoptionRequest(animal_id, _client(db, f'race-{i}'),
+                                                         request_date='2025-05-01 10:00'))
+                for i in range(RACE_THREADS)]
+    results, barrier = [], threading.Barrier(RACE_THREADS)
+
+    def approve(request_id):
+        barrier.wait()
+        results.append(adoptions.approve_request(request_id))
+
+    threads = [threading.Thread(target=approve, args=(request_id,)) for request_id in requests]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with db.connection() as conn:
+        approved = conn.execute("SELECT COUNT(*) FROM AdoptionRequests WHERE animal_id = ? AND status = 'approved'",
+                                (animal_id,)).fetchone()[0]
+    _expect(problems, results.count(True) == 1 and approved == 1,
+            f"гонка одобрений: успешных вызовов {results.count(True)}, одобрено в базе {approved}")
+    return problems
+
+
+def check_readoption(db, rows) -> List[str]:
+    """Одобрение -> возврат в приют -> повторное одобрение другой заявки"""
+    problems = []
+    animals, adoptions = AnimalCRUD(db), AdoptionCRUD(db)
+    clients = [_client(db, f'readopt-{i}') for i in range(3)]
+    animal_id = animals.add_animal(Animal('Возвращённый', 'Собака', 'Такса', 5))
+
+    def request(client, day):
+        return adoptions.create_request(AdoptionRequest(animal_id, client, request_date=f'2025-06-0{day} 10:00'))
+
+    first = request(clients[0], 1)
+    _expect(problems, adoptions.approve_request(first), "approve_request первой заявки вернул False")
+    _expect(problems, animals.update_status(animal_id, 'в приюте'), "update_status возврата вернул False")
+    second = request(clients[1], 2)
+    _expect(problems, adoptions.approve_request(second), "approve_request после возврата вернул False")
+    _expect(problems, animals.update_statuses({animal_id: 'в приюте'}) == {animal_id: True},
+            "update_statuses возврата")
+    third = request(clients[2], 3)
+    result = adoptions.approve_requests([third])
+    _expect(problems, result == {third: True}, f"approve_requests после возврата: {result}")
+    statuses = {r.request_id: r.status for r in adoptions.get_all_requests()}
+    _expect(problems, [statuses.get(r) for r in (first, second, third)] == ['returned', 'returned', 'approved'],
+            f"статусы заявок: {[statuses.get(r) for r in (first, second, third)]}")
+
+    # Животное вернули в приют в обход update_status: одобренная заявка осталась
+    with db.write_transaction() as conn:
+        conn.execute("UPDATE Animals SET status = 'в приюте' WHERE animal_id = ?", (animal_id,))
+    fourth = request(clients[0], 4)
+    _expect(problems, not adoptions.approve_request(fourth), "одобрена вторая действующая заявка")
+    result = adoptions.approve_requests([fourth])
+    _expect(problems, result == {fourth: False}, f"approve_requests при действующей заявке: {result}")
+    return problems
+
+
+CHECKS = [
+    ('животные', check_animals),
+    ('массовая вставка и страницы', check_bulk_and_pages),
+    ('поиск', check_search),
+    ('заявки', check_requests),
+    ('пакетные операции', check_batches),
+    ('пользователи', check_users),
+    ('upsert', check_upsert),
+    ('гонка одобрений', check_approve_race),
+    ('возврат и повторное усыновление', check_readoption),
+]
+
+
+def run_checks(db, rows=CONFORMANCE_ROWS) -> Dict[str, List[str]]:
+    """Прогоняет CHECKS на базе db; проверка -> расхождения (исключение — тоже расхождение)"""
+    report = {}
+    for name, check in CHECKS:
+        try:
+            report[name] = check(db, rows)
+        except Exception as e:
+            report[name] = [f"{type(e).__name__}: {e}"]
+    return report
+
+
+def _ops_per_sec(fn: Callable[[int], object], ops: int) -> float:
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return ops / (time.perf_counter() - start)
+
+
+def run_benchmarks(db, rows=CONFORMANCE_ROWS, ops=200) -> List[Tuple[str, float]]:
+    """Операций в секунду по основным путям CRUD (для массовой вставки — строк в секунду)"""
+    animals, adoptions = AnimalCRUD(db), AdoptionCRUD(db)
+    client = _client(db, 'bench-client')
+    start = time.perf_counter()
+    animals.add_animals(Animal(f'Замер {i}', 'Собака', 'Хаски', i % 15, 'Здоров', '2022-02-02') for i in range(rows))
+    bulk = rows / (time.perf_counter() - start)
+    pets = [animals.add_animal(Animal(f'Одиночный {i}', 'Кот', 'Сиамская', 1)) for i in range(ops)]
+    return [
+        ('add_animals, строк/с', bulk),
+        ('add_animal', _ops_per_sec(lambda i: animals.add_animal(Animal('Ещё один', 'Кот')), ops)),
+        ('get_animals_page', _ops_per_sec(lambda i: animals.get_animals_page(i * 10, limit=100), ops)),
+        ('search_animals, текст', _ops_per_sec(lambda i: animals.search_animals('хаски замер', limit=20), ops)),
+        ('search_animals, фильтры', _ops_per_sec(
+            lambda i: animals.search_animals(species='Собака', min_age=3, max_age=9, limit=20), ops)),
+        ('create_request', _ops_per_sec(
+            lambda i: adoptions.create_request(AdoptionRequest(pets[i], client, request_date='2025-06-01 10:00')),
+            ops)),
+        ('get_requests_by_client_id', _ops_per_sec(lambda i: adoptions.get_requests_by_client_id(client), ops)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Совместимость и скорость бэкендов хранилища приюта")
+    parser.add_argument('--postgres', default=os.environ.get(POSTGRES_DSN_ENV),
+                        help=f"URL PostgreSQL (по умолчанию из {POSTGRES_DSN_ENV}); без него — только SQLite")
+    parser.add_argument('--rows', type=int, default=CONFORMANCE_ROWS, help="строк в массовой вставке")
+    parser.add_argument('--ops', type=int, default=200, help="операций на замер")
+    args = parser.parse_args()
+
+    targets = [(SQLITE.name, sqlite_database)]
+    if not args.postgres:
+        print(f"⚠️  PostgreSQL пропущен: не задан --postgres или {POSTGRES_DSN_ENV}")
+    else:
+        targets.append((PostgresBackend.name, lambda: postgres_database(args.postgres)))
+
+    failed = False
+    speeds = {}
+    for name, open_database in targets:
+        print(f"\n{'=' * 60}")
+        print(f"БЭКЕНД: {name}")
+        print(f"{'=' * 60}")
+        try:
+            with open_database() as db:
+                for check, problems in run_checks(db, args.rows).items():
+                    print(f"{'❌' if problems else '✓'} {check}")
+                    for problem in problems:
+                        print(f"    {problem}")
+                    failed = failed or bool(problems)
+                speeds[name] = run_benchmarks(db, args.rows, args.ops)
+        except BackendUnavailable as e:
+            print(f"⚠️  {name} пропущен: {e}")
+
+    if speeds:
+        names = list(speeds)
+        print(f"\n{'=' * 60}")
+        print("ЗАМЕРЫ, оп/с:")
+        print(f"{'Операция':<28}" + ''.join(f"{name:>14}" for name in names))
+        for i, (label, _) in enumerate(speeds[names[0]]):
+            print(f"{label:<28}" + ''.join(f"{speeds[name][i][1]:>14.0f}" for name in names))
+        print(f"{'=' * 60}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
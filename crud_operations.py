@@ -1,152 +1,575 @@
 # models/crud_operations.py
+import argparse
 import sqlite3
-from models.database import Database
-from models import Animal, AdoptionRequest
-from typing import List, Tuple, Optional, Dict
+from auth import SessionStore, get_session_store, hash_password, needs_rehash, verify_password
+from backends import SQLiteBackend
+from database import DEFAULT_DB_NAME, Database, get_database, explain_query_plan
+from metrics import timed_methods
+from models import (Animal, AdoptionRequest, User, AnimalRecord, RequestRecord, ClientRequestRecord,
+                    record_factory)
+from typing import List, Tuple, Optional, Dict, Iterator, Iterable
+from itertools import islice
 
+# Сколько строк забирать из курсора за раз в потоковых iter_* методах
+FETCH_BATCH_SIZE = 500
+# row_factory для методов чтения: строки возвращаются как именованные кортежи
+ANIMAL_ROWS = record_factory(AnimalRecord)
+REQUEST_ROWS = record_factory(RequestRecord)
+CLIENT_REQUEST_ROWS = record_factory(ClientRequestRecord)
 
+# Сколько строк вставлять одной транзакцией в массовых операциях
+INSERT_BATCH_SIZE = 5000
+# Размер страницы по умолчанию для постраничных *_page методов
+PAGE_SIZE = 100
+
+# Сколько id подставлять в один IN (...) в пакетных операциях
+IN_BATCH_SIZE = 500
+# Сколько id можно выбрать в командной строке одной командой
+MAX_SELECTION = 100000
+
+INSERT_ANIMAL = '''INSERT INTO Animals (name, species, breed, age, arrival_date, health_status, status)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)'''
+# Вставка заявки только для животного в приюте: проверка и запись атомарны
+INSERT_REQUEST_IF_AVAILABLE = '''INSERT INTO AdoptionRequests (animal_id, client_id, request_date, status)
+                                 SELECT ?, ?, ?, ?
+                                 WHERE EXISTS (SELECT 1 FROM Animals WHERE animal_id = ? AND status = 'в приюте')'''
+SELECT_COMPETING_CLIENTS = '''SELECT DISTINCT client_id FROM AdoptionRequests
+                              WHERE animal_id = ? AND status = 'pending' AND request_id != ?'''
+REJECT_COMPETING_REQUESTS = '''UPDATE AdoptionRequests SET status = 'rejected'
+                               WHERE animal_id = ? AND status = 'pending' AND request_id != ?'''
+# Животное отдаётся, только если у него нет действующей одобренной заявки,
+# иначе вторая одобренная заявка нарушит idx_requests_one_approved
+ADOPT_ANIMAL = '''UPDATE Animals SET status = 'усыновлено'
+                  WHERE animal_id = ? AND status = 'в приюте'
+                  AND NOT EXISTS (SELECT 1 FROM AdoptionRequests WHERE animal_id = ? AND status = 'approved')'''
+SELECT_ADOPTABLE_ANIMALS = '''SELECT animal_id FROM Animals a WHERE status = 'в приюте' AND animal_id IN ({ids})
+                              AND NOT EXISTS (SELECT 1 FROM AdoptionRequests r
+                                              WHERE r.animal_id = a.animal_id AND r.status = 'approved')'''
+# Возврат в приют закрывает прежнее усыновление: одобренная заявка становится returned
+SELECT_ADOPTERS = "SELECT client_id FROM AdoptionRequests WHERE status = 'approved' AND animal_id IN ({ids})"
+CLOSE_ADOPTION = "UPDATE AdoptionRequests SET status = 'returned' WHERE animal_id = ? AND status = 'approved'"
+SELECT_ALL_ANIMALS = "SELECT * FROM Animals ORDER BY animal_id"
+# Литерал статуса должен совпадать с условием частичного индекса idx_animals_available
+SELECT_AVAILABLE_ANIMALS = "SELECT * FROM Animals WHERE status = 'в приюте'"
+SELECT_ALL_REQUESTS = '''SELECT ar.request_id, ar.animal_id, ar.client_id, ar.request_date, ar.status,
+                                u.name, u.phone, a.name
+                         FROM AdoptionRequests ar
+                         JOIN Users u ON ar.client_id = u.user_id
+                         JOIN Animals a ON ar.animal_id = a.animal_id
+                         ORDER BY ar.request_date DESC'''
+SELECT_REQUESTS_BY_CLIENT = '''SELECT ar.request_id, ar.animal_id, ar.client_id, ar.request_date, ar.status,
+                                      a.name
+                               FROM AdoptionRequests ar
+                               JOIN Animals a ON ar.animal_id = a.animal_id
+                               WHERE ar.client_id = ? AND ar.status != 'cancelled'
+                               ORDER BY ar.request_date DESC'''
+# Keyset-пагинация: продолжение после последнего animal_id / (request_date, request_id)
+SELECT_ANIMALS_PAGE = "SELECT * FROM Animals WHERE animal_id > ? ORDER BY animal_id LIMIT ?"
+SELECT_AVAILABLE_ANIMALS_PAGE = "SELECT * FROM Animals WHERE status = 'в приюте' AND animal_id > ? ORDER BY animal_id LIMIT ?"
+SELECT_REQUESTS_PAGE = '''SELECT ar.request_id, ar.animal_id, ar.client_id, ar.request_date, ar.status,
+                                 u.name, u.phone, a.name
+                          FROM AdoptionRequests ar
+                          JOIN Users u ON ar.client_id = u.user_id
+                          JOIN Animals a ON ar.animal_id = a.animal_id
+                          {where}
+                          ORDER BY ar.request_date DESC, ar.request_id DESC
+                          LIMIT ?'''
+# Поиск с текстом (SQL — у бэкенда): ранжирование в окне последних SEARCH_RANK_WINDOW
+# совпадений. Ранжировать все совпадения частого слова на миллионе строк — сотни мс
+SEARCH_RANK_WINDOW = 500
+SEARCH_ANIMALS = "SELECT a.* FROM Animals a WHERE 1 = 1{filters} ORDER BY a.animal_id LIMIT ? OFFSET ?"
+# Фильтры поиска: (имя, колонка, оператор, диапазонный ли)
+SEARCH_FILTERS = [
+    ('species', 'a.species', '=', False),
+    ('status', 'a.status', '=', False),
+    ('min_age', 'a.age', '>=', True),
+    ('max_age', 'a.age', '<=', True),
+    ('arrived_from', 'a.arrival_date', '>=', True),
+    ('arrived_to', 'a.arrival_date', '<=', True),
+]
+# Поиск только по username через UNIQUE-индекс; пароль и роль проверяются в Python
+SELECT_USER_FOR_LOGIN = "SELECT user_id, username, password, role, name, phone FROM Users WHERE username = ?"
+
+# Запросы CRUD для check_query_plans: (метод, SQL, параметры, допустим ли полный проход таблицы)
+QUERY_PLAN_CHECKS = [
+    ('AnimalCRUD.get_all_animals', SELECT_ALL_ANIMALS, (), True),
+    ('AnimalCRUD.get_available_animals', SELECT_AVAILABLE_ANIMALS, (), False),
+    ('AnimalCRUD.get_animals_page', SELECT_ANIMALS_PAGE, (0, 1), False),
+    ('AnimalCRUD.get_available_animals_page', SELECT_AVAILABLE_ANIMALS_PAGE, (0, 1), False),
+    ('AnimalCRUD.update_status', "UPDATE Animals SET status = ? WHERE animal_id = ?", ('', 0), False),
+    ('AnimalCRUD.update_status', SELECT_ADOPTERS.format(ids='?'), (0,), False),
+    ('AnimalCRUD.update_status', CLOSE_ADOPTION, (0,), False),
+    ('AnimalCRUD.search_animals', SEARCH_ANIMALS.format(filters=" AND a.species = ? AND +a.age <= ?"),
+     ('', 0, 1, 0), False),
+    ('AnimalCRUD.search_animals',
+     SEARCH_ANIMALS.format(filters=" AND a.arrival_date >= ? AND a.arrival_date <= ?"), ('', '', 1, 0), False),
+    ('AnimalCRUD.search_animals', SQLiteBackend.search_window_sql.format(filters=" AND a.status = ?"),
+     ('x', '', 0), False),
+    ('AnimalCRUD.search_animals', SQLiteBackend.search_ranked_sql.format(filters=""), ('x', 0, 1, 0), False),
+    ('AdoptionCRUD.create_request', INSERT_REQUEST_IF_AVAILABLE, ('', 0, '', '', 0), False),
+    ('AdoptionCRUD.get_all_requests', SELECT_ALL_REQUESTS, (), False),
+    ('AdoptionCRUD.get_requests_page',
+     SELECT_REQUESTS_PAGE.format(where="WHERE (ar.request_date, ar.request_id) < (?, ?)"), ('', 0, 1), False),
+    ('AdoptionCRUD.get_requests_by_client_id', SELECT_REQUESTS_BY_CLIENT, (0,), False),
+    ('AdoptionCRUD.approve_request',
+     "SELECT animal_id, client_id FROM AdoptionRequests WHERE request_id = ? AND status = 'pending'", (0,), False),
+    ('AdoptionCRUD.approve_request', ADOPT_ANIMAL, (0, 0), False),
+    ('AdoptionCRUD.approve_request', SELECT_COMPETING_CLIENTS, (0, 0), False),
+    ('AdoptionCRUD.approve_request', REJECT_COMPETING_REQUESTS, (0, 0), False),
+    ('AdoptionCRUD.approve_requests',
+     "SELECT request_id, animal_id, client_id FROM AdoptionRequests WHERE status = 'pending' AND request_id IN (?, ?)",
+     (0, 0), False),
+    ('AdoptionCRUD.approve_requests', SELECT_ADOPTABLE_ANIMALS.format(ids='?, ?'), (0, 0), False),
+    ('AdoptionCRUD.approve_requests',
+     "SELECT DISTINCT client_id FROM AdoptionRequests WHERE status = 'pending' AND animal_id IN (?, ?)",
+     (0, 0), False),
+    ('AdoptionCRUD.cancel_request',
+     "UPDATE AdoptionRequests SET status = 'cancelled' WHERE request_id = ? AND client_id = ? AND status = 'pending'",
+     (0, 0), False),
+    ('UserCRUD.authenticate', SELECT_USER_FOR_LOGIN, ('',), False),
+]
+
+
+def check_query_plans(db: Database) -> List[str]:
+    """Возвращает запросы CRUD, план которых проходит таблицу без индекса"""
+    problems = []
+    with db.connection() as conn:
+        for method, sql, params, allow_scan in QUERY_PLAN_CHECKS:
+            for detail in explain_query_plan(conn, sql, params):
+                # SCAN CONSTANT ROW — одна строка из SELECT без FROM, это не проход таблицы
+                if (detail.startswith('SCAN ') and 'INDEX' not in detail and detail != 'SCAN CONSTANT ROW'
+                        and not allow_scan):
+                    problems.append(f"{method}: {detail}")
+    return problems
+
+
+def _animal_params(animal: Animal) -> Tuple:
+    return (animal.name, animal.species, animal.breed, animal.age,
+            animal.arrival_date, animal.health_status, animal.status)
+
+
+def _fetch_all(db: Database, sql: str, params: Tuple = (), row_factory=None) -> List[Tuple]:
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = row_factory
+        return cursor.execute(sql, params).fetchall()
+
+
+def _request_client_id(conn: sqlite3.Connection, request_id: int) -> Optional[int]:
+    row = conn.execute("SELECT client_id FROM AdoptionRequests WHERE request_id = ?", (request_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _close_adoptions(conn: sqlite3.Connection, animal_ids: List[int]) -> List[int]:
+    """Закрывает одобренные заявки животных, вернувшихся в приют; client_id их авторов"""
+    clients = [row[0] for row in _select_in(conn, SELECT_ADOPTERS, animal_ids)]
+    if clients:
+        conn.executemany(CLOSE_ADOPTION, [(animal_id,) for animal_id in animal_ids])
+    return clients
+
+
+def _select_in(conn: sqlite3.Connection, sql: str, ids: List[int]) -> Iterator[Tuple]:
+    """Выполняет sql, где {ids} — список плейсхолдеров, порциями по IN_BATCH_SIZE id"""
+    for start in range(0, len(ids), IN_BATCH_SIZE):
+        chunk = ids[start:start + IN_BATCH_SIZE]
+        yield from conn.execute(sql.format(ids=', '.join('?' * len(chunk))), chunk)
+
+
+def _search_filters(filters: Dict, unindexed) -> Tuple[str, List]:
+    """Условия WHERE для фильтров поиска и их параметры"""
+    given = [(column, op, is_range, filters[name]) for name, column, op, is_range in SEARCH_FILTERS
+             if filters.get(name) is not None]
+    # При фильтре по виду или статусу диапазоны не индексируем (unindexed): тогда выборку ведёт
+    # индекс равенства в порядке animal_id, а не диапазон с сортировкой всех строк
+    has_equality = any(not is_range for _, _, is_range, _ in given)
+    sql = ''.join(f" AND {unindexed(column) if is_range and has_equality else column} {op} ?"
+                  for column, op, is_range, _ in given)
+    return sql, [value for *_, value in given]
+
+
+def _cached(db: Database, key: Tuple, sql: str, params: Tuple, row_factory) -> List[Tuple]:
+    """Выборка через кэш базы; вызывающий получает собственную копию списка"""
+    rows = db.cache.get_or_load(key, lambda: tuple(_fetch_all(db, sql, params, row_factory)))
+    return list(rows)
+
+
+def _iter_rows(db: Database, sql: str, params: Tuple = (), batch_size: int = FETCH_BATCH_SIZE,
+               row_factory=None) -> Iterator[Tuple]:
+    """Отдаёт строки запроса пачками по batch_size через fetchmany.
+
+    Соединение занято, пока генератор не исчерпан или не закрыт.
+    """
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.row_factory = row_factory
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+
+def _animals_page(db: Database, sql: str, after_id: Optional[int],
+                  limit: int) -> Tuple[List[AnimalRecord], Optional[int]]:
+    rows = _fetch_all(db, sql, (after_id or 0, limit), ANIMAL_ROWS)
+    # Курсор продолжения — animal_id последней строки полной страницы
+    next_after = rows[-1][0] if len(rows) == limit else None
+    return rows, next_after
+
+
+@timed_methods
 class AnimalCRUD:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: Optional[Database] = None):
+        self.db = db or get_database()
 
     def add_animal(self, animal: Animal) -> int:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        c.execute('''INSERT INTO Animals (name, species, breed, age, arrival_date, health_status, status)
-                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                  (animal.name, animal.species, animal.breed, animal.age,
-                   animal.arrival_date, animal.health_status, animal.status))
-        conn.commit()
-        id_ = c.lastrowid
-        conn.close()
-        return id_
-
-    def get_all_animals(self) -> List[Tuple]:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        c.execute("SELECT * FROM Animals ORDER BY animal_id")
-        rows = c.fetchall()
-        conn.close()
-        return rows
-
-    def get_available_animals(self) -> List[Tuple]:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        c.execute("SELECT * FROM Animals WHERE status = 'в приюте'")
-        rows = c.fetchall()
-        conn.close()
-        return rows
+        with self.db.connection() as conn:
+            c = conn.execute(INSERT_ANIMAL, _animal_params(animal))
+        self.db.cache.invalidate('all_animals', 'available_animals')
+        return c.lastrowid
+
+    def add_animals(self, animals: Iterable[Animal], batch_size: int = INSERT_BATCH_SIZE) -> int:
+        """Массовая вставка: executemany пачками по batch_size, каждая пачка — одна транзакция"""
+        if batch_size < 1:
+            raise ValueError(f"batch_size должен быть не меньше 1: {batch_size}")
+        animals = iter(animals)
+        inserted = 0
+        while True:
+            batch = [_animal_params(animal) for animal in islice(animals, batch_size)]
+            if not batch:
+                return inserted
+            with self.db.connection() as conn:
+                conn.executemany(INSERT_ANIMAL, batch)
+            self.db.cache.invalidate('all_animals', 'available_animals')
+            inserted += len(batch)
+
+    def get_all_animals(self) -> List[AnimalRecord]:
+        return _cached(self.db, ('all_animals',), SELECT_ALL_ANIMALS, (), ANIMAL_ROWS)
+
+    def get_available_animals(self) -> List[AnimalRecord]:
+        return _cached(self.db, ('available_animals',), SELECT_AVAILABLE_ANIMALS, (), ANIMAL_ROWS)
+
+    def iter_all_animals(self, batch_size: int = FETCH_BATCH_SIZE) -> Iterator[AnimalRecord]:
+        return _iter_rows(self.db, SELECT_ALL_ANIMALS, batch_size=batch_size, row_factory=ANIMAL_ROWS)
+
+    def iter_available_animals(self, batch_size: int = FETCH_BATCH_SIZE) -> Iterator[AnimalRecord]:
+        return _iter_rows(self.db, SELECT_AVAILABLE_ANIMALS, batch_size=batch_size, row_factory=ANIMAL_ROWS)
+
+    def get_animals_page(self, after_id: Optional[int] = None,
+                         limit: int = PAGE_SIZE) -> Tuple[List[AnimalRecord], Optional[int]]:
+        """Страница животных после after_id и курсор следующей (None — страниц больше нет)"""
+        return _animals_page(self.db, SELECT_ANIMALS_PAGE, after_id, limit)
+
+    def get_available_animals_page(self, after_id: Optional[int] = None,
+                                   limit: int = PAGE_SIZE) -> Tuple[List[AnimalRecord], Optional[int]]:
+        """Страница доступных животных после after_id и курсор следующей"""
+        return _animals_page(self.db, SELECT_AVAILABLE_ANIMALS_PAGE, after_id, limit)
+
+    def search_animals(self, text: Optional[str] = None, species: Optional[str] = None,
+                       min_age: Optional[int] = None, max_age: Optional[int] = None,
+                       arrived_from: Optional[str] = None, arrived_to: Optional[str] = None,
+                       status: Optional[str] = None, offset: int = 0,
+                       limit: int = PAGE_SIZE) -> Tuple[List[AnimalRecord], Optional[int]]:
+        """Поиск по тексту (имя, вид, порода, здоровье) и фильтрам.
+
+        С текстом результаты упорядочены по релевантности среди последних
+        SEARCH_RANK_WINDOW совпадений (окно растёт вместе с offset), без текста —
+        по animal_id. Возвращает страницу и offset следующей (None — страниц больше нет).
+        """
+        backend = self.db.backend
+        filters, params = _search_filters({
+            'species': species, 'min_age': min_age, 'max_age': max_age,
+            'arrived_from': arrived_from, 'arrived_to': arrived_to, 'status': status,
+        }, backend.unindexed)
+        query = backend.text_query(text) if text else ''
+        if not query:
+            rows = _fetch_all(self.db, SEARCH_ANIMALS.format(filters=filters), (*params, limit, offset), ANIMAL_ROWS)
+        else:
+            window = max(SEARCH_RANK_WINDOW, offset + limit)
+            with self.db.connection() as conn:
+                cursor = conn.cursor()
+                first = cursor.execute(backend.search_window_sql.format(filters=filters),
+                                       (query, *params, window - 1)).fetchone()
+                cursor.row_factory = ANIMAL_ROWS
+                rows = cursor.execute(backend.search_ranked_sql.format(filters=filters),
+                                      (query, first[0] if first else 0, *params, limit, offset)).fetchall()
+        return rows, offset + limit if len(rows) == limit else None
 
     def update_status(self, animal_id: int, new_status: str) -> bool:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        c.execute("UPDATE Animals SET status = ? WHERE animal_id = ?", (new_status, animal_id))
-        updated = c.rowcount > 0
-        conn.commit()
-        conn.close()
-        return updated
+        """Меняет статус животного; возврат в приют закрывает его одобренную заявку"""
+        adopters = []
+        with self.db.write_transaction() as conn:
+            c = conn.execute("UPDATE Animals SET status = ? WHERE animal_id = ?", (new_status, animal_id))
+            if c.rowcount > 0 and new_status == 'в приюте':
+                adopters = _close_adoptions(conn, [animal_id])
+        if c.rowcount > 0:
+            self._invalidate(adopters)
+        return c.rowcount > 0
+
+    def update_statuses(self, statuses: Dict[int, str]) -> Dict[int, bool]:
+        """Меняет статусы нескольких животных одной транзакцией; {animal_id: изменён ли}"""
+        ids = list(statuses)
+        with self.db.write_transaction() as conn:
+            existing = {row[0] for row in _select_in(conn, "SELECT animal_id FROM Animals WHERE animal_id IN ({ids})", ids)}
+            conn.executemany("UPDATE Animals SET status = ? WHERE animal_id = ?",
+                             [(statuses[animal_id], animal_id) for animal_id in ids if animal_id in existing])
+            adopters = _close_adoptions(conn, [animal_id for animal_id in ids
+                                               if animal_id in existing and statuses[animal_id] == 'в приюте'])
+        if existing:
+            self._invalidate(adopters)
+        return {animal_id: animal_id in existing for animal_id in ids}
+
+    def _invalidate(self, adopters: List[int]) -> None:
+        self.db.cache.invalidate('all_animals', 'available_animals')
+        if adopters:
+            self.db.cache.invalidate('all_requests', keys=[('client_requests', cid) for cid in set(adopters)])
 
 
+@timed_methods
 class AdoptionCRUD:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: Optional[Database] = None):
+        self.db = db or get_database()
 
     def create_request(self, request: AdoptionRequest) -> Optional[int]:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        # Проверка доступности
-        c.execute("SELECT status FROM Animals WHERE animal_id = ?", (request.animal_id,))
-        row = c.fetchone()
-        if not row or row[0] != 'в приюте':
-            conn.close()
-            return None
+        """Заявка создаётся, только если животное в приюте — проверка и вставка одним оператором"""
         try:
-            c.execute('''INSERT INTO AdoptionRequests (animal_id, client_id, request_date, status)
-                         VALUES (?, ?, ?, ?)''',
-                      (request.animal_id, request.client_id, request.request_date, request.status))
-            conn.commit()
-            id_ = c.lastrowid
-            conn.close()
-            return id_
-        except sqlite3.IntegrityError:
-            conn.close()
+            with self.db.write_transaction() as conn:
+                c = conn.execute(INSERT_REQUEST_IF_AVAILABLE,
+                                 (request.animal_id, request.client_id, request.request_date, request.status,
+                                  request.animal_id))
+        except self.db.backend.IntegrityError:
+            return None
+        if c.rowcount == 0:
             return None
+        self.db.cache.invalidate('all_requests', keys=[('client_requests', request.client_id)])
+        return c.lastrowid
+
+    def get_all_requests(self) -> List[RequestRecord]:
+        return _cached(self.db, ('all_requests',), SELECT_ALL_REQUESTS, (), REQUEST_ROWS)
+
+    def iter_all_requests(self, batch_size: int = FETCH_BATCH_SIZE) -> Iterator[RequestRecord]:
+        return _iter_rows(self.db, SELECT_ALL_REQUESTS, batch_size=batch_size, row_factory=REQUEST_ROWS)
 
-    def get_all_requests(self) -> List[Tuple]:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        c.execute('''SELECT ar.request_id, ar.animal_id, ar.client_id, ar.request_date, ar.status,
-                            u.name, u.phone, a.name
-                     FROM AdoptionRequests ar
-                     JOIN Users u ON ar.client_id = u.user_id
-                     JOIN Animals a ON ar.animal_id = a.animal_id
-                     ORDER BY ar.request_date DESC''')
-        rows = c.fetchall()
-        conn.close()
-        return rows
-
-    def get_requests_by_client_id(self, client_id: int) -> List[Tuple]:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        c.execute('''SELECT ar.request_id, ar.animal_id, ar.client_id, ar.request_date, ar.status,
-                            a.name
-                     FROM AdoptionRequests ar
-                     JOIN Animals a ON ar.animal_id = a.animal_id
-                     WHERE ar.client_id = ? AND ar.status != 'cancelled'
-                     ORDER BY ar.request_date DESC''', (client_id,))
-        rows = c.fetchall()
-        conn.close()
-        return rows
+    def get_requests_page(self, after: Optional[Tuple[str, int]] = None,
+                          limit: int = PAGE_SIZE) -> Tuple[List[RequestRecord], Optional[Tuple[str, int]]]:
+        """Страница заявок (новые первыми) после курсора (request_date, request_id)"""
+        if after is None:
+            sql, params = SELECT_REQUESTS_PAGE.format(where=""), (limit,)
+        else:
+            sql = SELECT_REQUESTS_PAGE.format(where="WHERE (ar.request_date, ar.request_id) < (?, ?)")
+            params = (after[0], after[1], limit)
+        rows = _fetch_all(self.db, sql, params, REQUEST_ROWS)
+        next_after = (rows[-1].request_date, rows[-1].request_id) if len(rows) == limit else None
+        return rows, next_after
+
+    def get_requests_by_client_id(self, client_id: int) -> List[ClientRequestRecord]:
+        return _cached(self.db, ('client_requests', client_id), SELECT_REQUESTS_BY_CLIENT, (client_id,),
+                       CLIENT_REQUEST_ROWS)
 
     def approve_request(self, request_id: int) -> bool:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        c.execute("UPDATE AdoptionRequests SET status = 'approved' WHERE request_id = ?", (request_id,))
-        if c.rowcount == 0:
-            conn.close()
-            return False
-        c.execute("UPDATE Animals SET status = 'усыновлено' WHERE animal_id = (SELECT animal_id FROM AdoptionRequests WHERE request_id = ?)", (request_id,))
-        conn.commit()
-        conn.close()
+        """pending -> approved; животное становится усыновлённым, конкурирующие заявки отклоняются.
+
+        Всё выполняется в одной транзакции BEGIN IMMEDIATE, каждое изменение
+        защищено условием на текущий статус, поэтому одно животное не может
+        быть отдано дважды даже при одновременных одобрениях.
+        """
+        with self.db.write_transaction() as conn:
+            row = conn.execute("SELECT animal_id, client_id FROM AdoptionRequests WHERE request_id = ? AND status = 'pending'",
+                               (request_id,)).fetchone()
+            if not row:
+                return False
+            animal_id, client_id = row
+            c = conn.execute(ADOPT_ANIMAL, (animal_id, animal_id))
+            if c.rowcount == 0:
+                return False
+            conn.execute("UPDATE AdoptionRequests SET status = 'approved' WHERE request_id = ? AND status = 'pending'",
+                         (request_id,))
+            competitors = [r[0] for r in conn.execute(SELECT_COMPETING_CLIENTS, (animal_id, request_id))]
+            conn.execute(REJECT_COMPETING_REQUESTS, (animal_id, request_id))
+        self.db.cache.invalidate('all_requests', 'all_animals', 'available_animals',
+                                 keys=[('client_requests', cid) for cid in {client_id, *competitors}])
         return True
 
+    def approve_requests(self, request_ids: Iterable[int]) -> Dict[int, bool]:
+        """Пакетное approve_request одной транзакцией; {request_id: одобрена ли}.
+
+        Если в пакете несколько заявок на одно животное, одобряется первая
+        по порядку, остальные отклоняются вместе с прочими конкурентами.
+        """
+        ids = list(dict.fromkeys(request_ids))
+        with self.db.write_transaction() as conn:
+            pending = {row[0]: row[1:] for row in _select_in(
+                conn, "SELECT request_id, animal_id, client_id FROM AdoptionRequests "
+                      "WHERE status = 'pending' AND request_id IN ({ids})", ids)}
+            animal_ids = list({animal_id for animal_id, _ in pending.values()})
+            available = {row[0] for row in _select_in(conn, SELECT_ADOPTABLE_ANIMALS, animal_ids)}
+            winners = {}
+            for request_id in ids:
+                if request_id in pending and pending[request_id][0] in available:
+                    winners.setdefault(pending[request_id][0], request_id)
+            adopted = list(winners)
+            conn.executemany("UPDATE Animals SET status = 'усыновлено' WHERE animal_id = ?",
+                             [(animal_id,) for animal_id in adopted])
+            conn.executemany("UPDATE AdoptionRequests SET status = 'approved' WHERE request_id = ?",
+                             [(request_id,) for request_id in winners.values()])
+            competitors = [row[0] for row in _select_in(
+                conn, "SELECT DISTINCT client_id FROM AdoptionRequests "
+                      "WHERE status = 'pending' AND animal_id IN ({ids})", adopted)]
+            conn.executemany("UPDATE AdoptionRequests SET status = 'rejected' WHERE animal_id = ? AND status = 'pending'",
+                             [(animal_id,) for animal_id in adopted])
+        approved = set(winners.values())
+        if approved:
+            clients = {pending[request_id][1] for request_id in approved} | set(competitors)
+            self.db.cache.invalidate('all_requests', 'all_animals', 'available_animals',
+                                     keys=[('client_requests', cid) for cid in clients])
+        return {request_id: request_id in approved for request_id in ids}
+
+    def reject_requests(self, request_ids: Iterable[int]) -> Dict[int, bool]:
+        """Пакетное reject_request одной транзакцией; {request_id: отклонена ли}"""
+        ids = list(dict.fromkeys(request_ids))
+        with self.db.write_transaction() as conn:
+            pending = dict(_select_in(conn, "SELECT request_id, client_id FROM AdoptionRequests "
+                                            "WHERE status = 'pending' AND request_id IN ({ids})", ids))
+            conn.executemany("UPDATE AdoptionRequests SET status = 'rejected' WHERE request_id = ?",
+                             [(request_id,) for request_id in pending])
+        if pending:
+            self.db.cache.invalidate('all_requests', keys=[('client_requests', cid) for cid in set(pending.values())])
+        return {request_id: request_id in pending for request_id in ids}
+
     def reject_request(self, request_id: int) -> bool:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        c.execute("UPDATE AdoptionRequests SET status = 'rejected' WHERE request_id = ?", (request_id,))
-        success = c.rowcount > 0
-        conn.commit()
-        conn.close()
-        return success
+        """pending -> rejected"""
+        with self.db.write_transaction() as conn:
+            client_id = _request_client_id(conn, request_id)
+            c = conn.execute("UPDATE AdoptionRequests SET status = 'rejected' WHERE request_id = ? AND status = 'pending'",
+                             (request_id,))
+        if c.rowcount == 0:
+            return False
+        self.db.cache.invalidate('all_requests', keys=[('client_requests', client_id)])
+        return True
 
     def cancel_request(self, request_id: int, client_id: int) -> bool:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        c.execute("UPDATE AdoptionRequests SET status = 'cancelled' WHERE request_id = ? AND client_id = ? AND status = 'pending'",
-                  (request_id, client_id))
-        success = c.rowcount > 0
-        conn.commit()
-        conn.close()
-        return success
+        with self.db.connection() as conn:
+            c = conn.execute("UPDATE AdoptionRequests SET status = 'cancelled' WHERE request_id = ? AND client_id = ? AND status = 'pending'",
+                             (request_id, client_id))
+        if c.rowcount == 0:
+            return False
+        self.db.cache.invalidate('all_requests', keys=[('client_requests', client_id)])
+        return True
 
 
+@timed_methods
 class UserCRUD:
-    def __init__(self):
-        self.db = Database()
+    def __init__(self, db: Optional[Database] = None, sessions: Optional[SessionStore] = None):
+        self.db = db or get_database()
+        self.sessions = sessions or get_session_store()
+
+    def add_user(self, user: User) -> Optional[int]:
+        """Добавляет пользователя с солёным хэшем пароля; None, если логин занят"""
+        try:
+            with self.db.connection() as conn:
+                c = conn.execute('''INSERT INTO Users (username, password, role, name, phone)
+                                    VALUES (?, ?, ?, ?, ?)''',
+                                 (user.username, hash_password(user.password), user.role, user.name, user.phone))
+        except self.db.backend.IntegrityError:
+            return None
+        return c.lastrowid
 
     def authenticate(self, username: str, password: str, role: str) -> Optional[Dict]:
-        conn = self.db.get_connection()
-        c = conn.cursor()
-        c.execute("SELECT user_id, username, password, role, name, phone FROM Users WHERE username = ? AND password = ? AND role = ?",
-                  (username, password, role))
-        row = c.fetchone()
-        conn.close()
-        if row:
-            return {
-                'id': row[0],
-                'username': row[1],
-                'role': row[3],
-                'name': row[4],
-                'phone': row[5]
-            }
-        return None
\ No newline at end of file
+        user, rehash = self.check_login(username, password, role)
+        if rehash is not None:
+            self.rehash_password(user['id'], *rehash)
+        return user
+
+    def check_login(self, username: str, password: str, role: str) -> Tuple[Optional[Dict], Optional[Tuple[str, str]]]:
+        """Проверка пароля без записи в базу: (пользователь или None, (старый хэш, новый) или None).
+
+        Второй элемент задан, если хэш пора заменить — это делает rehash_password.
+        """
+        with self.db.connection() as conn:
+            row = conn.execute(SELECT_USER_FOR_LOGIN, (username,)).fetchone()
+        if not row or row[3] != role or not verify_password(password, row[2]):
+            return None, None
+        # Открытый пароль или устаревшие параметры: перехэшируем при успешном входе
+        rehash = (row[2], hash_password(password)) if needs_rehash(row[2]) else None
+        user = {
+            'id': row[0],
+            'username': row[1],
+            'role': row[3],
+            'name': row[4],
+            'phone': row[5]
+        }
+        return user, rehash
+
+    def rehash_password(self, user_id: int, old_hash: str, new_hash: str) -> bool:
+        """Заменяет хэш пароля, если его не поменяли с момента проверки"""
+        with self.db.connection() as conn:
+            c = conn.execute("UPDATE Users SET password = ? WHERE user_id = ? AND password = ?",
+                             (new_hash, user_id, old_hash))
+        return c.rowcount > 0
+
+    def login(self, username: str, password: str, role: str) -> Optional[str]:
+        """Проверяет пароль и открывает сессию; возвращает токен или None"""
+        user = self.authenticate(username, password, role)
+        return self.sessions.create(user) if user else None
+
+    def get_session(self, token: str) -> Optional[Dict]:
+        """Пользователь по токену сессии — без обращения к базе"""
+        return self.sessions.get(token)
+
+    def logout(self, token: str) -> bool:
+        return self.sessions.drop(token)
+
+
+def parse_selection(text: str, limit: int = MAX_SELECTION) -> List[int]:
+    """Разбирает выбор вида '1, 3, 5-9' в список id без повторов; ValueError, если id больше limit"""
+    ids = []
+    for part in text.replace(' ', '').split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            span = range(int(first), int(last or first) + 1)
+        except ValueError:
+            raise ValueError(f"не число или диапазон: {part}") from None
+        # Размер проверяется до построения списка: '1-100000000' не должен занять память
+        if len(ids) + len(span) > limit:
+            raise ValueError(f"выбрано больше {limit} id")
+        ids.extend(span)
+    return list(dict.fromkeys(ids))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная обработка заявок и статусов животных")
+    parser.add_argument('command', choices=['approve', 'reject', 'status'],
+                        help="approve/reject — заявки, status — сменить статус животных")
+    parser.add_argument('ids', help="id через запятую и диапазоны: 1,3,5-9")
+    parser.add_argument('--status', help="новый статус животных для команды status")
+    parser.add_argument('--db', default=DEFAULT_DB_NAME, help="файл базы данных")
+    args = parser.parse_args()
+
+    try:
+        ids = parse_selection(args.ids)
+    except ValueError as e:
+        parser.error(f"неверный выбор '{args.ids}': {e}")
+    if args.command == 'status' and not args.status:
+        parser.error("для команды status нужен --status")
+
+    db = get_database(args.db)
+    if args.command == 'status':
+        outcomes = AnimalCRUD(db).update_statuses({animal_id: args.status for animal_id in ids})
+        done, missed = "статус изменён", "животное не найдено"
+    elif args.command == 'approve':
+        outcomes = AdoptionCRUD(db).approve_requests(ids)
+        done, missed = "одобрена", "не ожидает решения или животное недоступно"
+    else:
+        outcomes = AdoptionCRUD(db).reject_requests(ids)
+        done, missed = "отклонена", "не ожидает решения"
+
+    for item_id, ok in outcomes.items():
+        print(f"{'✓' if ok else '❌'} {item_id}: {done if ok else missed}")
+    print(f"Итого: {sum(outcomes.values())} из {len(outcomes)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,747 @@
 # models/database.py
+import argparse
+import itertools
+import os
+import queue
 import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
+from auth import hash_password
+from backends import BUSY_TIMEOUT_MS, POSTGRES_SEARCH_DOCUMENT, SQLITE, get_backend
+from cache import ListingCache
+from metrics import METRICS, timed
+
+DEFAULT_DB_NAME = 'animal_shelter.db'
+
+# Онлайн-копирование через backup API: страниц за шаг и пауза между шагами, в которую
+# проходят писатели. Запись в источник перезапускает копирование; после стольких
+# перезапусков копия снимается одним шагом (источник на это время читается целиком)
+SNAPSHOT_PAGES = 1024
+SNAPSHOT_SLEEP = 0.001
+SNAPSHOT_MAX_RESTARTS = 3
+
+# Сводные таблицы статистики: содержимое каждой — результат запроса по исходным
+# таблицам. Триггеры миграции 6 поддерживают их инкрементально, stats.py умеет
+# пересчитать их заново и сверить с полным пересчётом.
+ADOPTION_DAY = "substr(r.request_date, 1, 10)"
+STATS_QUERIES = {
+    'StatsAnimals': """SELECT species, coalesce(status, ''), COUNT(*) FROM Animals GROUP BY 1, 2""",
+    'StatsDaily': f"""SELECT day, SUM(intakes), SUM(adoptions) FROM (
+                          SELECT arrival_date AS day, 1 AS intakes, 0 AS adoptions
+                          FROM Animals WHERE arrival_date IS NOT NULL
+                          UNION ALL
+                          SELECT {ADOPTION_DAY}, 0, 1 FROM AdoptionRequests r WHERE r.status = 'approved')
+                      GROUP BY day""",
+    'StatsPending': """SELECT animal_id, COUNT(*) FROM AdoptionRequests WHERE status = 'pending' GROUP BY animal_id""",
+    'StatsAdoptionTime': f"""SELECT 1, COUNT(a.arrival_date),
+                                    coalesce(SUM(julianday({ADOPTION_DAY}) - julianday(a.arrival_date)), 0.0)
+                             FROM AdoptionRequests r JOIN Animals a ON a.animal_id = r.animal_id
+                             WHERE r.status = 'approved'""",
+}
+# Служебные таблицы — журнал изменений, позиции подписчиков и сводная статистика;
+# данных приюта в них нет, экспорт всех таблиц их пропускает
+SERVICE_TABLES = frozenset({'ChangeLog', 'ChangeConsumers', *STATS_QUERIES})
+STATS_REBUILD = tuple(
+    statement for table, query in STATS_QUERIES.items()
+    for statement in (f"DELETE FROM {table}", f"INSERT INTO {table} {query}")
+)
+
+
+def _stats_animal(sign, row):
+    """Тело триггера: учесть (+1) или снять (-1) животное row (NEW/OLD) в сводках"""
+    if sign > 0:
+        return f"""
+            INSERT INTO StatsAnimals (species, status, animals) VALUES ({row}.species, coalesce({row}.status, ''), 1)
+                ON CONFLICT (species, status) DO UPDATE SET animals = animals + 1;
+            INSERT INTO StatsDaily (day, intakes, adoptions) SELECT {row}.arrival_date, 1, 0
+                WHERE {row}.arrival_date IS NOT NULL
+                ON CONFLICT (day) DO UPDATE SET intakes = intakes + 1;"""
+    return f"""
+            UPDATE StatsAnimals SET animals = animals - 1
+                WHERE species = {row}.species AND status = coalesce({row}.status, '');
+            DELETE FROM StatsAnimals WHERE species = {row}.species AND status = coalesce({row}.status, '')
+                AND animals = 0;
+            UPDATE StatsDaily SET intakes = intakes - 1 WHERE day = {row}.arrival_date;
+            DELETE FROM StatsDaily WHERE day = {row}.arrival_date AND intakes = 0 AND adoptions = 0;"""
+
+
+def _stats_request(sign, row):
+    """Тело триггера: учесть (+1) или снять (-1) заявку row (NEW/OLD) в сводках"""
+    day = f"substr({row}.request_date, 1, 10)"
+    arrival = f"(SELECT arrival_date FROM Animals WHERE animal_id = {row}.animal_id)"
+    if sign > 0:
+        return f"""
+            INSERT INTO StatsPending (animal_id, pending) SELECT {row}.animal_id, 1 WHERE {row}.status = 'pending'
+                ON CONFLICT (animal_id) DO UPDATE SET pending = pending + 1;
+            INSERT INTO StatsDaily (day, intakes, adoptions) SELECT {day}, 0, 1 WHERE {row}.status = 'approved'
+                ON CONFLICT (day) DO UPDATE SET adoptions = adoptions + 1;
+            UPDATE StatsAdoptionTime SET adoptions = adoptions + 1,
+                                         total_days = total_days + julianday({day}) - julianday({arrival})
+                WHERE {row}.status = 'approved' AND {arrival} IS NOT NULL;"""
+    return f"""
+            UPDATE StatsPending SET pending = pending - 1 WHERE animal_id = {row}.animal_id AND {row}.status = 'pending';
+            DELETE FROM StatsPending WHERE animal_id = {row}.animal_id AND pending = 0;
+            UPDATE StatsDaily SET adoptions = adoptions - 1 WHERE day = {day} AND {row}.status = 'approved';
+            DELETE FROM StatsDaily WHERE day = {day} AND intakes = 0 AND adoptions = 0;
+            UPDATE StatsAdoptionTime SET adoptions = adoptions - 1,
+                                         total_days = total_days - (julianday({day}) - julianday({arrival}))
+                WHERE {row}.status = 'approved' AND {arrival} IS NOT NULL;"""
+
+
+# События журнала изменений (миграция 7): таблица -> (первичный ключ,
+# {операция: (выражение имени события, выражение JSON-данных)}). В выражениях
+# ROW заменяется на NEW или OLD. Пароли в журнал не попадают.
+CHANGE_EVENTS = {
+    'Animals': ('animal_id', {
+        'insert': ("'animal_added'", "json_object('name', ROW.name, 'species', ROW.species, 'status', ROW.status)"),
+        'update': ("CASE WHEN OLD.status IS NOT NEW.status THEN 'animal_status_changed' ELSE 'animal_updated' END",
+                   "json_object('status', NEW.status, 'old_status', OLD.status)"),
+        'delete': ("'animal_deleted'", "json_object('name', ROW.name, 'status', ROW.status)"),
+    }),
+    'Users': ('user_id', {
+        'insert': ("'user_created'", "json_object('username', ROW.username, 'role', ROW.role)"),
+        'update': ("'user_updated'", "json_object('username', ROW.username, 'role', ROW.role)"),
+        'delete': ("'user_deleted'", "json_object('username', ROW.username, 'role', ROW.role)"),
+    }),
+    'AdoptionRequests': ('request_id', {
+        'insert': ("'request_created'",
+                   "json_object('animal_id', ROW.animal_id, 'client_id', ROW.client_id, 'status', ROW.status)"),
+        # request_approved, request_rejected, request_cancelled
+        'update': ("CASE WHEN OLD.status IS NOT NEW.status THEN 'request_' || NEW.status ELSE 'request_updated' END",
+                   "json_object('animal_id', NEW.animal_id, 'client_id', NEW.client_id, 'status', NEW.status, "
+                   "'old_status', OLD.status)"),
+        'delete': ("'request_deleted'",
+                   "json_object('animal_id', ROW.animal_id, 'client_id', ROW.client_id, 'status', ROW.status)"),
+    }),
+}
+
+
+def _change_trigger(table, operation):
+    pk, events = CHANGE_EVENTS[table]
+    row = 'OLD' if operation == 'delete' else 'NEW'
+    event, payload = (expression.replace('ROW.', f'{row}.') for expression in events[operation])
+    return f'''CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_changelog_{operation}
+                AFTER {operation.upper()} ON {table}
+                BEGIN
+                    INSERT INTO ChangeLog (table_name, row_id, operation, event, payload)
+                    VALUES ('{table}', {row}.{pk}, '{operation}', {event}, {payload});
+                END'''
+
+# Миграции схемы: i-й элемент переводит базу с user_version = i на i + 1.
+# Уже выпущенные миграции не меняются, новые только дописываются в конец.
+MIGRATIONS = [
+    (
+        # Таблица животных
+        '''CREATE TABLE IF NOT EXISTS Animals (
+                animal_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL, species TEXT NOT NULL, breed TEXT,
+                age INTEGER, arrival_date TEXT, health_status TEXT, status TEXT DEFAULT 'в приюте')''',
+        # Таблица пользователей (админы и клиенты)
+        '''CREATE TABLE IF NOT EXISTS Users (
+                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL UNIQUE,
+                password TEXT NOT NULL,
+                role TEXT NOT NULL,  -- 'admin' or 'client'
+                name TEXT NOT NULL,
+                phone TEXT NOT NULL)''',
+        # Таблица заявок (теперь с client_id)
+        '''CREATE TABLE IF NOT EXISTS AdoptionRequests (
+                request_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                animal_id INTEGER NOT NULL,
+                client_id INTEGER NOT NULL,
+                request_date TEXT NOT NULL,
+                status TEXT DEFAULT 'pending',
+                FOREIGN KEY (animal_id) REFERENCES Animals (animal_id),
+                FOREIGN KEY (client_id) REFERENCES Users (user_id))''',
+    ),
+    (
+        # Управляемый набор индексов под запросы crud_operations.py
+        """CREATE INDEX IF NOT EXISTS idx_animals_available
+                ON Animals (animal_id) WHERE status = 'в приюте'""",
+        '''CREATE INDEX IF NOT EXISTS idx_requests_client
+                ON AdoptionRequests (client_id, status, request_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_requests_animal
+                ON AdoptionRequests (animal_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_requests_date
+                ON AdoptionRequests (request_date)''',
+    ),
+    (
+        # Журнал изменений для инкрементального экспорта: заполняется триггерами
+        '''CREATE TABLE IF NOT EXISTS ChangeLog (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                operation TEXT NOT NULL,  -- 'insert' or 'update'
+                changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE INDEX IF NOT EXISTS idx_changelog_table
+                ON ChangeLog (table_name, seq)''',
+    ) + tuple(
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{table.lower()}_changelog_{operation}
+                AFTER {operation.upper()} ON {table}
+                BEGIN
+                    INSERT INTO ChangeLog (table_name, row_id, operation)
+                    VALUES ('{table}', NEW.{pk}, '{operation}');
+                END'''
+        for table, pk in (('Animals', 'animal_id'), ('Users', 'user_id'), ('AdoptionRequests', 'request_id'))
+        for operation in ('insert', 'update')
+    ),
+    (
+        # Не больше одной одобренной заявки на животное. Если из-за прежних гонок
+        # одобренных несколько, остаётся самая ранняя, остальные отклоняются.
+        '''UPDATE AdoptionRequests SET status = 'rejected'
+                WHERE status = 'approved' AND request_id NOT IN (
+                    SELECT MIN(request_id) FROM AdoptionRequests WHERE status = 'approved' GROUP BY animal_id)''',
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_one_approved
+                ON AdoptionRequests (animal_id) WHERE status = 'approved'""",
+    ),
+    (
+        # Полнотекстовый поиск: FTS5 поверх Animals без копии данных (content=),
+        # синхронизируется триггерами
+        """CREATE VIRTUAL TABLE IF NOT EXISTS AnimalSearch USING fts5(
+                name, species, breed, health_status,
+                content='Animals', content_rowid='animal_id',
+                tokenize='unicode61 remove_diacritics 2')""",
+        "INSERT INTO AnimalSearch (AnimalSearch) VALUES ('rebuild')",
+        '''CREATE TRIGGER IF NOT EXISTS trg_animals_search_insert AFTER INSERT ON Animals
+                BEGIN
+                    INSERT INTO AnimalSearch (rowid, name, species, breed, health_status)
+                    VALUES (NEW.animal_id, NEW.name, NEW.species, NEW.breed, NEW.health_status);
+                END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_animals_search_delete AFTER DELETE ON Animals
+                BEGIN
+                    INSERT INTO AnimalSearch (AnimalSearch, rowid, name, species, breed, health_status)
+                    VALUES ('delete', OLD.animal_id, OLD.name, OLD.species, OLD.breed, OLD.health_status);
+                END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_animals_search_update
+                AFTER UPDATE OF name, species, breed, health_status ON Animals
+                BEGIN
+                    INSERT INTO AnimalSearch (AnimalSearch, rowid, name, species, breed, health_status)
+                    VALUES ('delete', OLD.animal_id, OLD.name, OLD.species, OLD.breed, OLD.health_status);
+                    INSERT INTO AnimalSearch (rowid, name, species, breed, health_status)
+                    VALUES (NEW.animal_id, NEW.name, NEW.species, NEW.breed, NEW.health_status);
+                END''',
+        # Индексы под фильтры поиска. При равенстве по виду или статусу строки
+        # идут из индекса в порядке animal_id, и LIMIT обходится без сортировки
+        '''CREATE INDEX IF NOT EXISTS idx_animals_species
+                ON Animals (species)''',
+        '''CREATE INDEX IF NOT EXISTS idx_animals_arrival
+                ON Animals (arrival_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_animals_status
+                ON Animals (status)''',
+    ),
+    (
+        # Сводная статистика (см. STATS_QUERIES), поддерживается триггерами
+        '''CREATE TABLE IF NOT EXISTS StatsAnimals (
+                species TEXT NOT NULL, status TEXT NOT NULL, animals INTEGER NOT NULL,
+                PRIMARY KEY (species, status)) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS StatsDaily (
+                day TEXT PRIMARY KEY, intakes INTEGER NOT NULL, adoptions INTEGER NOT NULL) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS StatsPending (
+                animal_id INTEGER PRIMARY KEY, pending INTEGER NOT NULL)''',
+        '''CREATE INDEX IF NOT EXISTS idx_stats_pending ON StatsPending (pending)''',
+        # Одна строка: число усыновлений с известной датой поступления и сумма дней в приюте
+        '''CREATE TABLE IF NOT EXISTS StatsAdoptionTime (
+                id INTEGER PRIMARY KEY CHECK (id = 1), adoptions INTEGER NOT NULL, total_days REAL NOT NULL)''',
+    ) + STATS_REBUILD + (
+        f'''CREATE TRIGGER IF NOT EXISTS trg_animals_stats_insert AFTER INSERT ON Animals
+                BEGIN{_stats_animal(+1, 'NEW')}
+                END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_animals_stats_delete AFTER DELETE ON Animals
+                BEGIN{_stats_animal(-1, 'OLD')}
+                END''',
+        # Смена даты поступления меняет и «время до усыновления» уже одобренных заявок
+        f'''CREATE TRIGGER IF NOT EXISTS trg_animals_stats_update
+                AFTER UPDATE OF species, status, arrival_date ON Animals
+                BEGIN{_stats_animal(-1, 'OLD')}{_stats_animal(+1, 'NEW')}
+                    UPDATE StatsAdoptionTime SET
+                        adoptions = adoptions
+                            + (SELECT COUNT(*) FROM AdoptionRequests r WHERE r.animal_id = NEW.animal_id
+                               AND r.status = 'approved' AND NEW.arrival_date IS NOT NULL)
+                            - (SELECT COUNT(*) FROM AdoptionRequests r WHERE r.animal_id = OLD.animal_id
+                               AND r.status = 'approved' AND OLD.arrival_date IS NOT NULL),
+                        total_days = total_days
+                            + coalesce((SELECT SUM(julianday({ADOPTION_DAY}) - julianday(NEW.arrival_date))
+                                        FROM AdoptionRequests r WHERE r.animal_id = NEW.animal_id
+                                        AND r.status = 'approved'), 0)
+                            - coalesce((SELECT SUM(julianday({ADOPTION_DAY}) - julianday(OLD.arrival_date))
+                                        FROM AdoptionRequests r WHERE r.animal_id = OLD.animal_id
+                                        AND r.status = 'approved'), 0)
+                        WHERE OLD.arrival_date IS NOT NEW.arrival_date;
+                END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_requests_stats_insert AFTER INSERT ON AdoptionRequests
+                BEGIN{_stats_request(+1, 'NEW')}
+                END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_requests_stats_delete AFTER DELETE ON AdoptionRequests
+                BEGIN{_stats_request(-1, 'OLD')}
+                END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_requests_stats_update
+                AFTER UPDATE OF animal_id, request_date, status ON AdoptionRequests
+                BEGIN{_stats_request(-1, 'OLD')}{_stats_request(+1, 'NEW')}
+                END''',
+    ),
+    (
+        # Журнал изменений как поток событий: имя события и данные в JSON,
+        # удаления, сохранённые позиции подписчиков (см. changefeed.py).
+        # Записи до этой миграции остаются с event и payload = NULL
+        "ALTER TABLE ChangeLog ADD COLUMN event TEXT",
+        "ALTER TABLE ChangeLog ADD COLUMN payload TEXT",
+        '''CREATE TABLE IF NOT EXISTS ChangeConsumers (
+                consumer TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)''',
+    ) + tuple(
+        f"DROP TRIGGER IF EXISTS trg_{table.lower()}_changelog_{operation}"
+        for table in CHANGE_EVENTS for operation in ('insert', 'update')
+    ) + tuple(
+        _change_trigger(table, operation)
+        for table in CHANGE_EVENTS for operation in ('insert', 'update', 'delete')
+    ),
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Схема PostgreSQL: те же таблицы и индексы CRUD. Поиск — по GIN-индексу выражения
+# POSTGRES_SEARCH_DOCUMENT; сводок, журнала изменений и их триггеров здесь нет
+# (возможности statistics и changefeed есть только у SQLite)
+POSTGRES_MIGRATIONS = [
+    (
+        '''CREATE TABLE IF NOT EXISTS Animals (
+                animal_id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                name TEXT NOT NULL, species TEXT NOT NULL, breed TEXT,
+                age INTEGER, arrival_date TEXT, health_status TEXT, status TEXT DEFAULT 'в приюте')''',
+        '''CREATE TABLE IF NOT EXISTS Users (
+                user_id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                username TEXT NOT NULL UNIQUE,
+                password TEXT NOT NULL,
+                role TEXT NOT NULL,
+                name TEXT NOT NULL,
+                phone TEXT NOT NULL)''',
+        '''CREATE TABLE IF NOT EXISTS AdoptionRequests (
+                request_id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                animal_id INTEGER NOT NULL REFERENCES Animals (animal_id),
+                client_id INTEGER NOT NULL REFERENCES Users (user_id),
+                request_date TEXT NOT NULL,
+                status TEXT DEFAULT 'pending')''',
+        """CREATE INDEX IF NOT EXISTS idx_animals_available
+                ON Animals (animal_id) WHERE status = 'в приюте'""",
+        '''CREATE INDEX IF NOT EXISTS idx_animals_species ON Animals (species)''',
+        '''CREATE INDEX IF NOT EXISTS idx_animals_arrival ON Animals (arrival_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_animals_status ON Animals (status)''',
+        f'''CREATE INDEX IF NOT EXISTS idx_animals_search
+                ON Animals USING GIN (({POSTGRES_SEARCH_DOCUMENT}))''',
+        '''CREATE INDEX IF NOT EXISTS idx_requests_client
+                ON AdoptionRequests (client_id, status, request_date)''',
+        '''CREATE INDEX IF NOT EXISTS idx_requests_animal ON AdoptionRequests (animal_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_requests_date ON AdoptionRequests (request_date)''',
+        """CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_one_approved
+                ON AdoptionRequests (animal_id) WHERE status = 'approved'""",
+    ),
+]
+SCHEMAS = {'sqlite': MIGRATIONS, 'postgresql': POSTGRES_MIGRATIONS}
+
+# Файлы из первых версий приложения: заявка хранит имя и телефон клиента вместо
+# client_id. Перед миграциями таблица пересобирается в текущем виде; заявка
+# достаётся клиенту с тем же телефоном, при нескольких таких — совпавшему по имени
+LEGACY_REQUEST_COLUMNS = {'client_name', 'client_phone'}
+LEGACY_REQUEST_CLIENT = '''coalesce(
+        (SELECT MIN(u.user_id) FROM Users u
+         WHERE u.role = 'client' AND u.phone = r.client_phone AND u.name = r.client_name),
+        (SELECT MIN(u.user_id) FROM Users u WHERE u.role = 'client' AND u.phone = r.client_phone))'''
+UPGRADE_LEGACY_REQUESTS = (
+    MIGRATIONS[0][2].replace('IF NOT EXISTS AdoptionRequests', 'AdoptionRequests_upgraded'),
+    f'''INSERT INTO AdoptionRequests_upgraded (request_id, animal_id, client_id, request_date, status)
+            SELECT r.request_id, r.animal_id, {LEGACY_REQUEST_CLIENT}, r.request_date, r.status
+            FROM AdoptionRequests r''',
+    "DROP TABLE AdoptionRequests",
+    "ALTER TABLE AdoptionRequests_upgraded RENAME TO AdoptionRequests",
+)
+
+# Тестовые данные: вставляются только явной командой `python database.py seed`
+SEED_ANIMALS = [
+    ('Барсик', 'Кот', 'Дворовый', 3, '2025-01-10', 'Здоров', 'в приюте'),
+    ('Мурка', 'Кот', 'Сиамская', 2, '2025-02-01', 'Здорова', 'в приюте'),
+    ('Шарик', 'Собака', 'Овчарка', 4, '2025-01-20', 'Здоров', 'в приюте'),
+]
+SEED_USERS = [
+    ('admin1', 'pass1', 'admin', 'Admin One', '+123456789'),
+    ('admin2', 'pass2', 'admin', 'Admin Two', '+987654321'),
+    ('client1', 'pass1', 'client', 'Client One', '+111222333'),
+    ('client2', 'pass2', 'client', 'Client Two', '+444555666'),
+]
+
+# Файлы, схема которых уже проверена в этом процессе, и общие экземпляры Database
+_bootstrapped = set()
+_instances = {}
+_registry_lock = threading.RLock()
+
+
+class ConnectionPool:
+    """Ограниченный потокобезопасный пул соединений (checkout/checkin)"""
+    def __init__(self, factory, size=5, timeout=BUSY_TIMEOUT_MS / 1000):
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._connections = []
+        self._retired = False
+
+    def acquire(self):
+        """Выдаёт свободное соединение, при необходимости создавая новое"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError("пул соединений исчерпан")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = self._factory()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def release(self, conn):
+        """Возвращает соединение в пул; у выведенного из работы пула — закрывает"""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._retired:
+            with self._lock:
+                self._connections.remove(conn)
+            conn.close()
+        else:
+            self._idle.put_nowait(conn)
+        self._slots.release()
+
+    def retire(self):
+        """Закрывает свободные соединения; выданные закроются при возврате"""
+        self._retired = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._connections.remove(conn)
+            conn.close()
+
+    def close(self):
+        """Закрывает все созданные пулом соединения"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+
 
 class Database:
-    def __init__(self, db_name='animal_shelter.db'):
+    def __init__(self, db_name=DEFAULT_DB_NAME, pool_size=5, backend=None):
         self.db_name = db_name
+        # Бэкенд по умолчанию выбирается по имени: URL postgresql:// или файл SQLite
+        self.backend = backend or get_backend(db_name)
+        # У каждого соединения с ':memory:' своя база, поэтому делить можно только одно
+        if db_name == ':memory:':
+            pool_size = 1
+        self.pool = ConnectionPool(self._connect, pool_size)
+        # Общий для всех CRUD над этой базой кэш выборок; CRUD сбрасывает его при записи
+        self.cache = ListingCache()
         self.init_database()
 
+    def _connect(self):
+        return self.backend.connect(self.db_name)
+
     def get_connection(self):
-        return sqlite3.connect(self.db_name)
+        """Отдельное настроенное соединение вне пула; закрывает вызывающий"""
+        return self._connect()
+
+    @contextmanager
+    def connection(self):
+        """Соединение из пула: commit при успехе, rollback при исключении"""
+        # Пул запоминается: у ReplicaDatabase он меняется при refresh
+        pool = self.pool
+        conn = pool.acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            pool.release(conn)
+
+    @contextmanager
+    def write_transaction(self):
+        """Соединение из пула в транзакции с блокировкой записи (BEGIN IMMEDIATE в SQLite).
+
+        Блокировка берётся сразу, поэтому проверки и изменения внутри
+        транзакции не пересекаются с другими писателями (в том числе из других процессов).
+        """
+        with self.connection() as conn:
+            self.backend.begin_write(conn)
+            yield conn
+
+    def close(self):
+        self.pool.close()
+
+    def retire(self):
+        """Закрывает базу, не обрывая начатых операций: их соединения закроются при возврате в пул"""
+        self.pool.retire()
+
+    def snapshot(self, target):
+        """Согласованная копия базы в файл target; писатели при этом не ждут. Возвращает число перезапусков"""
+        self.backend.require('snapshot')
+        with self.connection() as source:
+            target_conn = sqlite3.connect(target)
+            try:
+                return backup_database(source, target_conn)
+            finally:
+                target_conn.close()
+
+    def replica(self, refresh_interval=None, pool_size=5):
+        """Копия базы в памяти только для чтения (см. ReplicaDatabase)"""
+        self.backend.require('snapshot')
+        return ReplicaDatabase(self, refresh_interval, pool_size)
 
     def init_database(self):
-        conn = self.get_connection()
-        c = conn.cursor()
+        """Применяет недостающие миграции; для файла выполняется раз за процесс"""
+        key = self.backend.db_key(self.db_name)
+        with _registry_lock:
+            if key != ':memory:' and key in _bootstrapped:
+                return
+            with self.connection() as conn:
+                migrate(conn, self.backend)
+            _bootstrapped.add(key)
 
-        # Таблица животных
-        c.execute('''CREATE TABLE IF NOT EXISTS Animals (
-                        animal_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT NOT NULL, species TEXT NOT NULL, breed TEXT,
-                        age INTEGER, arrival_date TEXT, health_status TEXT, status TEXT DEFAULT 'в приюте')''')
 
-        # Таблица пользователей (админы и клиенты)
-        c.execute('''CREATE TABLE IF NOT EXISTS Users (
-                        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT NOT NULL UNIQUE,
-                        password TEXT NOT NULL,
-                        role TEXT NOT NULL,  -- 'admin' or 'client'
-                        name TEXT NOT NULL,
-                        phone TEXT NOT NULL)''')
+class SchemaMismatchError(Exception):
+    """Схема файла базы не совпадает с ожидаемой, и обновить её автоматически нельзя"""
 
-        # Таблица заявок (теперь с client_id)
-        c.execute('''CREATE TABLE IF NOT EXISTS AdoptionRequests (
-                        request_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        animal_id INTEGER NOT NULL,
-                        client_id INTEGER NOT NULL,
-                        request_date TEXT NOT NULL,
-                        status TEXT DEFAULT 'pending',
-                        FOREIGN KEY (animal_id) REFERENCES Animals (animal_id),
-                        FOREIGN KEY (client_id) REFERENCES Users (user_id))''')
-
-        # Тестовые данные: животные
+
+def upgrade_legacy_schema(conn):
+    """Переводит таблицу заявок старого формата (client_name, client_phone) на client_id"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(AdoptionRequests)")}
+    if not LEGACY_REQUEST_COLUMNS <= columns or 'client_id' in columns:
+        return
+    orphans = [row[0] for row in conn.execute(
+        f"SELECT r.request_id FROM AdoptionRequests r WHERE {LEGACY_REQUEST_CLIENT} IS NULL ORDER BY 1")]
+    if orphans:
+        raise SchemaMismatchError(
+            "таблица AdoptionRequests в старом формате (client_name/client_phone): для заявок "
+            f"{', '.join(map(str, orphans))} нет клиента с тем же телефоном в Users — "
+            "добавьте клиентов или исправьте телефоны и повторите запуск")
+    for statement in UPGRADE_LEGACY_REQUESTS:
+        conn.execute(statement)
+
+
+def migrate(conn, backend=SQLITE):
+    """Доводит схему до последней версии по версии, которую хранит бэкенд (PRAGMA user_version в SQLite)"""
+    migrations = SCHEMAS[backend.name]
+    if backend.schema_version(conn) >= len(migrations):
+        return
+    # Блокировка записи сериализует миграцию между процессами
+    backend.begin_write(conn)
+    version = backend.schema_version(conn)
+    if version == 0 and backend.name == 'sqlite':
+        upgrade_legacy_schema(conn)
+    for statements in migrations[version:]:
+        for statement in statements:
+            conn.execute(statement)
+    backend.set_schema_version(conn, len(migrations))
+    conn.commit()
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def backup_database(source, target, pages=SNAPSHOT_PAGES, sleep=SNAPSHOT_SLEEP):
+    """Копирует соединение source в target через backup API, по pages страниц за шаг.
+
+    Между шагами источник не заблокирован. Если запись в источник перезапускает
+    копирование чаще SNAPSHOT_MAX_RESTARTS раз, оно повторяется одним шагом.
+    Результат — состояние источника на один момент времени.
+    """
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        # После перезапуска остаток снова растёт до полного размера
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > SNAPSHOT_MAX_RESTARTS:
+                raise _BackupRestarted()
+        state['remaining'] = remaining
+
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=sleep)
+    except _BackupRestarted:
+        source.backup(target)
+    return state['restarts']
+
+
+@timed
+def snapshot_database(db_name, target):
+    """Копирует файл базы db_name в target на один момент времени"""
+    source = sqlite3.connect(db_name)
+    snapshot = sqlite3.connect(target)
+    try:
+        backup_database(source, snapshot)
+    finally:
+        snapshot.close()
+        source.close()
+
+
+def explain_query_plan(conn, sql, params=()):
+    """Строки detail из EXPLAIN QUERY PLAN для запроса"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+class ReplicaDatabase(Database):
+    """Копия базы в памяти для отчётов и экспорта: тяжёлые чтения не трогают рабочий файл.
+
+    Данные — на момент последнего refresh(); с refresh_interval копия
+    обновляется фоновым потоком. Новая копия собирается рядом со старой и
+    подменяет её целиком: запрос, начатый на старой, дочитывает её. Запись
+    через реплику невозможна (PRAGMA query_only).
+    """
+    _generations = itertools.count()
+
+    def __init__(self, source, refresh_interval=None, pool_size=5):
+        self.source = source
+        self.backend = SQLITE
+        self.pool_size = pool_size
+        self.cache = ListingCache()
+        self.pool = None
+        self.refreshed_at = None
+        self._anchor = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.refresh()
+        self._refresher = None
+        if refresh_interval:
+            self._refresher = threading.Thread(target=self._refresh_loop, args=(refresh_interval,),
+                                               name='db-replica', daemon=True)
+            self._refresher.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, uri=True, check_same_thread=False, factory=METRICS.connection_factory)
+        METRICS.instrument(conn)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def refresh(self):
+        """Снимает свежую копию источника и переключает на неё новые запросы"""
+        with self._refresh_lock:
+            # Общий кэш делает базу в памяти видимой всем соединениям с этим именем;
+            # живёт она, пока открыто хоть одно соединение — его держит _anchor
+            name = f"file:shelter-replica-{os.getpid()}-{next(self._generations)}?mode=memory&cache=shared"
+            anchor = sqlite3.connect(name, uri=True, check_same_thread=False)
+            try:
+                with self.source.connection() as source:
+                    backup_database(source, anchor)
+            except BaseException:
+                anchor.close()
+                raise
+            old_pool, old_anchor = self.pool, self._anchor
+            self.db_name, self._anchor = name, anchor
+            self.pool = ConnectionPool(self._connect, self.pool_size)
+            self.refreshed_at = time.time()
+            self.cache.clear()
+            if old_pool is not None:
+                old_pool.retire()
+                old_anchor.close()
+
+    def age(self):
+        """Сколько секунд прошло с последнего refresh"""
+        return time.time() - self.refreshed_at
+
+    def _refresh_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except sqlite3.Error as e:
+                # Копия остаётся прежней; следующая попытка — через interval
+                print(f"⚠️  Реплика не обновлена: {e}", file=sys.stderr)
+
+    def init_database(self):
+        pass
+
+    def close(self):
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+        with self._refresh_lock:
+            self.pool.close()
+            self._anchor.close()
+
+
+def get_database(db_name=DEFAULT_DB_NAME):
+    """Общий для процесса экземпляр Database для файла db_name"""
+    key = get_backend(db_name).db_key(db_name)
+    if key == ':memory:':
+        return Database(db_name)
+    with _registry_lock:
+        if key not in _instances:
+            _instances[key] = Database(db_name)
+        return _instances[key]
+
+
+def seed_database(db):
+    """Заполняет пустые таблицы тестовыми данными"""
+    with db.connection() as conn:
+        c = conn.cursor()
         c.execute("SELECT COUNT(*) FROM Animals")
         if c.fetchone()[0] == 0:
             c.executemany('''INSERT INTO Animals (name, species, breed, age, arrival_date, health_status, status)
-                             VALUES (?, ?, ?, ?, ?, ?, ?)''', [
-                ('Барсик', 'Кот', 'Дворовый', 3, '2025-01-10', 'Здоров', 'в приюте'),
-                ('Мурка', 'Кот', 'Сиамская', 2, '2025-02-01', 'Здорова', 'в приюте'),
-                ('Шарик', 'Собака', 'Овчарка', 4, '2025-01-20', 'Здоров', 'в приюте'),
-            ])
+                             VALUES (?, ?, ?, ?, ?, ?, ?)''', SEED_ANIMALS)
 
-        # Тестовые данные: пользователи
         c.execute("SELECT COUNT(*) FROM Users")
         if c.fetchone()[0] == 0:
-            users = [
-                ('admin1', 'pass1', 'admin', 'Admin One', '+123456789'),
-                ('admin2', 'pass2', 'admin', 'Admin Two', '+987654321'),
-                ('client1', 'pass1', 'client', 'Client One', '+111222333'),
-                ('client2', 'pass2', 'client', 'Client Two', '+444555666'),
-            ]
             c.executemany('''INSERT INTO Users (username, password, role, name, phone)
-                             VALUES (?, ?, ?, ?, ?)''', users)
+                             VALUES (?, ?, ?, ?, ?)''',
+                          [(username, hash_password(password), role, name, phone)
+                           for username, password, role, name, phone in SEED_USERS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Управление базой данных приюта")
+    parser.add_argument('command', choices=['migrate', 'seed', 'check-plans'],
+                        help="migrate — обновить схему, seed — ещё и заполнить тестовыми данными, "
+                             "check-plans — проверить планы запросов CRUD")
+    parser.add_argument('--db', default=DEFAULT_DB_NAME, help="файл базы данных или URL postgresql://")
+    args = parser.parse_args()
+
+    try:
+        db = Database(args.db)
+    except SchemaMismatchError as e:
+        print(f"❌ База '{args.db}': {e}")
+        sys.exit(1)
+    if args.command == 'check-plans':
+        if db.backend is not SQLITE:
+            print("⚠️  Проверка планов запросов есть только для SQLite")
+            db.close()
+            return
+        from crud_operations import check_query_plans
+        problems = check_query_plans(db)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if not problems:
+            print("✓ Все запросы CRUD используют индексы")
+        db.close()
+        sys.exit(1 if problems else 0)
+    if args.command == 'seed':
+        seed_database(db)
+    with db.connection() as conn:
+        version = db.backend.schema_version(conn)
+    print(f"✓ База '{args.db}': схема версии {version}")
+    db.close()
+
 
-        conn.commit()
-        conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
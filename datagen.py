@@ -0,0 +1,195 @@
+# datagen.py
+"""Генератор синтетических данных приюта для замеров на объёме.
+
+Запуск: python datagen.py --db FILE [--animals N] [--users N] [--requests N] [--seed S]
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+from auth import hash_password
+from database import Database
+from stats import rebuild_statistics
+
+# Строк на один executemany: генератор не держит в памяти всю таблицу
+GENERATE_BATCH_SIZE = 50000
+# Все сгенерированные пользователи получают этот пароль (хэш считается один раз)
+GENERATED_PASSWORD = 'password'
+
+NAMES = ['Барсик', 'Мурка', 'Шарик', 'Рекс', 'Пушок', 'Снежок', 'Дымка', 'Рыжик', 'Белка', 'Тузик',
+         'Соня', 'Лаки', 'Джек', 'Марта', 'Граф', 'Кеша', 'Буся', 'Чарли', 'Ириска', 'Тоша']
+BREEDS = {
+    'Кот': ['Дворовый', 'Сиамская', 'Британская', 'Мейн-кун', 'Сфинкс', 'Персидская', 'Бенгальская'],
+    'Собака': ['Дворняга', 'Овчарка', 'Лабрадор', 'Такса', 'Хаски', 'Корги', 'Спаниель', 'Бигль'],
+    'Кролик': ['Карликовый', 'Баран', 'Рекс'],
+    'Попугай': ['Волнистый', 'Корелла', 'Жако'],
+}
+# Веса видов: котов и собак в приюте заметно больше
+SPECIES_WEIGHTS = {'Кот': 45, 'Собака': 40, 'Кролик': 10, 'Попугай': 5}
+HEALTH_STATUSES = ['Здоров', 'Здорова', 'Лечение лапы', 'Аллергия', 'После стерилизации', 'Требует диеты']
+# Доли статусов животных: в приюте / усыновлено / на лечении
+ANIMAL_STATUS_WEIGHTS = {'в приюте': 60, 'усыновлено': 30, 'на лечении': 10}
+# Доли статусов заявок, не ставших одобренными
+REQUEST_STATUS_WEIGHTS = {'pending': 50, 'rejected': 35, 'cancelled': 15}
+FIRST_ARRIVAL = date(2020, 1, 1)
+ARRIVAL_DAYS = 6 * 365
+
+
+def _batched(rows, size=GENERATE_BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_animals(count, rnd):
+    """Строки Animals (без animal_id); статус выбирается по ANIMAL_STATUS_WEIGHTS"""
+    species = list(SPECIES_WEIGHTS)
+    species_weights = list(SPECIES_WEIGHTS.values())
+    statuses = list(ANIMAL_STATUS_WEIGHTS)
+    status_weights = list(ANIMAL_STATUS_WEIGHTS.values())
+    for start in range(0, count, GENERATE_BATCH_SIZE):
+        size = min(GENERATE_BATCH_SIZE, count - start)
+        # Колонки генерируются целиком через choices — это в разы быстрее построчного выбора
+        kinds = rnd.choices(species, species_weights, k=size)
+        names = rnd.choices(NAMES, k=size)
+        ages = rnd.choices(range(16), k=size)
+        days = rnd.choices(range(ARRIVAL_DAYS), k=size)
+        health = rnd.choices(HEALTH_STATUSES, k=size)
+        status = rnd.choices(statuses, status_weights, k=size)
+        for i in range(size):
+            yield (f'{names[i]} {start + i + 1}', kinds[i], rnd.choice(BREEDS[kinds[i]]), ages[i],
+                   (FIRST_ARRIVAL + timedelta(days=days[i])).isoformat(), health[i], status[i])
+
+
+def iter_users(count, password_hash, first_id=1):
+    """Клиенты и по администратору на каждую тысячу; логин строится из будущего user_id"""
+    for user_id in range(first_id, first_id + count):
+        role = 'admin' if user_id % 1000 == 0 else 'client'
+        yield (f'{role}{user_id}', password_hash, role,
+               f'{"Администратор" if role == "admin" else "Клиент"} {user_id}', f'+7900{user_id:07d}')
+
+
+def iter_requests(count, animal_statuses, client_ids, rnd):
+    """Заявки, согласованные со статусами животных.
+
+    Первые заявки — одобренные, по одной на усыновлённое животное (пока хватает
+    count); ожидающие бывают только на животных, которые ещё в приюте.
+    """
+    adopted = [animal_id for animal_id, status in animal_statuses if status == 'усыновлено']
+    available = [animal_id for animal_id, status in animal_statuses if status == 'в приюте'] or [None]
+    all_ids = [animal_id for animal_id, _ in animal_statuses]
+    statuses = list(REQUEST_STATUS_WEIGHTS)
+    weights = list(REQUEST_STATUS_WEIGHTS.values())
+    days = [(FIRST_ARRIVAL + timedelta(days=day)).isoformat() for day in range(ARRIVAL_DAYS)]
+    times = [f'{hour:02d}:{minute:02d}' for hour in range(8, 21) for minute in range(60)]
+
+    approved = adopted[:count]
+    for start in range(0, count, GENERATE_BATCH_SIZE):
+        size = min(GENERATE_BATCH_SIZE, count - start)
+        clients = rnd.choices(client_ids, k=size)
+        dates = rnd.choices(days, k=size)
+        hours = rnd.choices(times, k=size)
+        kinds = rnd.choices(statuses, weights, k=size)
+        waiting = rnd.choices(available, k=size)
+        others = rnd.choices(all_ids, k=size)
+        for i in range(size):
+            position = start + i
+            if position < len(approved):
+                animal_id, status = approved[position], 'approved'
+            elif kinds[i] == 'pending' and waiting[i] is not None:
+                animal_id, status = waiting[i], 'pending'
+            else:
+                animal_id, status = others[i], 'rejected' if kinds[i] == 'pending' else kinds[i]
+            yield animal_id, clients[i], f'{dates[i]} {hours[i]}', status
+
+
+def _drop_write_overhead(conn, tables):
+    """Удаляет триггеры и вторичные индексы таблиц; возвращает их SQL для восстановления"""
+    placeholders = ', '.join('?' * len(tables))
+    objects = conn.execute(f"""SELECT type, name, sql FROM sqlite_master
+                               WHERE type IN ('trigger', 'index') AND sql IS NOT NULL
+                               AND tbl_name IN ({placeholders})""", tables).fetchall()
+    for kind, name, _ in objects:
+        conn.execute(f"DROP {kind.upper()} {name}")
+    return [sql for _, _, sql in objects]
+
+
+def generate(db, animals=10000, users=1000, requests=20000, seed=1, progress=None):
+    """Наполняет базу синтетическими животными, пользователями и заявками.
+
+    Триггеры и индексы на время вставки снимаются и затем создаются заново
+    (поисковый индекс и сводная статистика пересчитываются целиком), поэтому сгенерированные строки
+    не попадают в ChangeLog. Возвращает {таблица: вставлено строк}.
+    """
+    rnd = random.Random(seed)
+    report = progress or (lambda message: None)
+    password_hash = hash_password(GENERATED_PASSWORD)
+    counts = {}
+    with db.write_transaction() as conn:
+        restore = _drop_write_overhead(conn, ['Animals', 'Users', 'AdoptionRequests'])
+        first_animal = (conn.execute("SELECT MAX(animal_id) FROM Animals").fetchone()[0] or 0) + 1
+        first_user = (conn.execute("SELECT MAX(user_id) FROM Users").fetchone()[0] or 0) + 1
+
+        for batch in _batched(iter_animals(animals, rnd)):
+            conn.executemany('''INSERT INTO Animals (name, species, breed, age, arrival_date, health_status, status)
+                                VALUES (?, ?, ?, ?, ?, ?, ?)''', batch)
+        counts['Animals'] = animals
+        report(f"животные: {animals}")
+
+        for batch in _batched(iter_users(users, password_hash, first_user)):
+            conn.executemany("INSERT INTO Users (username, password, role, name, phone) VALUES (?, ?, ?, ?, ?)",
+                             batch)
+        counts['Users'] = users
+        report(f"пользователи: {users}")
+
+        if requests and animals and users:
+            animal_statuses = conn.execute("SELECT animal_id, status FROM Animals WHERE animal_id >= ?",
+                                           (first_animal,)).fetchall()
+            client_ids = range(first_user, first_user + users)
+            for batch in _batched(iter_requests(requests, animal_statuses, client_ids, rnd)):
+                conn.executemany('''INSERT INTO AdoptionRequests (animal_id, client_id, request_date, status)
+                                    VALUES (?, ?, ?, ?)''', batch)
+        counts['AdoptionRequests'] = requests if animals and users else 0
+        report(f"заявки: {counts['AdoptionRequests']}")
+
+        for sql in restore:
+            conn.execute(sql)
+        conn.execute("INSERT INTO AnimalSearch (AnimalSearch) VALUES ('rebuild')")
+        rebuild_statistics(conn)
+        report("индексы и триггеры восстановлены")
+    with db.connection() as conn:
+        conn.execute("ANALYZE")
+    db.cache.clear()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические данные приюта для замеров")
+    parser.add_argument('--db', required=True, help="файл базы данных (будет дополнен)")
+    parser.add_argument('--animals', type=int, default=100000, help="число животных")
+    parser.add_argument('--users', type=int, default=10000, help="число пользователей")
+    parser.add_argument('--requests', type=int, default=200000, help="число заявок")
+    parser.add_argument('--seed', type=int, default=1, help="зерно генератора")
+    args = parser.parse_args()
+
+    print(f"\n{'=' * 60}")
+    print(f"ГЕНЕРАЦИЯ ДАННЫХ: {args.db}")
+    print(f"{'=' * 60}")
+    start = time.perf_counter()
+    db = Database(args.db)
+    counts = generate(db, args.animals, args.users, args.requests, args.seed,
+                      progress=lambda message: print(f"✓ {message} ({time.perf_counter() - start:.1f} с)"))
+    db.close()
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - start
+    print(f"Итого: {total} строк за {elapsed:.1f} с ({total / elapsed:.0f} строк/с)")
+    print(f"{'=' * 60}")
+
+
+if __name__ == "__main__":
+    main()
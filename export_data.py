@@ -1,28 +1,83 @@
 # export_table.py
+import argparse
 import sqlite3
 import json
 import csv
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
-import yaml
+import gzip
+import io
+import itertools
+import struct
+from array import array
+from xml.sax.saxutils import escape
+import multiprocessing
 import os
-import sys
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from changefeed import change_bounds
+from database import SERVICE_TABLES, snapshot_database
+from metrics import METRICS, timed
+
+try:
+    import yaml
+    YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+except ImportError:
+    yaml = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
 
 DB_NAME = 'animal_shelter.db'
 OUT_DIR = 'out'
+# Одиночный экспорт и интерактивный режим читают снимок базы, а не рабочий файл
+SNAPSHOT = False
+# Сколько строк читать из SQLite за раз при потоковом экспорте
+FETCH_BATCH_SIZE = 1000
+# Кавычки экранируются так же, как это делал minidom
+XML_ENTITIES = {'"': '&quot;'}
 
+# Потоковое сжатие: суффикс, добавляемый к имени файла
+COMPRESSIONS = {'none': '', 'gzip': '.gz', 'zstd': '.zst', 'lz4': '.lz4'}
+GZIP_LEVEL = 6
+PARQUET_CODECS = {'none': 'none', 'gzip': 'gzip', 'zstd': 'zstd', 'lz4': 'lz4'}
 
-def prettify_xml(elem):
-    """Форматирует XML-дерево в читаемый вид"""
-    rough_string = ET.tostring(elem, 'utf-8')
-    reparsed = minidom.parseString(rough_string)
-    return reparsed.toprettyxml(indent="  ")
+# Колоночный формат: сигнатура файла и коды типов колонок
+COLUMNAR_MAGIC = b'SHCOL1\n'
+COLUMN_INT64, COLUMN_FLOAT64, COLUMN_TEXT, COLUMN_BLOB = 1, 2, 3, 4
+
+
+def available_compressions():
+    """Методы сжатия, доступные в этом окружении"""
+    optional = {'zstd': zstandard, 'lz4': lz4}
+    return [name for name in COMPRESSIONS if optional.get(name, True) is not None]
 
 
 def get_table_names(cursor):
-    """Получает список всех таблиц в базе данных"""
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-    return [row[0] for row in cursor.fetchall()]
+    """Получает список таблиц с данными: без служебных, виртуальных (FTS5) и их теневых таблиц"""
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+    tables = cursor.fetchall()
+    virtual = tuple(name for name, sql in tables if (sql or '').upper().startswith('CREATE VIRTUAL'))
+    # Теневые таблицы виртуальной хранятся под её именем с суффиксом: AnimalSearch_data, ..._idx
+    shadow_prefixes = tuple(f'{name}_' for name in virtual)
+    return [name for name, _ in tables
+            if name not in SERVICE_TABLES and name not in virtual and not name.startswith(shadow_prefixes)]
 
 
 def get_table_schema(cursor, table_name):
@@ -43,123 +98,685 @@ def get_foreign_keys(cursor, table_name):
     return fks
 
 
-def fetch_table_data(cursor, table_name):
-    """Получает все данные из таблицы"""
+def iter_table_batches(cursor, table_name, batch_size=FETCH_BATCH_SIZE):
+    """Потоково читает таблицу: возвращает колонки и генератор пачек строк"""
     cursor.execute(f'SELECT * FROM "{table_name}"')
     columns = [desc[0] for desc in cursor.description]
-    rows = cursor.fetchall()
 
-    # Преобразуем в список словарей
-    data = []
-    for row in rows:
-        data.append(dict(zip(columns, row)))
+    def batches():
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+
+    return columns, batches()
+
+
+def iter_table_rows(cursor, table_name, batch_size=FETCH_BATCH_SIZE):
+    """Потоково читает таблицу: возвращает колонки и генератор строк"""
+    columns, batches = iter_table_batches(cursor, table_name, batch_size)
+    return columns, (row for batch in batches for row in batch)
+
+
+class JSONWriter:
+    """Потоковая запись JSON-массива записей (формат как у json.dump с indent=2)"""
+    extension = 'json'
+
+    def __init__(self, f, columns, table_name):
+        self.f = f
+        self.columns = columns
+        self.rows = 0
+        f.write('[')
+
+    def write_rows(self, rows):
+        write, columns = self.f.write, self.columns
+        for row in rows:
+            text = json.dumps(dict(zip(columns, row)), ensure_ascii=False, indent=2, default=str)
+            write(',\n  ' if self.rows else '\n  ')
+            write(text.replace('\n', '\n  '))
+            self.rows += 1
+
+    def close(self):
+        self.f.write('\n]' if self.rows else ']')
+
+
+class NDJSONWriter:
+    """Потоковая запись NDJSON: одна компактная JSON-запись на строку"""
+    extension = 'ndjson'
+
+    def __init__(self, f, columns, table_name):
+        self.f = f
+        self.columns = columns
+        self.rows = 0
+        self._encode = json.JSONEncoder(ensure_ascii=False, default=str).encode
+
+    def write_rows(self, rows):
+        write, encode, columns = self.f.write, self._encode, self.columns
+        for row in rows:
+            write(encode(dict(zip(columns, row))))
+            write('\n')
+            self.rows += 1
+
+    def close(self):
+        pass
+
+
+class CSVWriter:
+    """Потоковая запись CSV с заголовком из имён колонок"""
+    extension = 'csv'
+    newline = ''
+
+    def __init__(self, f, columns, table_name):
+        self.rows = 0
+        self._writer = csv.writer(f)
+        self._writer.writerow(columns)
+
+    def write_rows(self, rows):
+        for row in rows:
+            self._writer.writerow(row)
+            self.rows += 1
+
+    def close(self):
+        pass
 
-    return data, columns
 
+class XMLWriter:
+    """Инкрементальная запись XML с отступами, без построения дерева в памяти"""
+    extension = 'xml'
 
-def export_to_json(data, table_name):
-    """Экспорт в JSON формат"""
-    filename = f"{OUT_DIR}/{table_name.lower()}.json"
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    def __init__(self, f, columns, table_name):
+        self.f = f
+        self.rows = 0
+        self.root = table_name.lower()
+        self.tags = [col.replace(' ', '_').lower() for col in columns]
+        f.write(f'<?xml version="1.0" ?>\n<{self.root}>\n')
+
+    def write_rows(self, rows):
+        write, tags = self.f.write, self.tags
+        for row in rows:
+            parts = ['  <record>\n']
+            for tag, value in zip(tags, row):
+                if value is None or value == '':
+                    parts.append(f'    <{tag}/>\n')
+                else:
+                    parts.append(f'    <{tag}>{escape(str(value), XML_ENTITIES)}</{tag}>\n')
+            parts.append('  </record>\n')
+            write(''.join(parts))
+            self.rows += 1
+
+    def close(self):
+        self.f.write(f'</{self.root}>\n')
+
+
+class YAMLWriter:
+    """Потоковая запись YAML: каждая запись — отдельный документ (читать через safe_load_all)"""
+    extension = 'yaml'
+
+    def __init__(self, f, columns, table_name):
+        self.f = f
+        self.columns = columns
+        self.rows = 0
+
+    def write_rows(self, rows):
+        columns = self.columns
+        for row in rows:
+            yaml.dump(dict(zip(columns, row)), self.f, Dumper=YAML_DUMPER, explicit_start=True,
+                      allow_unicode=True, default_flow_style=False, indent=2)
+            self.rows += 1
+
+    def close(self):
+        pass
+
+
+class ColumnarWriter:
+    """Колоночный бинарный формат: заголовок и группы строк из типизированных массивов.
+
+    Каждая пачка строк становится группой; тип колонки в группе (int64, float64,
+    text, blob) выводится по её значениям, NULL хранятся отдельной маской.
+    Читается обратно через iter_columnar_groups.
+    """
+    extension = 'col'
+    binary = True
+
+    def __init__(self, f, columns, table_name):
+        self.f = f
+        self.columns = columns
+        self.rows = 0
+        header = json.dumps({'table': table_name, 'columns': columns}, ensure_ascii=False).encode('utf-8')
+        f.write(COLUMNAR_MAGIC + struct.pack('<I', len(header)) + header)
+
+    def write_rows(self, rows):
+        rows = iter(rows)
+        while True:
+            group = list(itertools.islice(rows, FETCH_BATCH_SIZE))
+            if not group:
+                break
+            self.f.write(struct.pack('<I', len(group)))
+            for i in range(len(self.columns)):
+                kind, payload = _encode_column([row[i] for row in group])
+                self.f.write(struct.pack('<BI', kind, len(payload)))
+                self.f.write(payload)
+            self.rows += len(group)
+
+    def close(self):
+        pass
+
+
+def _encode_column(values):
+    """Кодирует значения колонки одной группы: (тип, маска NULL + данные)"""
+    mask = bytes(value is None for value in values)
+    present = [value for value in values if value is not None]
+    if all(type(value) is int for value in present):
+        try:
+            return COLUMN_INT64, mask + array('q', [value or 0 for value in values]).tobytes()
+        except OverflowError:
+            pass
+    elif all(type(value) in (int, float) for value in present):
+        return COLUMN_FLOAT64, mask + array('d', [value or 0.0 for value in values]).tobytes()
+    if all(type(value) is bytes for value in present):
+        kind, encoded = COLUMN_BLOB, [value or b'' for value in values]
+    else:
+        kind, encoded = COLUMN_TEXT, [b'' if value is None else str(value).encode('utf-8') for value in values]
+    offsets = array('I', [0])
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    return kind, mask + offsets.tobytes() + b''.join(encoded)
+
+
+def _decode_column(kind, payload, count):
+    mask, data = payload[:count], payload[count:]
+    if kind == COLUMN_INT64:
+        values = array('q', data).tolist()
+    elif kind == COLUMN_FLOAT64:
+        values = array('d', data).tolist()
+    else:
+        offsets = array('I', data[:4 * (count + 1)])
+        blob = data[4 * (count + 1):]
+        values = [blob[offsets[i]:offsets[i + 1]] for i in range(count)]
+        if kind == COLUMN_TEXT:
+            values = [value.decode('utf-8') for value in values]
+    return [None if null else value for null, value in zip(mask, values)]
+
+
+def iter_columnar_groups(f):
+    """Читает файл ColumnarWriter: отдаёт группы строк как {колонка: список значений}"""
+    if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("не колоночный файл экспорта")
+    (length,) = struct.unpack('<I', f.read(4))
+    columns = json.loads(f.read(length).decode('utf-8'))['columns']
+    while True:
+        head = f.read(4)
+        if not head:
+            break
+        (count,) = struct.unpack('<I', head)
+        group = {}
+        for column in columns:
+            kind, size = struct.unpack('<BI', f.read(5))
+            group[column] = _decode_column(kind, f.read(size), count)
+        yield group
+
+
+class ParquetWriter:
+    """Parquet через pyarrow: каждая пачка — row group, сжатие встроено в формат"""
+    extension = 'parquet'
+    binary = True
+    compresses_itself = True
+
+    def __init__(self, f, columns, table_name, compression='none'):
+        self.f = f
+        self.columns = columns
+        self.rows = 0
+        self.codec = PARQUET_CODECS[compression]
+        self._writer = None
+
+    def write_rows(self, rows):
+        rows = iter(rows)
+        while True:
+            group = list(itertools.islice(rows, FETCH_BATCH_SIZE))
+            if not group:
+                break
+            values = [[row[i] for row in group] for i in range(len(self.columns))]
+            if self._writer is None:
+                # Схема — по первой пачке; колонки из одних NULL считаем строковыми
+                types = [pyarrow.array(column).type for column in values]
+                schema = pyarrow.schema([(name, pyarrow.string() if pyarrow.types.is_null(t) else t)
+                                         for name, t in zip(self.columns, types)])
+                self._writer = pyarrow.parquet.ParquetWriter(self.f, schema, compression=self.codec)
+            schema = self._writer.schema
+            arrays = [pyarrow.array(column, type=field.type) for column, field in zip(values, schema)]
+            self._writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+            self.rows += len(group)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_output(filename, binary=False, compression='none', newline=None):
+    """Открывает файл экспорта на запись, при необходимости с потоковым сжатием"""
+    text_args = {} if binary else {'encoding': 'utf-8', 'newline': newline}
+    mode = 'wb' if binary else 'wt'
+    if compression == 'gzip':
+        return gzip.open(filename, mode, compresslevel=GZIP_LEVEL, **text_args)
+    if compression == 'lz4':
+        return lz4.frame.open(filename, mode, **text_args)
+    if compression == 'zstd':
+        raw = zstandard.ZstdCompressor().stream_writer(open(filename, 'wb'), closefd=True)
+        return raw if binary else io.TextIOWrapper(raw, **text_args)
+    return open(filename, 'wb' if binary else 'w', **text_args)
+
+
+def _open_writer(writer_class, out_dir, stem, table_name, columns, compression='none'):
+    """Создаёт файл и писатель формата; возвращает (имя файла, файл, писатель)"""
+    if getattr(writer_class, 'compresses_itself', False):
+        filename = f"{out_dir}/{stem}.{writer_class.extension}"
+        f = open(filename, 'wb')
+        args = (f, columns, table_name, compression)
+    else:
+        filename = f"{out_dir}/{stem}.{writer_class.extension}{COMPRESSIONS[compression]}"
+        f = open_output(filename, getattr(writer_class, 'binary', False), compression,
+                        getattr(writer_class, 'newline', None))
+        args = (f, columns, table_name)
+    try:
+        return filename, f, writer_class(*args)
+    except BaseException:
+        f.close()
+        raise
+
+
+@timed
+def write_export(writer_class, rows, columns, table_name, compression='none'):
+    """Пишет поток строк в файл OUT_DIR/<таблица>.<расширение> заданным писателем"""
+    filename, f, writer = _open_writer(writer_class, OUT_DIR, table_name.lower(), table_name, columns, compression)
+    with f:
+        writer.write_rows(rows)
+        writer.close()
+    return filename
+
+
+def export_to_json(rows, columns, table_name, ndjson=False):
+    """Экспорт в JSON формат (массив или NDJSON)"""
+    filename = write_export(NDJSONWriter if ndjson else JSONWriter, rows, columns, table_name)
     print(f"✓ Экспортировано в JSON: {filename}")
     return filename
 
 
-def export_to_csv(data, columns, table_name):
+def export_to_csv(rows, columns, table_name):
     """Экспорт в CSV формат"""
-    filename = f"{OUT_DIR}/{table_name.lower()}.csv"
-    with open(filename, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(columns)
-        for row in data:
-            writer.writerow([row.get(col, '') for col in columns])
+    filename = write_export(CSVWriter, rows, columns, table_name)
     print(f"✓ Экспортировано в CSV: {filename}")
     return filename
 
 
-def export_to_xml(data, table_name):
+def export_to_xml(rows, columns, table_name):
     """Экспорт в XML формат"""
-    root = ET.Element(table_name.lower())
-
-    for record in data:
-        item = ET.SubElement(root, "record")
-        for key, value in record.items():
-            child = ET.SubElement(item, key.replace(' ', '_').lower())
-            child.text = str(value) if value is not None else ""
-
-    filename = f"{OUT_DIR}/{table_name.lower()}.xml"
-    with open(filename, 'w', encoding='utf-8') as f:
-        f.write(prettify_xml(root))
+    filename = write_export(XMLWriter, rows, columns, table_name)
     print(f"✓ Экспортировано в XML: {filename}")
     return filename
 
 
-def export_to_yaml(data, table_name):
+def export_to_yaml(rows, columns, table_name):
     """Экспорт в YAML формат"""
-    filename = f"{OUT_DIR}/{table_name.lower()}.yaml"
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            yaml.dump(data, f, allow_unicode=True, default_flow_style=False, indent=2)
-        print(f"✓ Экспортировано в YAML: {filename}")
-        return filename
-    except ImportError:
+    if yaml is None:
         print("⚠️  Библиотека PyYAML не установлена. Пропускаем экспорт в YAML.")
         return None
+    filename = write_export(YAMLWriter, rows, columns, table_name)
+    print(f"✓ Экспортировано в YAML: {filename}")
+    return filename
 
 
-def export_table(table_name):
-    """Экспортирует указанную таблицу во все форматы"""
+FORMATS = {
+    'json': JSONWriter,
+    'ndjson': NDJSONWriter,
+    'csv': CSVWriter,
+    'xml': XMLWriter,
+    'yaml': YAMLWriter,
+    'columnar': ColumnarWriter,
+}
+if pyarrow is not None:
+    FORMATS['parquet'] = ParquetWriter
+DEFAULT_FORMATS = ('json', 'csv', 'xml', 'yaml')
+# serial — все писатели в текущем потоке, thread — поток на формат,
+# process — процесс на формат (XML/YAML сериализуются параллельно, в обход GIL)
+EXECUTORS = ('serial', 'thread', 'process')
+# Сколько пачек может ждать отстающего писателя; ограничивает память конвейера
+QUEUE_DEPTH = 4
+
+
+def _export_result(fmt, filename, rows, seconds, error=None):
+    return {'format': fmt, 'filename': filename, 'rows': rows, 'seconds': seconds, 'error': error}
+
+
+def _writer_worker(fmt, out_dir, stem, table_name, columns, compression, batches, results):
+    """Пишет пачки из очереди одним форматом до сигнала None и отчитывается в results"""
+    filename = f"{out_dir}/{stem}.{FORMATS[fmt].extension}"
+    start = time.perf_counter()
+    finished = False
+    try:
+        filename, f, writer = _open_writer(FORMATS[fmt], out_dir, stem, table_name, columns, compression)
+        with f:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    finished = True
+                    break
+                writer.write_rows(batch)
+            writer.close()
+        results.put(_export_result(fmt, filename, writer.rows, time.perf_counter() - start))
+    except Exception as e:
+        # Дочитываем очередь, чтобы читатель таблицы не заблокировался на put
+        while not finished and batches.get() is not None:
+            pass
+        results.put(_export_result(fmt, filename, 0, time.perf_counter() - start, str(e)))
+
+
+def _fan_out_serial(batches, columns, table_name, formats, out_dir, stem, compression):
+    files, writers, seconds = [], [], []
+    try:
+        for fmt in formats:
+            filename, f, writer = _open_writer(FORMATS[fmt], out_dir, stem, table_name, columns, compression)
+            files.append((fmt, filename, f))
+            writers.append(writer)
+            seconds.append(0.0)
+        for batch in batches:
+            for i, writer in enumerate(writers):
+                start = time.perf_counter()
+                writer.write_rows(batch)
+                seconds[i] += time.perf_counter() - start
+        for writer in writers:
+            writer.close()
+    finally:
+        for _, _, f in files:
+            f.close()
+    return [_export_result(fmt, filename, writer.rows, busy)
+            for (fmt, filename, _), writer, busy in zip(files, writers, seconds)]
+
+
+def _fan_out_parallel(batches, columns, table_name, formats, out_dir, stem, compression, executor):
+    if executor == 'process':
+        ctx = multiprocessing.get_context()
+        make_queue, make_worker = ctx.Queue, ctx.Process
+    else:
+        make_queue, make_worker = queue.Queue, threading.Thread
+    results = make_queue()
+    queues, workers = [], []
+    for fmt in formats:
+        batch_queue = make_queue(QUEUE_DEPTH)
+        worker = make_worker(target=_writer_worker,
+                             args=(fmt, out_dir, stem, table_name, columns, compression, batch_queue, results),
+                             daemon=True)
+        worker.start()
+        queues.append(batch_queue)
+        workers.append(worker)
+    try:
+        # Одно чтение таблицы: каждая пачка уходит сразу всем писателям
+        for batch in batches:
+            for batch_queue in queues:
+                batch_queue.put(batch)
+    finally:
+        for batch_queue in queues:
+            batch_queue.put(None)
+    collected = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    order = {fmt: i for i, fmt in enumerate(formats)}
+    return sorted(collected, key=lambda result: order[result['format']])
+
+
+@timed
+def export_batches(batches, columns, table_name, formats=DEFAULT_FORMATS, executor='thread', out_dir=None,
+                   stem=None, compression='none'):
+    """Раздаёт каждую прочитанную пачку строк всем выбранным писателям за один проход.
+
+    Файлы называются <stem>.<расширение>[.gz|.zst|.lz4], по умолчанию stem — имя
+    таблицы в нижнем регистре.
+    Возвращает по словарю на формат: format, filename, rows, seconds, error.
+    """
+    out_dir = out_dir or OUT_DIR
+    stem = stem or table_name.lower()
+    formats = list(formats)
+    if 'yaml' in formats and yaml is None:
+        print("⚠️  Библиотека PyYAML не установлена. Пропускаем экспорт в YAML.")
+        formats.remove('yaml')
+    if executor == 'serial' or len(formats) < 2:
+        return _fan_out_serial(batches, columns, table_name, formats, out_dir, stem, compression)
+    return _fan_out_parallel(batches, columns, table_name, formats, out_dir, stem, compression, executor)
+
+
+def print_export_results(results):
+    """Печатает файлы, размеры и пропускную способность по форматам"""
+    for result in results:
+        if result['error']:
+            print(f"❌ {result['format'].upper()}: {result['error']}")
+            continue
+        size = os.path.getsize(result['filename'])
+        rate = result['rows'] / result['seconds'] if result['seconds'] else 0
+        print(f"• {os.path.basename(result['filename'])} ({size} байт) — "
+              f"{result['seconds']:.2f} с, {rate:.0f} строк/с")
+
+
+@contextmanager
+def open_source(consistent=True):
+    """Соединение для чтения: рабочая база или, при SNAPSHOT, её снимок.
+
+    consistent открывает на рабочей базе одну транзакцию чтения: все запросы
+    видят один момент времени, в WAL это не мешает писателям, но пока она
+    открыта, WAL не сжимается. Снимок отвязывает долгий экспорт от рабочего
+    файла совсем ценой копирования базы.
+    """
+    if not SNAPSHOT:
+        conn = METRICS.instrument(sqlite3.connect(DB_NAME, factory=METRICS.connection_factory))
+        try:
+            if consistent:
+                conn.execute("BEGIN")
+            yield conn
+        finally:
+            conn.close()
+        return
     os.makedirs(OUT_DIR, exist_ok=True)
+    fd, snapshot_name = tempfile.mkstemp(suffix='.db', dir=OUT_DIR)
+    os.close(fd)
+    try:
+        snapshot_database(DB_NAME, snapshot_name)
+        conn = METRICS.instrument(sqlite3.connect(snapshot_name, factory=METRICS.connection_factory))
+        try:
+            yield conn
+        finally:
+            conn.close()
+    finally:
+        os.remove(snapshot_name)
+
 
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+@timed
+def export_table(table_name, formats=DEFAULT_FORMATS, executor='thread', compression='none'):
+    """Экспортирует указанную таблицу в выбранные форматы за один проход чтения"""
+    os.makedirs(OUT_DIR, exist_ok=True)
 
     print(f"\n{'=' * 60}")
     print(f"ЭКСПОРТ ТАБЛИЦЫ: {table_name}")
     print(f"{'=' * 60}")
 
-    # Проверяем существование таблицы
-    cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-    if not cursor.fetchone():
-        print(f"❌ Таблица '{table_name}' не найдена!")
-        conn.close()
-        return
-
-    # Получаем данные
-    data, columns = fetch_table_data(cursor, table_name)
+    with open_source() as conn:
+        cursor = conn.cursor()
 
-    if not data:
-        print(f"⚠️  Таблица '{table_name}' пуста!")
-    else:
-        print(f"Найдено записей: {len(data)}")
+        # Проверяем существование таблицы
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+        if not cursor.fetchone():
+            print(f"❌ Таблица '{table_name}' не найдена!")
+            return
 
-        # Экспортируем во все форматы
-        files = []
-        files.append(export_to_json(data, table_name))
-        files.append(export_to_csv(data, columns, table_name))
-        files.append(export_to_xml(data, table_name))
-        yaml_file = export_to_yaml(data, table_name)
-        if yaml_file:
-            files.append(yaml_file)
+        cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"')
+        count = cursor.fetchone()[0]
+        results = []
 
-    conn.close()
+        if not count:
+            print(f"⚠️  Таблица '{table_name}' пуста!")
+        else:
+            print(f"Найдено записей: {count}")
+            start = time.perf_counter()
+            columns, batches = iter_table_batches(cursor, table_name)
+            results = export_batches(batches, columns, table_name, formats, executor, compression=compression)
+            elapsed = time.perf_counter() - start
 
     # Выводим статистику
-    if data:
+    if count:
         print(f"\n{'=' * 60}")
         print("РЕЗУЛЬТАТЫ ЭКСПОРТА:")
         print(f"{'=' * 60}")
+        print_export_results(results)
+        print(f"\n⏱  Общее время ({executor}): {elapsed:.2f} с")
+        print(f"📁 Все файлы сохранены в папке: {os.path.abspath(OUT_DIR)}")
+    print(f"{'=' * 60}")
+
+
+def watermark_path(table_name, out_dir=None):
+    return f"{out_dir or OUT_DIR}/{table_name.lower()}.watermark.json"
 
-        for file_path in files:
-            if file_path and os.path.exists(file_path):
-                file_size = os.path.getsize(file_path)
-                file_name = os.path.basename(file_path)
-                print(f"• {file_name} ({file_size} байт)")
 
-        print(f"\n📁 Все файлы сохранены в папке: {os.path.abspath(OUT_DIR)}")
+def load_watermark(table_name, out_dir=None):
+    """Позиция последней инкрементальной выгрузки: seq журнала ChangeLog и max rowid"""
+    try:
+        with open(watermark_path(table_name, out_dir), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'seq': 0, 'max_id': 0}
+
+
+def save_watermark(table_name, watermark, out_dir=None):
+    """Атомарно сохраняет watermark: файл заменяется только целиком"""
+    path = watermark_path(table_name, out_dir)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(watermark, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def iter_table_delta(cursor, table_name, watermark, batch_size=FETCH_BATCH_SIZE):
+    """Строки, вставленные или изменённые после watermark.
+
+    Возвращает колонки, генератор пачек и новый watermark. Изменения берутся из
+    ChangeLog, если таблица отслеживается триггерами, новые строки — по rowid > max_id.
+    Если журнал уже компактизирован дальше watermark, выгружается вся таблица.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND tbl_name=? AND sql LIKE '%ChangeLog%'",
+                   (table_name,))
+    tracked = cursor.fetchone() is not None
+    if tracked:
+        horizon, seq = change_bounds(cursor)
+        if watermark['seq'] < horizon:
+            # Часть изменений после прошлой выгрузки удалена компактизацией журнала:
+            # выгружаем таблицу целиком
+            watermark = {'seq': seq, 'max_id': 0}
+    else:
+        seq = watermark['seq']
+    cursor.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table_name}"')
+    new_watermark = {'seq': seq, 'max_id': cursor.fetchone()[0]}
+
+    if tracked:
+        cursor.execute(f'''SELECT * FROM "{table_name}" WHERE rowid IN (
+                               SELECT row_id FROM ChangeLog WHERE table_name = ? AND seq > ? AND seq <= ?
+                               UNION
+                               SELECT rowid FROM "{table_name}" WHERE rowid > ?)
+                           ORDER BY rowid''', (table_name, watermark['seq'], seq, watermark['max_id']))
+    else:
+        cursor.execute(f'SELECT * FROM "{table_name}" WHERE rowid > ? ORDER BY rowid', (watermark['max_id'],))
+    columns = [desc[0] for desc in cursor.description]
+
+    def batches():
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
+
+    return columns, batches(), new_watermark
+
+
+@timed
+def _export_snapshot_table(snapshot_name, table_name, formats, executor, out_dir, incremental=False,
+                           compression='none'):
+    """Экспорт одной таблицы из снимка; None — если таблицы нет, [] — если нет изменений"""
+    conn = METRICS.instrument(sqlite3.connect(snapshot_name, factory=METRICS.connection_factory))
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+        if not cursor.fetchone():
+            return None
+        if not incremental:
+            columns, batches = iter_table_batches(cursor, table_name)
+            return export_batches(batches, columns, table_name, formats, executor, out_dir,
+                                  compression=compression)
+
+        watermark = load_watermark(table_name, out_dir)
+        columns, batches, new_watermark = iter_table_delta(cursor, table_name, watermark)
+        first = next(batches, None)
+        if first is None:
+            return []
+        # Дельты нумеруются позицией, до которой они выгружены, и сортируются по имени
+        position = new_watermark['seq'] or new_watermark['max_id']
+        stem = f"{table_name.lower()}.delta-{position:012d}"
+        results = export_batches(itertools.chain([first], batches), columns, table_name, formats, executor,
+                                 out_dir, stem, compression)
+        if not any(result['error'] for result in results):
+            save_watermark(table_name, new_watermark, out_dir)
+        return results
+    finally:
+        conn.close()
+
+
+@timed
+def export_tables(tables, formats=DEFAULT_FORMATS, jobs=1, executor='thread', incremental=False,
+                  compression='none'):
+    """Экспортирует несколько таблиц параллельно (jobs) из одного согласованного снимка базы.
+
+    При incremental=True выгружаются только строки, изменённые с прошлого запуска.
+    """
+    os.makedirs(OUT_DIR, exist_ok=True)
+
+    print(f"\n{'=' * 60}")
+    print(f"ЭКСПОРТ ТАБЛИЦ: {', '.join(tables)} (потоков: {jobs})")
+    print(f"{'=' * 60}")
+
+    start = time.perf_counter()
+    # Все таблицы читаются из одной копии, снятой одним шагом backup,
+    # поэтому видят одно состояние и не держат блокировки рабочей базы
+    fd, snapshot_name = tempfile.mkstemp(suffix='.db', dir=OUT_DIR)
+    os.close(fd)
+    try:
+        snapshot_database(DB_NAME, snapshot_name)
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = {table: pool.submit(_export_snapshot_table, snapshot_name, table, formats, executor, OUT_DIR,
+                                          incremental, compression)
+                       for table in tables}
+            results = {table: future.result() for table, future in futures.items()}
+    finally:
+        os.remove(snapshot_name)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'Таблица':<20} {'Формат':<8} {'Строк':>9} {'Байт':>12} {'Время, с':>9}")
+    total_bytes = 0
+    for table in tables:
+        if results[table] is None:
+            print(f"❌ Таблица '{table}' не найдена!")
+            continue
+        if not results[table]:
+            print(f"{table:<20} нет изменений")
+            continue
+        table_bytes = 0
+        for result in results[table]:
+            if result['error']:
+                print(f"{table:<20} {result['format']:<8} ❌ {result['error']}")
+                continue
+            size = os.path.getsize(result['filename'])
+            table_bytes += size
+            print(f"{table:<20} {result['format']:<8} {result['rows']:>9} {size:>12} {result['seconds']:>9.2f}")
+        total_bytes += table_bytes
+        print(f"{table:<20} {'итого':<8} {'':>9} {table_bytes:>12}")
+
+    print(f"\nВсего: {total_bytes} байт за {elapsed:.2f} с")
+    print(f"📁 Все файлы сохранены в папке: {os.path.abspath(OUT_DIR)}")
     print(f"{'=' * 60}")
+    return results
 
 
 def show_table_info(cursor, table_name):
@@ -197,17 +814,19 @@ def interactive_mode():
     """Интерактивный режим работы"""
     if not os.path.exists(DB_NAME):
         print(f"❌ Файл базы данных '{DB_NAME}' не найден!")
-        print("   Сначала запустите main.py для создания базы данных")
+        print("   Создайте её: python database.py migrate (или seed — с тестовыми данными)")
         return
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    # Без снимка транзакцию не держим: пользователь может думать над выбором сколько угодно
+    with open_source(consistent=False) as conn:
+        _interactive_session(conn.cursor())
 
+
+def _interactive_session(cursor):
     tables = get_table_names(cursor)
 
     if not tables:
         print("❌ В базе данных нет таблиц!")
-        conn.close()
         return
 
     print(f"\n{'=' * 60}")
@@ -248,7 +867,6 @@ def interactive_mode():
 
             confirm = input(f"\nЭкспортировать таблицу '{table_name}'? (да/нет): ").strip().lower()
             if confirm in ['да', 'д', 'y', 'yes']:
-                conn.close()
                 export_table(table_name)
                 break
             else:
@@ -261,11 +879,40 @@ def interactive_mode():
             print(f"❌ Ошибка базы данных: {e}")
             break
 
-    conn.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Экспорт таблиц базы приюта в JSON, CSV, XML, YAML")
+    parser.add_argument('table', nargs='?', help="одна таблица (без аргументов — интерактивный режим)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--all', action='store_true', help="экспортировать все таблицы")
+    target.add_argument('--tables', nargs='+', metavar='TABLE', help="список таблиц")
+    parser.add_argument('--formats', nargs='+', choices=sorted(FORMATS), default=list(DEFAULT_FORMATS),
+                        help="форматы вывода")
+    parser.add_argument('--compress', choices=available_compressions(), default='none',
+                        help="потоковое сжатие файлов")
+    parser.add_argument('--out-dir', default=OUT_DIR, help="папка для файлов")
+    parser.add_argument('--jobs', type=int, default=1, help="сколько таблиц экспортировать одновременно")
+    parser.add_argument('--executor', choices=EXECUTORS, default='thread',
+                        help="где работают писатели форматов внутри одной таблицы")
+    parser.add_argument('--incremental', action='store_true',
+                        help="выгрузить только изменения с прошлого запуска (watermark в --out-dir)")
+    parser.add_argument('--db', default=DB_NAME, help="файл базы данных")
+    parser.add_argument('--snapshot', action='store_true',
+                        help="одиночный экспорт и интерактивный режим — из снимка базы, а не из рабочего файла")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="записать замеры запросов и вызовов (.prom — Prometheus, иначе JSON)")
+    parser.add_argument('--slow-ms', type=float, help="порог журнала медленных запросов, мс")
+    return parser.parse_args(argv)
 
 
 def main():
     """Основная функция программы"""
+    global DB_NAME, OUT_DIR, SNAPSHOT
+    args = parse_args()
+    DB_NAME, OUT_DIR, SNAPSHOT = args.db, args.out_dir, args.snapshot
+    if args.metrics:
+        METRICS.enable(args.slow_ms)
+
     print(f"\n{'=' * 60}")
     print("СИСТЕМА ЭКСПОРТА ДАННЫХ ПРИЮТА ЖИВОТНЫХ")
     print("Экспорт таблиц в форматы JSON, CSV, XML, YAML")
@@ -274,17 +921,30 @@ def main():
     # Проверяем существование базы данных
     if not os.path.exists(DB_NAME):
         print(f"❌ Файл базы данных '{DB_NAME}' не найден!")
-        print("   Сначала запустите main.py для создания базы данных")
+        print("   Создайте её: python database.py migrate (или seed — с тестовыми данными)")
         return
 
     # Обработка аргументов командной строки
-    if len(sys.argv) > 1:
-        table_name = sys.argv[1]
-        export_table(table_name)
+    if args.all or args.tables:
+        if args.all:
+            conn = sqlite3.connect(DB_NAME)
+            tables = get_table_names(conn.cursor())
+            conn.close()
+        else:
+            tables = args.tables
+        export_tables(tables, args.formats, max(1, args.jobs), args.executor, args.incremental, args.compress)
+    elif args.table and args.incremental:
+        export_tables([args.table], args.formats, 1, args.executor, True, args.compress)
+    elif args.table:
+        export_table(args.table, args.formats, args.executor, args.compress)
     else:
         # Интерактивный режим
         interactive_mode()
 
+    if args.metrics:
+        METRICS.dump(args.metrics)
+        print(f"✓ Замеры сохранены: {args.metrics}")
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
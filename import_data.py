@@ -0,0 +1,238 @@
+# import_data.py
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import time
+
+from crud_operations import AnimalCRUD, INSERT_BATCH_SIZE
+from database import DEFAULT_DB_NAME, get_database
+from models import Animal
+
+# Размер блока чтения при потоковом разборе JSON-массива
+READ_CHUNK_SIZE = 1 << 16
+FORMATS = ('csv', 'json', 'ndjson')
+# Поиск границы элемента JSON-массива: скобки, запятые и начало строки; хвост строки до закрывающей кавычки
+JSON_STRUCTURE = re.compile(r'[\[\]{},"]')
+JSON_STRING_TAIL = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+# Промежуток между элементами массива: пробелы и запятые
+JSON_GAP = re.compile(r'[\s,]*')
+# За элементом массива — запятая или ']'; пустая группа — буфер кончился раньше
+JSON_SEPARATOR = re.compile(r'\s*([,\]]|\Z)')
+
+
+def detect_format(path):
+    """Определяет формат по расширению (учитывая .gz)"""
+    name = path[:-3] if path.endswith('.gz') else path
+    ext = os.path.splitext(name)[1].lower().lstrip('.')
+    if ext == 'jsonl':
+        return 'ndjson'
+    if ext not in FORMATS:
+        raise ValueError(f"неизвестный формат файла: {path}")
+    return ext
+
+
+def open_input(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def iter_csv(f):
+    for line_no, record in enumerate(csv.DictReader(f), 2):
+        yield line_no, record
+
+
+class MalformedRecord(ValueError):
+    """Запись, которая не разобралась как JSON; fragment — её исходный текст для файла отклонённых"""
+    def __init__(self, error, fragment):
+        super().__init__(str(error))
+        self.fragment = fragment
+
+
+def iter_ndjson(f):
+    for line_no, line in enumerate(f, 1):
+        if line.strip():
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, MalformedRecord(e, line.rstrip('\r\n'))
+
+
+def _find_element_end(buffer, pos, depth):
+    """Ищет с позиции pos запятую или ']' верхнего уровня массива.
+
+    Возвращает (индекс границы или None, позиция продолжения поиска, глубина).
+    Лишние закрывающие скобки глубину ниже нуля не опускают.
+    """
+    while True:
+        match = JSON_STRUCTURE.search(buffer, pos)
+        if match is None:
+            return None, len(buffer), depth
+        char = match.group()
+        if char == '"':
+            tail = JSON_STRING_TAIL.match(buffer, match.end())
+            if tail is None:
+                # Строка не закончилась в буфере: после дочитывания продолжим с её начала
+                return None, match.start(), depth
+            pos = tail.end()
+            continue
+        if char in '[{':
+            depth += 1
+        elif char in ',]' and depth == 0:
+            return match.start(), match.start(), depth
+        elif char in ']}':
+            depth = max(depth - 1, 0)
+        pos = match.end()
+
+
+def _read_element(f, buffer, eof):
+    """Дочитывает f, пока в buffer не найдётся граница первого элемента; (граница или None, buffer, eof)"""
+    pos, depth = 0, 0
+    while True:
+        boundary, pos, depth = _find_element_end(buffer, pos, depth)
+        if boundary is not None or eof:
+            return boundary, buffer, eof
+        chunk = f.read(READ_CHUNK_SIZE)
+        eof = not chunk
+        buffer += chunk
+
+
+def iter_json_array(f):
+    """Потоково разбирает JSON-массив объектов, не загружая файл целиком.
+
+    Испорченный элемент отдаётся как MalformedRecord, разбор продолжается
+    со следующей запятой или ']' верхнего уровня.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(READ_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("ожидался JSON-массив записей")
+    # Разбор идёт по позиции pos; буфер сдвигается только при дочитывании блока
+    pos = 1
+    index = 0
+    eof = False
+    while True:
+        pos = JSON_GAP.match(buffer, pos).end()
+        if len(buffer) - pos < READ_CHUNK_SIZE and not eof:
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        if buffer.startswith(']', pos):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+            separator = JSON_SEPARATOR.match(buffer, end)
+        except json.JSONDecodeError:
+            separator = None
+        if separator is None or not separator.group(1):
+            # Элемент не поместился в буфер или испорчен: отделяем его по границе и разбираем отдельно
+            boundary, buffer, eof = _read_element(f, buffer[pos:], eof)
+            if boundary is None:
+                yield index + 1, MalformedRecord("JSON-массив оборвался без закрывающей ']'", buffer.strip())
+                return
+            fragment = buffer[:boundary].strip()
+            if not fragment:
+                # Граница оказалась в только что дочитанном блоке: элемента перед ней нет
+                pos = boundary
+                continue
+            try:
+                record = json.loads(fragment)
+            except json.JSONDecodeError as e:
+                record = MalformedRecord(e, fragment)
+            end = boundary
+        index += 1
+        yield index, record
+        pos = end
+
+
+READERS = {'csv': iter_csv, 'json': iter_json_array, 'ndjson': iter_ndjson}
+
+
+class RejectLog:
+    """Пишет отклонённые записи в NDJSON-файл рядом с исходным; файл создаётся при первой ошибке"""
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._f = None
+
+    def add(self, position, record, error):
+        if self._f is None:
+            self._f = open(self.path, 'w', encoding='utf-8')
+        if isinstance(record, Exception):
+            record = getattr(record, 'fragment', None)
+        self._f.write(json.dumps({'position': position, 'error': str(error), 'record': record},
+                                 ensure_ascii=False, default=str))
+        self._f.write('\n')
+        self.count += 1
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+
+
+def iter_valid_animals(records, rejects):
+    """Проверяет записи через Animal.from_dict, ошибочные уходят в rejects"""
+    for position, record in records:
+        if not isinstance(record, dict):
+            rejects.add(position, record, record if isinstance(record, Exception) else "запись не является объектом")
+            continue
+        try:
+            yield Animal.from_dict(record)
+        except ValueError as e:
+            rejects.add(position, record, e)
+
+
+def import_animals(path, crud, file_format=None, batch_size=INSERT_BATCH_SIZE, rejects_path=None):
+    """Импортирует животных из CSV/JSON/NDJSON; возвращает (добавлено, отклонено, секунд)"""
+    file_format = file_format or detect_format(path)
+    rejects = RejectLog(rejects_path or f"{path}.rejects.ndjson")
+    start = time.perf_counter()
+    try:
+        with open_input(path) as f:
+            animals = iter_valid_animals(READERS[file_format](f), rejects)
+            inserted = crud.add_animals(animals, batch_size)
+    finally:
+        rejects.close()
+    return inserted, rejects.count, time.perf_counter() - start
+
+
+def positive_int(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"нужно целое число не меньше 1: {text}")
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт животных из CSV, JSON, NDJSON")
+    parser.add_argument('file', help="файл с записями (можно .gz)")
+    parser.add_argument('--format', choices=FORMATS, help="формат файла (по умолчанию — по расширению)")
+    parser.add_argument('--db', default=DEFAULT_DB_NAME, help="файл базы данных")
+    parser.add_argument('--batch-size', type=positive_int, default=INSERT_BATCH_SIZE, help="строк на транзакцию")
+    parser.add_argument('--rejects', help="куда писать отклонённые записи (по умолчанию <file>.rejects.ndjson)")
+    args = parser.parse_args()
+
+    print(f"\n{'=' * 60}")
+    print(f"ИМПОРТ ЖИВОТНЫХ: {args.file}")
+    print(f"{'=' * 60}")
+
+    crud = AnimalCRUD(get_database(args.db))
+    try:
+        inserted, rejected, elapsed = import_animals(args.file, crud, args.format, args.batch_size, args.rejects)
+    except (OSError, ValueError) as e:
+        print(f"❌ Ошибка импорта: {e}")
+        return
+
+    rate = inserted / elapsed if elapsed else 0
+    print(f"✓ Добавлено: {inserted} за {elapsed:.2f} с ({rate:.0f} строк/с)")
+    if rejected:
+        print(f"⚠️  Отклонено: {rejected} — см. {args.rejects or args.file + '.rejects.ndjson'}")
+    print(f"{'=' * 60}")
+
+
+if __name__ == "__main__":
+    main()
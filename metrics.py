@@ -0,0 +1,312 @@
+# metrics.py
+"""Инструментирование горячих путей: время SQL-запросов, вызовов CRUD и экспорта.
+
+По умолчанию выключено: пока не вызван METRICS.enable(), Database создаёт
+обычные sqlite3.Connection, а обёртки timed лишь проверяют флаг. Соединения,
+открытые до enable(), остаются без замеров — включать до создания Database.
+"""
+import bisect
+import functools
+import inspect
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Верхние границы корзин гистограмм, мс
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Запросы не быстрее этого попадают в журнал медленных вместе с планом
+SLOW_QUERY_MS = 100.0
+SLOW_LOG_SIZE = 100
+PROMETHEUS_PREFIX = 'shelter'
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAM_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_sql(sql):
+    """Ключ запроса: пробелы схлопнуты, литералы заменены на ?, списки ? — на '?, ...'"""
+    sql = _LITERALS.sub('?', _SPACES.sub(' ', sql).strip())
+    return _PARAM_LISTS.sub('?, ...', sql)
+
+
+class Histogram:
+    """Счётчики по корзинам LATENCY_BUCKETS_MS плюс число, сумма и максимум"""
+    __slots__ = ('buckets', 'count', 'total_ms', 'max_ms', 'errors')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.errors = 0
+
+    def observe(self, ms, failed=False):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.errors += failed
+
+    def quantile(self, q):
+        """Верхняя граница корзины, в которую попадает квантиль q (оценка сверху)"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.count, 4) if self.count else 0.0,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'max_ms': round(self.max_ms, 3),
+        }
+
+
+class Metrics:
+    """Реестр замеров процесса; все методы потокобезопасны"""
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = SLOW_QUERY_MS
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self, slow_query_ms=None):
+        if slow_query_ms is not None:
+            self.slow_query_ms = slow_query_ms
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            # нормализованный SQL -> Histogram времени execute
+            self.queries = {}
+            # имя функции -> Histogram времени вызова
+            self.calls = {}
+            # нормализованный SQL -> сколько операторов SQLite он запустил (по trace callback):
+            # сам запрос, неявный BEGIN, программы сработавших триггеров и служебные запросы FTS5
+            self.statements = {}
+            self.slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+            self.slow_total = 0
+
+    @property
+    def connection_factory(self):
+        """Класс соединения для sqlite3.connect(factory=...)"""
+        return InstrumentedConnection if self.enabled else sqlite3.Connection
+
+    def instrument(self, conn):
+        """Подключает к соединению set_trace_callback; без enable() ничего не делает"""
+        if self.enabled and isinstance(conn, InstrumentedConnection):
+            conn.set_trace_callback(conn.trace)
+        return conn
+
+    def observe_query(self, conn, sql, params, ms, statements=0, failed=False):
+        key = normalize_sql(sql)
+        with self._lock:
+            histogram = self.queries.get(key)
+            if histogram is None:
+                histogram = self.queries[key] = Histogram()
+            histogram.observe(ms, failed)
+            self.statements[key] = self.statements.get(key, 0) + statements
+        if ms >= self.slow_query_ms:
+            self._log_slow(conn, sql, params, ms)
+
+    def _log_slow(self, conn, sql, params, ms):
+        plan = None
+        if params is not None:
+            try:
+                # Базовый execute — EXPLAIN не должен сам попасть в замеры
+                plan = [row[3] for row in sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", params)]
+            except sqlite3.Error:
+                pass
+        entry = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'ms': round(ms, 3),
+                 'sql': normalize_sql(sql), 'plan': plan}
+        with self._lock:
+            self.slow_queries.append(entry)
+            self.slow_total += 1
+
+    def observe_call(self, name, ms, failed=False):
+        with self._lock:
+            histogram = self.calls.get(name)
+            if histogram is None:
+                histogram = self.calls[name] = Histogram()
+            histogram.observe(ms, failed)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'slow_query_ms': self.slow_query_ms,
+                'queries': {key: h.to_dict() for key, h in self.queries.items()},
+                'calls': {name: h.to_dict() for name, h in self.calls.items()},
+                'statements': dict(self.statements),
+                'slow_total': self.slow_total,
+                'slow_queries': list(self.slow_queries),
+            }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Текстовый формат экспозиции Prometheus (время — в секундах)"""
+        lines = []
+        with self._lock:
+            _prometheus_histograms(lines, 'sql_query_duration_seconds', 'Время execute по запросу',
+                                   'sql', self.queries)
+            _prometheus_histograms(lines, 'call_duration_seconds', 'Время вызова CRUD и экспорта',
+                                   'function', self.calls)
+            name = f'{PROMETHEUS_PREFIX}_call_errors_total'
+            lines += [f'# HELP {name} Вызовы, завершившиеся исключением', f'# TYPE {name} counter']
+            lines += [f'{name}{{function="{_label(key)}"}} {h.errors}' for key, h in sorted(self.calls.items())]
+            name = f'{PROMETHEUS_PREFIX}_sql_statements_total'
+            lines += [f'# HELP {name} Операторы SQLite по запросу, включая неявный BEGIN и триггеры',
+                      f'# TYPE {name} counter']
+            lines += [f'{name}{{sql="{_label(key)}"}} {count}' for key, count in sorted(self.statements.items())]
+            name = f'{PROMETHEUS_PREFIX}_slow_queries_total'
+            lines += [f'# HELP {name} Запросы медленнее порога', f'# TYPE {name} counter',
+                      f'{name} {self.slow_total}']
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Пишет замеры в файл: .prom/.txt — Prometheus, иначе JSON"""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _prometheus_histograms(lines, suffix, help_text, label, histograms):
+    name = f'{PROMETHEUS_PREFIX}_{suffix}'
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for key, histogram in sorted(histograms.items()):
+        value = _label(key)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, histogram.buckets):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{label}="{value}",le="{bound / 1000:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{label}="{value}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{label}="{value}"}} {histogram.total_ms / 1000:.6f}')
+        lines.append(f'{name}_count{{{label}="{value}"}} {histogram.count}')
+
+
+METRICS = Metrics()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, замеряющий execute/executemany (подготовка и первый шаг запроса)"""
+    def execute(self, sql, parameters=()):
+        return self._observe(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # План без параметров не построить: у executemany их много
+        return self._observe(super().executemany, sql, seq_of_parameters, None)
+
+    def _observe(self, method, sql, parameters, plan_parameters):
+        conn = self.connection
+        traced = conn.traced
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = method(sql, parameters)
+            failed = False
+            return result
+        finally:
+            if METRICS.enabled:
+                METRICS.observe_query(conn, sql, plan_parameters, (time.perf_counter() - start) * 1000,
+                                      conn.traced - traced, failed)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Сколько операторов SQLite сообщил trace callback; соединение за раз держит один поток
+    traced = 0
+
+    def trace(self, statement):
+        self.traced += 1
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def timed(fn=None, *, name=None):
+    """Декоратор: время и ошибки вызовов fn в METRICS.calls.
+
+    Если fn вернула генератор, замер длится до его исчерпания.
+    """
+    if fn is None:
+        return functools.partial(timed, name=name)
+    name = name or fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not METRICS.enabled:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            METRICS.observe_call(name, (time.perf_counter() - start) * 1000, True)
+            raise
+        if inspect.isgenerator(result):
+            return _timed_iter(name, result, start)
+        METRICS.observe_call(name, (time.perf_counter() - start) * 1000)
+        return result
+    return wrapper
+
+
+def _timed_iter(name, iterator, start):
+    failed = False
+    try:
+        yield from iterator
+    except Exception:
+        failed = True
+        raise
+    finally:
+        METRICS.observe_call(name, (time.perf_counter() - start) * 1000, failed)
+
+
+def timed_methods(cls):
+    """Декоратор класса: timed для всех его публичных методов"""
+    for attr, value in list(vars(cls).items()):
+        if not attr.startswith('_') and inspect.isfunction(value):
+            setattr(cls, attr, timed(value))
+    return cls
+
+
+def print_report(metrics=METRICS, top=10):
+    """Самые затратные запросы и вызовы по суммарному времени"""
+    data = metrics.to_dict()
+    for title, section in (("ЗАПРОСЫ SQL", data['queries']), ("ВЫЗОВЫ", data['calls'])):
+        print(f"\n{title} (топ {top} по суммарному времени):")
+        print(f"{'Всего, мс':>10} {'Вызовов':>8} {'p95, мс':>8} {'Макс, мс':>9}  Ключ")
+        ranked = sorted(section.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        for key, stats in ranked[:top]:
+            print(f"{stats['total_ms']:>10.1f} {stats['count']:>8} {stats['p95_ms']:>8g} {stats['max_ms']:>9.2f}  "
+                  f"{key[:90]}")
+    if data['slow_total']:
+        print(f"\n⚠️  Медленных запросов (≥ {data['slow_query_ms']:g} мс): {data['slow_total']}")
+        for entry in data['slow_queries'][-5:]:
+            print(f"  {entry['ms']:.1f} мс  {entry['sql'][:90]}")
+            for detail in entry['plan'] or []:
+                print(f"      {detail}")
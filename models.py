@@ -1,10 +1,34 @@
 # models/models.py
+import json
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Строки текущей даты и минуты кэшируются до смены минуты, чтобы
+# массовое создание моделей не вызывало strftime на каждый объект
+_clock_cache = [None, "", ""]
+
+
+def _now_strings() -> Tuple[str, str]:
+    minute = int(time.time() // 60)
+    if _clock_cache[0] != minute:
+        now = datetime.now()
+        _clock_cache[:] = [minute, now.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d %H:%M")]
+    return _clock_cache[1], _clock_cache[2]
+
+
+def today() -> str:
+    return _now_strings()[0]
+
+
+def now_minute() -> str:
+    return _now_strings()[1]
 
 
 class Animal:
     """Модель животного"""
+    __slots__ = ("animal_id", "name", "species", "breed", "age", "arrival_date", "health_status", "status")
+
     def __init__(
         self,
         name: str,
@@ -13,34 +37,96 @@ class Animal:
         age: Optional[int] = None,
         health_status: Optional[str] = None,
         arrival_date: Optional[str] = None,
-        status: str = "в приюте"
+        status: str = "в приюте",
+        animal_id: Optional[int] = None
     ):
+        self.animal_id = animal_id
         self.name = name.strip()
         self.species = species.strip()
         self.breed = (breed or "").strip()
         self.age = age
         self.health_status = (health_status or "").strip()
-        self.arrival_date = arrival_date or datetime.now().strftime("%Y-%m-%d")
+        self.arrival_date = arrival_date or today()
         self.status = status
 
+    @classmethod
+    def from_row(cls, row: Tuple) -> "Animal":
+        """Быстрое создание из строки Animals (SELECT *) без повторной нормализации"""
+        animal = cls.__new__(cls)
+        (animal.animal_id, animal.name, animal.species, animal.breed, animal.age,
+         animal.arrival_date, animal.health_status, animal.status) = row
+        return animal
+
+    @classmethod
+    def from_dict(cls, record: Dict) -> "Animal":
+        """Проверяет и нормализует запись из внешнего файла; ValueError при ошибке"""
+        name = str(record.get("name") or "").strip()
+        species = str(record.get("species") or "").strip()
+        if not name or not species:
+            raise ValueError("поля name и species обязательны")
+
+        age = record.get("age")
+        if age in (None, ""):
+            age = None
+        else:
+            # true из JSON — тоже int, а дробный возраст int() молча усёк бы
+            if isinstance(age, bool) or (isinstance(age, float) and not age.is_integer()):
+                raise ValueError(f"некорректный возраст (age): {age!r}")
+            try:
+                age = int(age)
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"некорректный возраст (age): {age!r}")
+            if age < 0:
+                raise ValueError(f"некорректный возраст (age): {age!r}")
+
+        arrival_date = str(record.get("arrival_date") or "").strip() or None
+        if arrival_date:
+            try:
+                datetime.strptime(arrival_date, "%Y-%m-%d")
+            except ValueError:
+                raise ValueError(f"дата поступления не в формате ГГГГ-ММ-ДД: {arrival_date!r}")
+
+        return cls(
+            name=name,
+            species=species,
+            breed=str(record.get("breed") or ""),
+            age=age,
+            health_status=str(record.get("health_status") or ""),
+            arrival_date=arrival_date,
+            status=str(record.get("status") or "").strip() or "в приюте",
+        )
+
 
 class AdoptionRequest:
     """Модель заявки на усыновление"""
+    __slots__ = ("request_id", "animal_id", "client_id", "status", "request_date")
+
     def __init__(
         self,
         animal_id: int,
         client_id: int,
         status: str = "pending",
-        request_date: Optional[str] = None
+        request_date: Optional[str] = None,
+        request_id: Optional[int] = None
     ):
+        self.request_id = request_id
         self.animal_id = animal_id
         self.client_id = client_id
         self.status = status
-        self.request_date = request_date or datetime.now().strftime("%Y-%m-%d %H:%M")
+        self.request_date = request_date or now_minute()
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "AdoptionRequest":
+        """Быстрое создание из строки AdoptionRequests (SELECT *)"""
+        request = cls.__new__(cls)
+        request.request_id, request.animal_id, request.client_id, request.request_date, request.status = row
+        return request
 
 
 class User:
     """Модель пользователя (админ/клиент)"""
+    __slots__ = ("user_id", "username", "password", "role", "name", "phone")
+
     def __init__(
         self,
         username: str,
@@ -52,7 +138,71 @@ class User:
     ):
         self.user_id = user_id
         self.username = username.strip()
-        self.password = password  # plain text
+        self.password = password  # открытый; в базу UserCRUD.add_user пишет только хэш
         self.role = role
         self.name = name.strip()
-        self.phone = phone.strip()
\ No newline at end of file
+        self.phone = phone.strip()
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "User":
+        """Быстрое создание из строки Users (SELECT *)"""
+        user = cls.__new__(cls)
+        user.user_id, user.username, user.password, user.role, user.name, user.phone = row
+        return user
+
+
+# Строки, которые возвращают методы чтения CRUD. Это кортежи, поэтому доступ
+# по индексу работает как раньше, а поля можно читать по имени без __dict__.
+class AnimalRecord(NamedTuple):
+    animal_id: int
+    name: str
+    species: str
+    breed: Optional[str]
+    age: Optional[int]
+    arrival_date: Optional[str]
+    health_status: Optional[str]
+    status: str
+
+
+class RequestRecord(NamedTuple):
+    request_id: int
+    animal_id: int
+    client_id: int
+    request_date: str
+    status: str
+    client_name: str
+    client_phone: str
+    animal_name: str
+
+
+class ClientRequestRecord(NamedTuple):
+    request_id: int
+    animal_id: int
+    client_id: int
+    request_date: str
+    status: str
+    animal_name: str
+
+
+class ChangeEvent(NamedTuple):
+    seq: int
+    table_name: str
+    row_id: int
+    operation: str
+    event: Optional[str]
+    payload: Optional[str]
+    changed_at: str
+
+    @property
+    def data(self) -> Dict:
+        """payload, разобранный из JSON"""
+        return json.loads(self.payload) if self.payload else {}
+
+
+def record_factory(record_class):
+    """row_factory для sqlite3: строка сразу становится record_class"""
+    make = tuple.__new__
+
+    def factory(cursor, row):
+        return make(record_class, row)
+    return factory
@@ -0,0 +1,328 @@
+# server.py
+"""HTTP/JSON API приюта поверх AnimalCRUD/AdoptionCRUD/UserCRUD.
+
+Запуск: python server.py [--host H] [--port P] [--db FILE]
+
+    POST /login                    {"username", "password", "role"} -> {"token"}
+    POST /logout
+    GET  /animals                  ?after=<id>&limit=<n>
+    GET  /animals/available        ?after=<id>&limit=<n>
+    GET  /animals/search           ?q=<текст>&species=&status=&min_age=&max_age=&arrived_from=&arrived_to=
+                                   &offset=<n>&limit=<n>
+    GET  /requests                 ?after_date=<дата>&after_id=<id>&limit=<n>  (администратор)
+    GET  /requests/mine            (клиент)
+    POST /requests                 {"animal_id"}  (клиент)
+    POST /requests/<id>/cancel     (клиент)
+    POST /requests/<id>/approve    (администратор)
+    POST /requests/<id>/reject     (администратор)
+    GET  /metrics                  ?format=json — замеры (только с --metrics), по умолчанию Prometheus
+
+Токен передаётся заголовком "Authorization: Bearer <token>".
+С --replica-refresh каталог и поиск читаются из копии базы в памяти
+(ReplicaDatabase) и могут отставать от записей на интервал обновления.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import sys
+import traceback
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from crud_operations import AnimalCRUD, AdoptionCRUD, UserCRUD, PAGE_SIZE
+from database import DEFAULT_DB_NAME, get_database
+from metrics import METRICS
+from models import AdoptionRequest
+
+# Ответы короче этого не сжимаем: заголовки gzip съедят выигрыш
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 5
+MAX_PAGE_SIZE = 1000
+MAX_BODY_SIZE = 64 * 1024
+# Целые за пределами 64-битного знакового INTEGER SQLite драйвер не передаёт (OverflowError)
+MIN_INTEGER, MAX_INTEGER = -2 ** 63, 2 ** 63 - 1
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _records(rows):
+    return [row._asdict() for row in rows]
+
+
+def _int_value(value, name):
+    """Целое из параметра пути, запроса или тела; вне диапазона INTEGER — 400"""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"параметр {name} должен быть целым числом")
+    if not MIN_INTEGER <= number <= MAX_INTEGER:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"параметр {name} вне допустимого диапазона")
+    return number
+
+
+def _int_param(query, name, default=None):
+    values = query.get(name)
+    if not values:
+        return default
+    return _int_value(values[0], name)
+
+
+def _limit(query):
+    return max(1, min(_int_param(query, 'limit', PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+class ShelterServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, db, catalog_db=None):
+        super().__init__(address, ShelterRequestHandler)
+        self.animals = AnimalCRUD(db)
+        # Каталог и поиск можно читать из реплики: они терпят отставание на интервал обновления
+        self.catalog = AnimalCRUD(catalog_db or db)
+        self.adoptions = AdoptionCRUD(db)
+        self.users = UserCRUD(db)
+
+
+class ShelterRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 — соединение остаётся открытым между запросами (keep-alive)
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ShelterAPI/1.0'
+    # Заголовки и тело уходят отдельными write: без TCP_NODELAY ответ ждёт delayed ACK клиента
+    disable_nagle_algorithm = True
+
+    # (метод, шаблон пути, обработчик, требуемая роль или None)
+    ROUTES = [
+        ('POST', r'/login', 'login', None),
+        ('POST', r'/logout', 'logout', None),
+        ('GET', r'/animals', 'list_animals', None),
+        ('GET', r'/animals/available', 'list_available_animals', None),
+        ('GET', r'/animals/search', 'search_animals', None),
+        ('GET', r'/requests', 'list_requests', 'admin'),
+        ('GET', r'/requests/mine', 'list_my_requests', 'client'),
+        ('POST', r'/requests', 'create_request', 'client'),
+        ('POST', r'/requests/(\d+)/cancel', 'cancel_request', 'client'),
+        ('POST', r'/requests/(\d+)/approve', 'approve_request', 'admin'),
+        ('POST', r'/requests/(\d+)/reject', 'reject_request', 'admin'),
+        ('GET', r'/metrics', 'metrics', None),
+    ]
+    COMPILED_ROUTES = [(method, re.compile(pattern + '$'), name, role) for method, pattern, name, role in ROUTES]
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def log_message(self, format, *args):
+        # Журнал каждого запроса на stderr заметно тормозит под нагрузкой
+        pass
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query)
+        try:
+            # Тело читаем до маршрутизации: при ошибке его остаток иначе испортит
+            # следующий запрос в том же keep-alive соединении
+            self.body = self._read_body()
+            for route_method, pattern, name, role in self.COMPILED_ROUTES:
+                match = pattern.match(url.path)
+                if match and route_method == method:
+                    self.user = self._authorize(role)
+                    status, payload, cacheable = getattr(self, name)(*match.groups())
+                    if isinstance(payload, str):
+                        self._send_text(status, payload)
+                    else:
+                        self._send_json(status, payload, cacheable)
+                    return
+            raise ApiError(HTTPStatus.NOT_FOUND, "нет такого ресурса")
+        except ApiError as e:
+            self._send_json(e.status, {'error': str(e)})
+        except ConnectionError:
+            # Клиент закрыл соединение — отвечать некому
+            self.close_connection = True
+        except Exception as e:
+            print(f"❌ {method} {self.path}: {type(e).__name__}: {e}", file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            # Ответ мог оборваться на середине: соединение после него не переиспользуем
+            self.close_connection = True
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "внутренняя ошибка сервера"})
+
+    def _authorize(self, role):
+        header = self.headers.get('Authorization', '')
+        user = self.server.users.get_session(header[7:]) if header.startswith('Bearer ') else None
+        if role is None:
+            return user
+        if user is None:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "требуется вход")
+        if user['role'] != role:
+            raise ApiError(HTTPStatus.FORBIDDEN, "недостаточно прав")
+        return user
+
+    def _read_body(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_SIZE:
+            self.close_connection = True
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "неверная длина тела запроса")
+        return self.rfile.read(length) if length else b''
+
+    def _read_json(self):
+        if not self.body:
+            return {}
+        try:
+            body = json.loads(self.body)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "тело запроса должно быть JSON")
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "тело запроса должно быть JSON-объектом")
+        return body
+
+    def _send_json(self, status, payload, cacheable=False):
+        """Отправляет JSON; для выборок — ETag и 304, большие ответы — в gzip"""
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+        if cacheable:
+            etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+            headers['ETag'] = etag
+            headers['Cache-Control'] = 'no-cache'
+            if etag in self.headers.get('If-None-Match', '').replace(' ', '').split(','):
+                status, body = HTTPStatus.NOT_MODIFIED, b''
+        if len(body) >= GZIP_MIN_SIZE:
+            headers['Vary'] = 'Accept-Encoding'
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body, GZIP_LEVEL)
+                headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_text(self, status, text):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Обработчики возвращают (статус, данные, можно ли отдавать ETag); строка уходит как text/plain
+
+    def login(self):
+        body = self._read_json()
+        token = self.server.users.login(str(body.get('username', '')), str(body.get('password', '')),
+                                        str(body.get('role', '')))
+        if token is None:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "неверный логин, пароль или роль")
+        return HTTPStatus.OK, {'token': token}, False
+
+    def logout(self):
+        header = self.headers.get('Authorization', '')
+        return HTTPStatus.OK, {'ok': self.server.users.logout(header[7:])}, False
+
+    def list_animals(self):
+        rows, next_after = self.server.catalog.get_animals_page(_int_param(self.query, 'after'), _limit(self.query))
+        return HTTPStatus.OK, {'items': _records(rows), 'next_after': next_after}, True
+
+    def list_available_animals(self):
+        rows, next_after = self.server.catalog.get_available_animals_page(_int_param(self.query, 'after'),
+                                                                          _limit(self.query))
+        return HTTPStatus.OK, {'items': _records(rows), 'next_after': next_after}, True
+
+    def search_animals(self):
+        values = {name: self.query[name][0] for name in ('q', 'species', 'status', 'arrived_from', 'arrived_to')
+                  if name in self.query}
+        rows, next_offset = self.server.catalog.search_animals(
+            values.get('q'), values.get('species'), _int_param(self.query, 'min_age'),
+            _int_param(self.query, 'max_age'), values.get('arrived_from'), values.get('arrived_to'), values.get('status'),
+            max(0, _int_param(self.query, 'offset', 0)), _limit(self.query))
+        return HTTPStatus.OK, {'items': _records(rows), 'next_offset': next_offset}, True
+
+    def list_requests(self):
+        after_id = _int_param(self.query, 'after_id')
+        after = (self.query['after_date'][0], after_id) if after_id is not None and 'after_date' in self.query else None
+        rows, next_after = self.server.adoptions.get_requests_page(after, _limit(self.query))
+        next_cursor = {'after_date': next_after[0], 'after_id': next_after[1]} if next_after else None
+        return HTTPStatus.OK, {'items': _records(rows), 'next': next_cursor}, True
+
+    def list_my_requests(self):
+        rows = self.server.adoptions.get_requests_by_client_id(self.user['id'])
+        return HTTPStatus.OK, {'items': _records(rows)}, True
+
+    def create_request(self):
+        animal_id = self._read_json().get('animal_id')
+        # bool — подкласс int: true из JSON не должен стать животным №1
+        if not isinstance(animal_id, int) or isinstance(animal_id, bool):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "нужен целый animal_id")
+        animal_id = _int_value(animal_id, 'animal_id')
+        request_id = self.server.adoptions.create_request(AdoptionRequest(animal_id, self.user['id']))
+        if request_id is None:
+            raise ApiError(HTTPStatus.CONFLICT, "животное недоступно для усыновления")
+        return HTTPStatus.CREATED, {'request_id': request_id}, False
+
+    def cancel_request(self, request_id):
+        request_id = _int_value(request_id, 'request_id')
+        if not self.server.adoptions.cancel_request(request_id, self.user['id']):
+            raise ApiError(HTTPStatus.CONFLICT, "заявку нельзя отменить")
+        return HTTPStatus.OK, {'request_id': request_id, 'status': 'cancelled'}, False
+
+    def approve_request(self, request_id):
+        request_id = _int_value(request_id, 'request_id')
+        if not self.server.adoptions.approve_request(request_id):
+            raise ApiError(HTTPStatus.CONFLICT, "заявка не ожидает решения или животное уже недоступно")
+        return HTTPStatus.OK, {'request_id': request_id, 'status': 'approved'}, False
+
+    def reject_request(self, request_id):
+        request_id = _int_value(request_id, 'request_id')
+        if not self.server.adoptions.reject_request(request_id):
+            raise ApiError(HTTPStatus.CONFLICT, "заявка не ожидает решения")
+        return HTTPStatus.OK, {'request_id': request_id, 'status': 'rejected'}, False
+
+    def metrics(self):
+        if not METRICS.enabled:
+            raise ApiError(HTTPStatus.NOT_FOUND, "замеры выключены (запустите сервер с --metrics)")
+        if self.query.get('format') == ['json']:
+            return HTTPStatus.OK, METRICS.to_dict(), False
+        return HTTPStatus.OK, METRICS.to_prometheus(), False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON API приюта")
+    parser.add_argument('--host', default='127.0.0.1', help="адрес для прослушивания")
+    parser.add_argument('--port', type=int, default=8000, help="порт")
+    parser.add_argument('--db', default=DEFAULT_DB_NAME, help="файл базы данных")
+    parser.add_argument('--replica-refresh', type=float, metavar='SECONDS',
+                        help="каталог и поиск — из копии базы в памяти, обновляемой с этим интервалом")
+    parser.add_argument('--metrics', action='store_true', help="включить замеры и GET /metrics")
+    parser.add_argument('--slow-ms', type=float, help="порог журнала медленных запросов, мс")
+    args = parser.parse_args()
+
+    if args.metrics:
+        METRICS.enable(args.slow_ms)
+    db = get_database(args.db)
+    replica = db.replica(args.replica_refresh) if args.replica_refresh else None
+    server = ShelterServer((args.host, args.port), db, replica)
+    print(f"✓ API приюта: http://{args.host}:{server.server_address[1]}/ (Ctrl+C — остановить)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nОстановка сервера")
+    finally:
+        server.server_close()
+        if replica is not None:
+            replica.close()
+
+
+if __name__ == "__main__":
+    main()
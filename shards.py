@@ -0,0 +1,363 @@
+# shards.py
+"""Несколько приютов в отдельных файлах базы (шардах).
+
+Конфигурация — JSON {"shelters": {приют: путь к базе}}, относительные пути
+считаются от каталога конфигурации. Записи идут в базу своего приюта,
+чтения по всем приютам (доступные животные, поиск, статистика, экспорт)
+выполняются параллельно в пуле потоков и сливаются в один упорядоченный поток.
+
+Запуск: python shards.py {list,add,available,search,stats,export} [--config FILE] [...]
+"""
+import argparse
+import heapq
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import export_data
+from crud_operations import PAGE_SIZE, AdoptionCRUD, AnimalCRUD, UserCRUD
+from database import Database
+from models import AnimalRecord
+from stats import ShelterStats
+
+DEFAULT_SHARD_CONFIG = 'shards.json'
+# Потоков для параллельных чтений; sqlite3 отпускает GIL на время запроса
+FANOUT_WORKERS = 8
+
+# Курсор постраничного чтения по всем шардам: приют -> offset следующей страницы
+# (None — у приюта записей больше нет)
+ShardCursor = Dict[str, Optional[int]]
+
+
+class UnknownShelter(KeyError):
+    """Приют не описан в конфигурации шардов"""
+    def __str__(self):
+        return f"приют '{self.args[0]}' не найден в конфигурации шардов"
+
+
+def load_shard_config(path: str) -> Dict[str, str]:
+    """Приют -> абсолютный путь к базе; нет файла — шардов нет"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            shelters = json.load(f).get('shelters', {})
+    except FileNotFoundError:
+        return {}
+    base = os.path.dirname(os.path.abspath(path))
+    return {shelter: os.path.abspath(os.path.join(base, db_path)) for shelter, db_path in shelters.items()}
+
+
+def save_shard_config(path: str, shelters: Dict[str, str]) -> None:
+    """Записывает конфигурацию атомарно: читатели видят либо старый, либо новый файл"""
+    base = os.path.dirname(os.path.abspath(path))
+    data = {'shelters': {shelter: os.path.relpath(db_path, base) for shelter, db_path in sorted(shelters.items())}}
+    fd, tmp_name = tempfile.mkstemp(suffix='.json', dir=base)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_name, path)
+
+
+class ShardRouter:
+    """Маршрутизация записей по приюту и параллельные чтения по всем приютам.
+
+    Набор шардов меняется без остановки: add_shard добавляет приют в этом
+    процессе сразу, другие процессы подхватывают новую конфигурацию по mtime
+    файла при следующем обращении. Уже идущие чтения дорабатывают по прежнему набору,
+    убранные базы закрываются после них.
+    """
+    def __init__(self, config_path: str = DEFAULT_SHARD_CONFIG, workers: int = FANOUT_WORKERS):
+        self.config_path = config_path
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shard')
+        self._lock = threading.Lock()
+        # Словарь не меняется на месте, а заменяется целиком: fan_out берёт его как снимок
+        self._shards: Dict[str, Database] = {}
+        self._mtime = None
+        self.reload()
+
+    def reload(self) -> None:
+        """Перечитывает конфигурацию: открывает новые шарды и закрывает убранные"""
+        with self._lock:
+            try:
+                self._mtime = os.stat(self.config_path).st_mtime_ns
+            except FileNotFoundError:
+                self._mtime = None
+            paths = load_shard_config(self.config_path)
+            shards = {shelter: db for shelter, db in self._shards.items() if paths.get(shelter) == db.db_name}
+            for shelter, db_path in paths.items():
+                if shelter not in shards:
+                    shards[shelter] = Database(db_path)
+            removed = [db for shelter, db in self._shards.items() if shards.get(shelter) is not db]
+            self._shards = shards
+        # Чтения по прежнему набору шардов могли ещё не закончиться: их соединения закроются при возврате
+        for db in removed:
+            db.retire()
+
+    def _current(self) -> Dict[str, Database]:
+        try:
+            mtime = os.stat(self.config_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime:
+            self.reload()
+        return self._shards
+
+    def shelters(self) -> List[str]:
+        return sorted(self._current())
+
+    def database(self, shelter: str) -> Database:
+        try:
+            return self._current()[shelter]
+        except KeyError:
+            raise UnknownShelter(shelter) from None
+
+    def animals(self, shelter: str) -> AnimalCRUD:
+        return AnimalCRUD(self.database(shelter))
+
+    def adoptions(self, shelter: str) -> AdoptionCRUD:
+        return AdoptionCRUD(self.database(shelter))
+
+    def users(self, shelter: str) -> UserCRUD:
+        return UserCRUD(self.database(shelter))
+
+    def add_shard(self, shelter: str, db_path: str) -> Database:
+        """Подключает приют: создаёт базу со схемой и дописывает её в конфигурацию"""
+        db_path = os.path.abspath(db_path)
+        with self._lock:
+            if shelter in self._shards:
+                raise ValueError(f"приют '{shelter}' уже есть в конфигурации шардов")
+            # Схема создаётся до публикации в конфигурации: читатели не увидят пустой файл
+            db = Database(db_path)
+            paths = load_shard_config(self.config_path)
+            paths[shelter] = db_path
+            save_shard_config(self.config_path, paths)
+            self._mtime = os.stat(self.config_path).st_mtime_ns
+            self._shards = {**self._shards, shelter: db}
+        return db
+
+    def fan_out(self, fn: Callable[[str, Database], object],
+                shelters: Optional[List[str]] = None) -> Dict[str, object]:
+        """Вызывает fn(приют, база) для каждого шарда параллельно; приют -> результат"""
+        shards = self._current()
+        # Приют мог пропасть из конфигурации после того, как вызывающий взял список
+        names = sorted(shards) if shelters is None else [shelter for shelter in shelters if shelter in shards]
+        futures = {shelter: self._executor.submit(fn, shelter, shards[shelter]) for shelter in names}
+        return {shelter: future.result() for shelter, future in futures.items()}
+
+    def search_animals(self, text: Optional[str] = None, cursor: Optional[ShardCursor] = None,
+                       limit: int = PAGE_SIZE, **filters) -> Tuple[List[Tuple[str, AnimalRecord]], Optional[ShardCursor]]:
+        """Поиск по всем приютам: страница (приют, животное) и курсор следующей (None — конец).
+
+        Без текста страницы шардов сливаются по animal_id, с текстом — по месту
+        в выдаче своего приюта (у каждого шарда своя статистика bm25, поэтому
+        сами оценки между приютами не сравниваются). filters — как у AnimalCRUD.search_animals.
+        """
+        cursor = dict(cursor or {})
+        shelters = [shelter for shelter in self.shelters() if cursor.get(shelter, 0) is not None]
+
+        def page(shelter, db):
+            return AnimalCRUD(db).search_animals(text, offset=cursor.get(shelter, 0), limit=limit, **filters)
+
+        pages = self.fan_out(page, shelters)
+
+        def keyed(shelter):
+            offset = cursor.get(shelter, 0)
+            for position, row in enumerate(pages[shelter][0], offset):
+                yield (position if text else row.animal_id), shelter, row
+
+        merged = list(heapq.merge(*(keyed(shelter) for shelter in pages), key=lambda item: item[:2]))[:limit]
+        taken = dict.fromkeys(pages, 0)
+        for _, shelter, _ in merged:
+            taken[shelter] += 1
+        for shelter, (rows, next_offset) in pages.items():
+            # Шард исчерпан, если отдана вся его последняя страница
+            exhausted = next_offset is None and taken[shelter] == len(rows)
+            cursor[shelter] = None if exhausted else cursor.get(shelter, 0) + taken[shelter]
+        more = any(offset is not None for offset in cursor.values())
+        return [(shelter, row) for _, shelter, row in merged], cursor if more else None
+
+    def available_animals(self, species: Optional[str] = None, cursor: Optional[ShardCursor] = None,
+                          limit: int = PAGE_SIZE) -> Tuple[List[Tuple[str, AnimalRecord]], Optional[ShardCursor]]:
+        """Животные «в приюте» во всех приютах по страницам"""
+        return self.search_animals(cursor=cursor, limit=limit, species=species, status='в приюте')
+
+    def stats(self) -> 'ShardedStats':
+        return ShardedStats(self)
+
+    def export_table(self, table_name: str, formats=export_data.DEFAULT_FORMATS, out_dir: Optional[str] = None,
+                     executor: str = 'thread', compression: str = 'none') -> List[Dict]:
+        """Экспорт таблицы всех приютов в одни файлы с колонкой shelter; ValueError, если таблицы нет.
+
+        Снимки шардов снимаются параллельно (Database.snapshot), затем читаются
+        по очереди в порядке имён приютов; рабочие базы не держат транзакций чтения.
+        """
+        out_dir = out_dir or export_data.OUT_DIR
+        os.makedirs(out_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=out_dir) as tmp:
+            def snapshot(shelter, db):
+                target = os.path.join(tmp, f'{id(db)}.db')
+                db.snapshot(target)
+                return target
+
+            snapshots = self.fan_out(snapshot)
+            if not snapshots:
+                return []
+            columns = _table_columns(next(iter(snapshots.values())), table_name)
+            if not columns:
+                raise ValueError(f"таблица '{table_name}' не найдена в базах приютов")
+            columns = ['shelter', *columns]
+            return export_data.export_batches(_shard_batches(snapshots, table_name), columns, table_name,
+                                              formats, executor, out_dir, compression=compression)
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        with self._lock:
+            shards, self._shards = self._shards, {}
+        for db in shards.values():
+            db.close()
+
+
+def _table_columns(db_path: str, table_name: str) -> List[str]:
+    conn = sqlite3.connect(db_path)
+    try:
+        return [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+    finally:
+        conn.close()
+
+
+def _shard_batches(snapshots: Dict[str, str], table_name: str):
+    """Пачки строк снимков по очереди, с именем приюта первой колонкой"""
+    for shelter, db_path in snapshots.items():
+        conn = sqlite3.connect(db_path)
+        try:
+            _, batches = export_data.iter_table_batches(conn.cursor(), table_name)
+            for batch in batches:
+                yield [(shelter, *row) for row in batch]
+        finally:
+            conn.close()
+
+
+class ShardedStats:
+    """Статистика всех приютов из их сводных таблиц (интерфейс как у ShelterStats)"""
+    def __init__(self, router: ShardRouter):
+        self.router = router
+
+    def _collect(self, method: str, *args) -> Dict[str, object]:
+        return self.router.fan_out(lambda shelter, db: getattr(ShelterStats(db), method)(*args))
+
+    def counts_by_species_status(self) -> Dict[Tuple[str, str], int]:
+        totals = {}
+        for counts in self._collect('counts_by_species_status').values():
+            for key, animals in counts.items():
+                totals[key] = totals.get(key, 0) + animals
+        return totals
+
+    def adoption_totals(self) -> Tuple[int, float]:
+        results = self._collect('adoption_totals').values()
+        return sum(adoptions for adoptions, _ in results), sum(days for _, days in results)
+
+    def average_days_to_adoption(self) -> Optional[float]:
+        """Среднее по всем усыновлениям, а не среднее средних приютов"""
+        adoptions, total_days = self.adoption_totals()
+        return total_days / adoptions if adoptions else None
+
+    def daily(self, since: Optional[str] = None, until: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        totals = {}
+        for rows in self._collect('daily', since, until).values():
+            for day, intakes, adoptions in rows:
+                day_intakes, day_adoptions = totals.get(day, (0, 0))
+                totals[day] = (day_intakes + intakes, day_adoptions + adoptions)
+        return [(day, *totals[day]) for day in sorted(totals)]
+
+    def pending_backlog(self, limit: int = 10) -> List[Tuple[str, int, str, int]]:
+        """(приют, animal_id, имя, заявок): первые limit среди лучших limit каждого приюта"""
+        backlogs = self._collect('pending_backlog', limit)
+        rows = [(shelter, *row) for shelter, backlog in backlogs.items() for row in backlog]
+        return heapq.nlargest(limit, rows, key=lambda row: row[3])
+
+
+def print_animals(rows: List[Tuple[str, AnimalRecord]]) -> None:
+    for shelter, animal in rows:
+        print(f"{shelter:<16} #{animal.animal_id:<8} {animal.name:<20} {animal.species:<10} "
+              f"{animal.breed or '':<14} {'' if animal.age is None else animal.age:>3}  {animal.status}")
+
+
+def print_stats(stats: ShardedStats) -> None:
+    print("Животные по видам и статусам (все приюты):")
+    for (species, status), animals in sorted(stats.counts_by_species_status().items()):
+        print(f"  {species:<12} {status:<12} {animals:>8}")
+    average = stats.average_days_to_adoption()
+    print(f"Среднее время до усыновления: {f'{average:.1f} дн.' if average is not None else 'нет данных'}")
+    backlog = stats.pending_backlog()
+    if backlog:
+        print("Больше всего ожидающих заявок:")
+        for shelter, animal_id, name, pending in backlog:
+            print(f"  {shelter:<16} #{animal_id:<8} {name:<20} {pending:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Приюты в отдельных базах: маршрутизация и сводные чтения")
+    parser.add_argument('command', choices=['list', 'add', 'available', 'search', 'stats', 'export'],
+                        help="list — шарды, add — подключить приют, available/search — животные всех приютов, "
+                             "stats — сводная статистика, export — экспорт таблицы всех приютов")
+    parser.add_argument('--config', default=DEFAULT_SHARD_CONFIG, help="файл конфигурации шардов")
+    parser.add_argument('--shelter', help="имя приюта (add)")
+    parser.add_argument('--db', help="файл базы приюта (add)")
+    parser.add_argument('--text', help="текст поиска (search)")
+    parser.add_argument('--species', help="вид (available, search)")
+    parser.add_argument('--limit', type=int, default=20, help="животных на страницу (available, search)")
+    parser.add_argument('--pages', type=int, default=1, help="сколько страниц вывести (available, search)")
+    parser.add_argument('--table', default='Animals', help="таблица (export)")
+    parser.add_argument('--formats', nargs='+', default=list(export_data.DEFAULT_FORMATS),
+                        choices=sorted(export_data.FORMATS), help="форматы (export)")
+    parser.add_argument('--out-dir', default=export_data.OUT_DIR, help="каталог файлов (export)")
+    args = parser.parse_args()
+
+    router = ShardRouter(args.config)
+    try:
+        if args.command == 'list':
+            for shelter in router.shelters():
+                print(f"{shelter:<20} {router.database(shelter).db_name}")
+        elif args.command == 'add':
+            if not args.shelter or not args.db:
+                parser.error("для add нужны --shelter и --db")
+            try:
+                router.add_shard(args.shelter, args.db)
+            except ValueError as e:
+                print(f"❌ {e}")
+                return
+            print(f"✓ Приют '{args.shelter}' подключён: {os.path.abspath(args.db)}")
+        elif args.command in ('available', 'search'):
+            cursor = None
+            for _ in range(args.pages):
+                start = time.perf_counter()
+                if args.command == 'available':
+                    rows, cursor = router.available_animals(args.species, cursor, args.limit)
+                else:
+                    rows, cursor = router.search_animals(args.text, cursor, args.limit, species=args.species)
+                print_animals(rows)
+                print(f"— {len(rows)} за {(time.perf_counter() - start) * 1000:.1f} мс")
+                if cursor is None:
+                    break
+        elif args.command == 'stats':
+            print_stats(router.stats())
+        else:
+            print(f"\n{'=' * 60}")
+            print(f"ЭКСПОРТ ТАБЛИЦЫ ВСЕХ ПРИЮТОВ: {args.table}")
+            print(f"{'=' * 60}")
+            try:
+                results = router.export_table(args.table, args.formats, args.out_dir)
+            except ValueError as e:
+                print(f"❌ {e}")
+                return
+            export_data.print_export_results(results)
+            print(f"{'=' * 60}")
+    finally:
+        router.close()
+
+
+if __name__ == "__main__":
+    main()
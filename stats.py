@@ -0,0 +1,129 @@
+# stats.py
+"""Статистика приюта из сводных таблиц, которые поддерживаются триггерами.
+
+Запуск: python stats.py {show,rebuild,check} [--db FILE]
+"""
+import argparse
+import sys
+from typing import Dict, List, Optional, Tuple
+
+from database import DEFAULT_DB_NAME, STATS_QUERIES, STATS_REBUILD, Database, get_database
+from metrics import timed_methods
+
+# Допуск при сверке суммы дней: она накапливается в REAL по одной заявке
+DAYS_TOLERANCE = 1e-6
+# Сколько первых колонок сводки составляют ключ (по умолчанию одна)
+KEY_COLUMNS = {'StatsAnimals': 2}
+
+
+@timed_methods
+class ShelterStats:
+    """Запросы для панели администратора; каждый — чтение нескольких строк сводок"""
+    def __init__(self, db: Optional[Database] = None):
+        self.db = db or get_database()
+        self.db.backend.require('statistics')
+
+    def counts_by_species_status(self) -> Dict[Tuple[str, str], int]:
+        with self.db.connection() as conn:
+            return {(species, status): animals for species, status, animals in
+                    conn.execute("SELECT species, status, animals FROM StatsAnimals")}
+
+    def adoption_totals(self) -> Tuple[int, float]:
+        """(усыновлений с известной датой поступления, сумма дней до усыновления)"""
+        with self.db.connection() as conn:
+            return conn.execute("SELECT adoptions, total_days FROM StatsAdoptionTime WHERE id = 1").fetchone()
+
+    def average_days_to_adoption(self) -> Optional[float]:
+        """Среднее число дней от поступления до усыновления или None, если усыновлений не было"""
+        adoptions, total_days = self.adoption_totals()
+        return total_days / adoptions if adoptions else None
+
+    def daily(self, since: Optional[str] = None, until: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """(день, поступило, усыновлено) за период, границы включительно"""
+        with self.db.connection() as conn:
+            return conn.execute("""SELECT day, intakes, adoptions FROM StatsDaily
+                                   WHERE day >= ? AND day <= ? ORDER BY day""",
+                                (since or '', until or '9999')).fetchall()
+
+    def pending_for_animal(self, animal_id: int) -> int:
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT pending FROM StatsPending WHERE animal_id = ?", (animal_id,)).fetchone()
+        return row[0] if row else 0
+
+    def pending_backlog(self, limit: int = 10) -> List[Tuple[int, str, int]]:
+        """Животные с наибольшим числом ожидающих заявок: (animal_id, имя, заявок)"""
+        with self.db.connection() as conn:
+            return conn.execute("""SELECT p.animal_id, a.name, p.pending FROM StatsPending p
+                                   JOIN Animals a ON a.animal_id = p.animal_id
+                                   ORDER BY p.pending DESC LIMIT ?""", (limit,)).fetchall()
+
+
+def rebuild_statistics(conn) -> None:
+    """Пересчитывает сводные таблицы целиком; вызывать внутри транзакции записи"""
+    for statement in STATS_REBUILD:
+        conn.execute(statement)
+
+
+def check_statistics(db: Database) -> List[str]:
+    """Сверяет сводные таблицы с полным пересчётом; возвращает описания расхождений"""
+    problems = []
+    with db.connection() as conn:
+        for table, query in STATS_QUERIES.items():
+            width = KEY_COLUMNS.get(table, 1)
+            stored = {row[:width]: row[width:] for row in conn.execute(f"SELECT * FROM {table}")}
+            expected = {row[:width]: row[width:] for row in conn.execute(query)}
+            for key in sorted(stored.keys() | expected.keys(), key=str):
+                if not _same(stored.get(key), expected.get(key)):
+                    problems.append(f"{table} {key}: в сводке {stored.get(key)}, пересчёт {expected.get(key)}")
+    return problems
+
+
+def _same(stored, expected):
+    if stored is None or expected is None:
+        return stored == expected
+    return all(abs(a - b) <= DAYS_TOLERANCE if isinstance(a, float) or isinstance(b, float) else a == b
+               for a, b in zip(stored, expected))
+
+
+def print_stats(stats: ShelterStats) -> None:
+    print("Животные по видам и статусам:")
+    for (species, status), animals in sorted(stats.counts_by_species_status().items()):
+        print(f"  {species:<12} {status:<12} {animals:>8}")
+    average = stats.average_days_to_adoption()
+    print(f"Среднее время до усыновления: {f'{average:.1f} дн.' if average is not None else 'нет данных'}")
+    backlog = stats.pending_backlog()
+    if backlog:
+        print("Больше всего ожидающих заявок:")
+        for animal_id, name, pending in backlog:
+            print(f"  #{animal_id:<8} {name:<20} {pending:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводная статистика приюта")
+    parser.add_argument('command', choices=['show', 'rebuild', 'check'],
+                        help="show — вывести, rebuild — пересчитать сводки, check — сверить с пересчётом")
+    parser.add_argument('--db', default=DEFAULT_DB_NAME, help="файл базы данных")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    if args.command == 'show':
+        print_stats(ShelterStats(db))
+    elif args.command == 'rebuild':
+        with db.write_transaction() as conn:
+            rebuild_statistics(conn)
+        print("✓ Сводные таблицы пересчитаны")
+    else:
+        problems = check_statistics(db)
+        for problem in problems[:50]:
+            print(f"❌ {problem}")
+        if len(problems) > 50:
+            print(f"... и ещё {len(problems) - 50}")
+        if not problems:
+            print("✓ Сводные таблицы совпадают с полным пересчётом")
+        db.close()
+        sys.exit(1 if problems else 0)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()